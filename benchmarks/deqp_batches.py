@@ -0,0 +1,119 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Compare running dEQP cases one per process and in batches.
+
+The first cases of a caselist are run twice, one after the other: once with a
+process for each case (what a run with process isolation does), and once with
+a process for each group of cases, passed with --deqp-caselist (what a run
+without process isolation does). The cases per second of each, and any case
+with a different result, are printed.
+
+Usage: python benchmarks/deqp_batches.py --bin /path/to/deqp-gles2 \
+           [--caselist dEQP-GLES2-cases.txt] [-n 500] [--chunk-size 500]
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from framework import grouptools, options  # pylint: disable=wrong-import-position
+from framework.test import deqp  # pylint: disable=wrong-import-position
+
+
+def _run(profile):
+    """Run each test of the profile and return the flattened results."""
+    results = {}
+    for name, test in profile.test_list.items():
+        test.run()
+        if test.result.subtests:
+            for sub, result in test.result.subtests.items():
+                results[grouptools.join(name, sub)] = result.name
+        else:
+            results[name] = test.result.result.name
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bin',
+                        required=True,
+                        help='The deqp binary to run')
+    parser.add_argument('--caselist',
+                        help='A caselist written by the binary with '
+                             '--deqp-runmode=txt-caselist. If this is not '
+                             'given the binary is asked for one.')
+    parser.add_argument('-n',
+                        type=int,
+                        default=500,
+                        help='The number of cases to run')
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=deqp.DEQPBatchMixin.chunk_size,
+                        help='The most cases to run in one process')
+    args = parser.parse_args()
+
+    bin_ = os.path.abspath(args.bin)
+    caselist = args.caselist
+    if caselist is None:
+        name = os.path.basename(bin_)
+        caselist = deqp.gen_caselist_txt(
+            bin_, 'dEQP-{}-cases.txt'.format(name[len('deqp-'):].upper()), [])
+    cases = list(itertools.islice(deqp.iter_deqp_test_cases(caselist),
+                                  args.n))
+
+    class Test(deqp.DEQPBaseTest):  # pylint: disable=missing-docstring
+        deqp_bin = bin_
+        extra_args = []
+
+    class BatchTest(deqp.DEQPBatchMixin, Test):  # pylint: disable=missing-docstring
+        chunk_size = args.chunk_size
+
+    timings = []
+    results = []
+    for isolation in [True, False]:
+        options.OPTIONS.process_isolation = isolation
+        profile = deqp.make_profile(cases, Test, BatchTest)
+        start = time.time()
+        results.append(_run(profile))
+        timings.append(time.time() - start)
+
+    print('{:>10} {:>8} {:>10} {:>10}'.format(
+        'mode', 'cases', 'seconds', 'cases/s'))
+    for mode, seconds in zip(['per-case', 'batched'], timings):
+        print('{:>10} {:>8} {:>10.3f} {:>10.1f}'.format(
+            mode, len(cases), seconds, len(cases) / seconds))
+
+    for name in sorted(results[0]):
+        if results[0][name] != results[1].get(name):
+            print('{}: {} per-case, {} batched'.format(
+                name, results[0][name], results[1].get(name)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmark writing and finalizing a large run with the json backend.
+
+For each number of tests this writes that many results through the json
+backend, then finalizes them, each in a fresh process so that the peak RSS of
+finalize isn't hidden by the writing. It only uses the public backend API, so
+it can be run from an older checkout to compare against.
+
+Usage: python benchmarks/json_finalize.py [--sizes 10000 100000 1000000]
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from framework import backends, grouptools, results, status  # noqa: E402
+
+_ENV = dict(os.environ, PIGLIT_COMPRESSION='none')
+
+
+def _peak_rss():
+    """Return the peak RSS of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def _write(dest, count):
+    backend = backends.json.JSONBackend(dest)
+    backend.initialize({'name': 'benchmark', 'options': {}})
+    for i in range(count):
+        name = grouptools.join('spec', 'group{}'.format(i // 1000),
+                               'test{}'.format(i))
+        result = results.TestResult(status.PASS)
+        result.command = '/usr/lib/piglit/bin/{} -auto -fbo'.format(name)
+        result.out = 'PIGLIT: {"result": "pass" }\n' * 4
+        result.err = ''
+        result.returncode = 0
+        result.time = results.TimeAttribute(start=float(i), end=i + 0.5)
+        with backend.write_test(name) as t:
+            t(result)
+
+
+def _finalize(dest):
+    backends.json.JSONBackend(dest).finalize(
+        {'time_elapsed': results.TimeAttribute(0.0, 1.0).to_json()})
+
+
+def _child(phase, dest, count):
+    start = time.time()
+    if phase == 'write':
+        _write(dest, count)
+    else:
+        _finalize(dest)
+    print(json.dumps({'seconds': time.time() - start, 'rss': _peak_rss()}))
+
+
+def _run(phase, dest, count):
+    out = subprocess.check_output(
+        [sys.executable, __file__, '--child', phase, dest, str(count)],
+        env=_ENV)
+    return json.loads(out.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes',
+                        type=int,
+                        nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='The numbers of tests to benchmark')
+    parser.add_argument('--child',
+                        nargs=3,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        phase, dest, count = args.child
+        _child(phase, dest, int(count))
+        return
+
+    print('{:>10} {:>10} {:>10} {:>13} {:>10}'.format(
+        'tests', 'write (s)', 'tests/s', 'finalize (s)', 'peak MiB'))
+    for count in args.sizes:
+        dest = tempfile.mkdtemp()
+        try:
+            write = _run('write', dest, count)
+            final = _run('finalize', dest, count)
+        finally:
+            shutil.rmtree(dest)
+        print('{:>10} {:>10.1f} {:>10.0f} {:>13.1f} {:>10.1f}'.format(
+            count, write['seconds'], count / write['seconds'],
+            final['seconds'], final['rss']))
+
+
+if __name__ == '__main__':
+    main()
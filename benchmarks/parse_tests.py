@@ -0,0 +1,113 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmark parsing the shader_test and glsl_parser_test files.
+
+Every shader_test and glsl_parser_test file under a directory (tests/spec by
+default) is parsed three ways, each in a fresh process:
+
+parse -- each file is parsed in this process, one after the other, which is
+         the raw speed of the parsers.
+cold  -- discovery.discover with an empty index, which parses the files in
+         parallel and writes the index.
+warm  -- discovery.discover with the index written by the cold run, which only
+         checks the mtime and size of each file.
+
+Usage: python benchmarks/parse_tests.py [--dirs tests/spec]
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, _ROOT)
+
+
+def _child(mode, dirs):
+    from framework.test import discovery
+
+    start = time.time()
+    if mode == 'parse':
+        # pylint: disable=protected-access
+        files = [os.path.join(d, f) for _, d, f in discovery._walk(dirs)]
+        for each in files:
+            discovery._parse(each)
+    else:
+        files = list(discovery.discover(dirs))
+    print(json.dumps({'seconds': time.time() - start, 'files': len(files)}))
+
+
+def _run(mode, dirs, cache):
+    with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as f:
+        f.write('[core]\ndiscovery cache={}\n'.format(cache))
+    try:
+        out = subprocess.check_output(
+            [sys.executable, '-W', 'ignore', __file__, '--child', mode,
+             '--dirs'] + dirs,
+            env=dict(os.environ, PYTHONPATH=_ROOT,
+                     PIGLIT_CONFIG_FILE=f.name))
+    finally:
+        os.unlink(f.name)
+    return json.loads(out.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dirs',
+                        nargs='+',
+                        default=[os.path.join(_ROOT, 'tests', 'spec')],
+                        help='The directories to parse the tests of')
+    parser.add_argument('--child',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        from framework import core
+        with open(os.environ['PIGLIT_CONFIG_FILE']) as f:
+            core.get_config(f)
+        _child(args.child, args.dirs)
+        return
+
+    cache = tempfile.mkdtemp()
+    try:
+        results = [(mode, _run(mode, args.dirs, cache))
+                   for mode in ['parse', 'cold', 'warm']]
+    finally:
+        shutil.rmtree(cache)
+
+    print('{:>6} {:>8} {:>10} {:>10}'.format(
+        'mode', 'files', 'seconds', 'files/s'))
+    for mode, result in results:
+        print('{:>6} {:>8} {:>10.3f} {:>10.0f}'.format(
+            mode, result['files'], result['seconds'],
+            result['files'] / result['seconds']))
+
+
+if __name__ == '__main__':
+    main()
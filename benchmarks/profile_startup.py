@@ -0,0 +1,125 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmark loading the all, quick and shader profiles.
+
+Each profile is loaded in a fresh process three times: with the discovery
+index disabled, with an empty index (the cold build), and with the index that
+build wrote (warm). Loading the profile is what piglit run, resume and
+print-cmd all pay before the first test starts.
+
+The time to list the tests matching a -t style regex (the edit, build, run
+loop) with the warm index is reported as well, as is the time to list every
+test.
+
+Usage: python benchmarks/profile_startup.py [--profiles all quick shader]
+                                            [--include <regex>]
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, _ROOT)
+
+
+def _child(name, include):
+    from framework import options, profile
+
+    # MultiShaderTest asks wflinfo about the platform while being built
+    options.OPTIONS.env['PIGLIT_PLATFORM'] = 'gbm'
+
+    start = time.time()
+    prof = profile.load_test_profile(name)
+    loaded = time.time()
+    if include:
+        prof.filters.append(profile.RegexFilter([include]))
+    tests = sum(1 for _ in prof.itertests())
+    print(json.dumps({'seconds': loaded - start,
+                      'iterate': time.time() - loaded,
+                      'tests': tests}))
+
+
+def _run(name, cache, include=''):
+    with tempfile.NamedTemporaryFile('w', suffix='.conf', delete=False) as f:
+        f.write('[core]\ndiscovery cache={}\nwflinfo cache=none\n'.format(
+            cache))
+    try:
+        out = subprocess.check_output(
+            [sys.executable, '-W', 'ignore', __file__, '--child', name,
+             '--include', include],
+            env=dict(os.environ, PYTHONPATH=_ROOT,
+                     PIGLIT_CONFIG_FILE=f.name))
+    finally:
+        os.unlink(f.name)
+    return json.loads(out.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles',
+                        nargs='+',
+                        default=['all', 'quick', 'shader'],
+                        help='The profiles to benchmark')
+    parser.add_argument('--include',
+                        default='spec@arb_sync@',
+                        metavar='<regex>',
+                        help='The regex to time -t runs with')
+    parser.add_argument('--child',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        from framework import core
+        with open(os.environ['PIGLIT_CONFIG_FILE']) as f:
+            core.get_config(f)
+        _child(args.child, args.include)
+        return
+
+    print('{:>10} {:>8} {:>12} {:>10} {:>10} {:>8} {:>10} {:>8}'.format(
+        'profile', 'tests', 'no index (s)', 'cold (s)', 'warm (s)',
+        'list (s)', '-t tests', '-t (s)'))
+    for name in args.profiles:
+        cache = tempfile.mkdtemp()
+        try:
+            none = _run(name, 'none')
+            cold = _run(name, cache)
+            warm = _run(name, cache)
+            filtered = _run(name, cache, args.include)
+        finally:
+            shutil.rmtree(cache)
+        print('{:>10} {:>8} {:>12.2f} {:>10.2f} {:>10.2f} {:>8.2f} {:>10} '
+              '{:>8.3f}'.format(
+                  name, warm['tests'], none['seconds'], cold['seconds'],
+                  warm['seconds'], warm['iterate'], filtered['tests'],
+                  filtered['iterate']))
+
+
+if __name__ == '__main__':
+    main()
@@ -155,7 +155,15 @@ def load(file_path):
 
         tests = os.path.join(file_path, 'tests')
         if os.path.exists(tests):
-            return _extension(os.listdir(tests)[0])
+            # Backends may keep files that no loader is registered for in
+            # tests (like the journal of the json backend), skip those.
+            known = set(e for b in six.itervalues(BACKENDS)
+                        for e in b.extensions)
+            files = sorted(os.listdir(tests))
+            for file_ in files:
+                if _extension(file_)[0] in known:
+                    return _extension(file_)
+            return _extension(files[0])
         else:
             # At this point we have failed to find any sort of backend, just
             # except and die
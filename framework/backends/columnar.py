@@ -0,0 +1,382 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Module providing a binary, columnar backend for piglit.
+
+Loading a json result means decoding every field of every test, even when all
+that is wanted is the status of a handful of tests. This backend stores a run
+in a single uncompressed file, with the names, statuses, times, and subtests of
+the tests in compact columns sorted by test name, and the large fields (out,
+err, dmesg, etc) in a separate blob area.
+
+The file is memory mapped when it is loaded, and looking up a test is a binary
+search over the name column that only decodes the rows it touches. The
+statuses of the whole run can be counted without decoding any test, because
+the group totals are computed when the file is written, and the blob of a
+test is only decoded when one of its fields is accessed.
+
+While running this backend writes the same journal as the json backend, so
+partial runs can be resumed and aggregated the same way.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import collections
+import functools
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import six
+
+from framework import results, status
+from .json import JSONBackend, piglit_encoder, _iter_tests
+from .register import Registry
+
+__all__ = [
+    'REGISTRY',
+    'ColumnarBackend',
+    'ColumnarTests',
+    'convert',
+]
+
+# The current version of the columnar results
+CURRENT_VERSION = 1
+
+_MAGIC = b'PIGLITC\x01'
+
+# The sections of the file, in the order that they're written. Each of them
+# is recorded in the header as an offset from the start of the file and a
+# length, in bytes.
+#
+# meta                 -- json encoded metadata, including the group totals
+# name_offsets         -- n + 1 uint64, the start of each name in names
+# names                -- the utf-8 encoded test names, sorted
+# status               -- n uint8, the index of each status in status.ALL
+# time                 -- 2 * n double, the start and end time of each test
+# subtest_index        -- n + 1 uint64, the first subtest row of each test
+# subtest_name_offsets -- m + 1 uint64, the start of each subtest name
+# subtest_names        -- the utf-8 encoded subtest names
+# subtest_status       -- m uint8, the index of each status in status.ALL
+# blob_index           -- 2 * n uint64, the offset and length of each blob
+# blobs                -- the json encoded large fields of each test
+_SECTIONS = [
+    'meta', 'name_offsets', 'names', 'status', 'time', 'subtest_index',
+    'subtest_name_offsets', 'subtest_names', 'subtest_status', 'blob_index',
+    'blobs',
+]
+_HEADER = struct.Struct(str('<8sI' + 'QQ' * len(_SECTIONS)))
+
+# Statuses are stored as their index in status.ALL. This is keyed by name
+# since some statuses compare equal to each other.
+_STATUS_INDEX = {s.name: i for i, s in enumerate(status.ALL)}
+
+# The fields of a TestResult that are stored in the blob area
+_BLOB_FIELDS = ['returncode', 'command', 'environment', 'out', 'err', 'dmesg',
+                'pid', 'exception', 'traceback']
+
+# The metadata of a TestrunResult that is stored in the meta section
+_META_FIELDS = ['name', 'uname', 'options', 'glxinfo', 'wglinfo', 'lspci',
+                'clinfo']
+
+
+def _pack(fmt, values):
+    return struct.pack(str('<{}{}'.format(len(values), fmt)), *values)
+
+
+def _offsets(blobs):
+    """Return the cumulative offsets of a list of byte strings."""
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return offsets
+
+
+class _Writer(object):
+    """Collects test results and writes them to a columnar file.
+
+    Only the small, fixed size columns are kept in memory, the blobs are
+    spooled to a temporary file as tests are added.
+    """
+    def __init__(self):
+        self.__rows = {}
+        self.__blobs = tempfile.TemporaryFile()
+        self.__blob_size = 0
+        self.totals = collections.defaultdict(results.Totals)
+
+    def add(self, name, result):
+        """Add a TestResult to the file."""
+        blob = json.dumps({f: getattr(result, f) for f in _BLOB_FIELDS},
+                          default=piglit_encoder).encode('utf-8')
+        self.__blobs.write(blob)
+        self.__rows[name] = (
+            _STATUS_INDEX[result.result.name],
+            result.time.start,
+            result.time.end,
+            [(n.encode('utf-8'), _STATUS_INDEX[s.name])
+             for n, s in six.iteritems(result.subtests)],
+            self.__blob_size,
+            len(blob),
+        )
+        self.__blob_size += len(blob)
+        results.update_totals(self.totals, name, result)
+
+    def write(self, filename, metadata):
+        """Write the columnar file.
+
+        The file is written to a temporary name and then moved into place, so
+        the write is atomic.
+        """
+        names = sorted(n.encode('utf-8') for n in self.__rows)
+        rows = [self.__rows[n.decode('utf-8')] for n in names]
+
+        meta = dict(metadata)
+        meta['results_version'] = CURRENT_VERSION
+        meta['totals'] = self.totals
+        subtests = [s for r in rows for s in r[3]]
+
+        sections = [
+            json.dumps(meta, default=piglit_encoder).encode('utf-8'),
+            _pack('Q', _offsets(names)),
+            b''.join(names),
+            _pack('B', [r[0] for r in rows]),
+            _pack('d', [t for r in rows for t in r[1:3]]),
+            _pack('Q', _offsets([r[3] for r in rows])),
+            _pack('Q', _offsets([n for n, _ in subtests])),
+            b''.join(n for n, _ in subtests),
+            _pack('B', [s for _, s in subtests]),
+            _pack('Q', [b for r in rows for b in r[4:6]]),
+        ]
+
+        table = []
+        offset = _HEADER.size
+        for section in sections:
+            table.extend([offset, len(section)])
+            offset += len(section)
+        table.extend([offset, self.__blob_size])
+
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, CURRENT_VERSION, *table))
+            for section in sections:
+                f.write(section)
+            self.__blobs.seek(0)
+            shutil.copyfileobj(self.__blobs, f)
+        self.__blobs.close()
+        os.rename(tmp, filename)
+
+
+class ColumnarTests(collections.Mapping):
+    """A read-only mapping of test names to TestResults in a columnar file.
+
+    TestResults are created each time they are looked up, from only the rows
+    of the file that belong to that test. Tests are iterated in name order.
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = _HEADER.unpack_from(self.__map, 0)
+        assert header[0] == _MAGIC, 'Not a columnar results file'
+        self.__sections = {
+            s: header[2 + i * 2] for i, s in enumerate(_SECTIONS)}
+        self.__len = header[2 + _SECTIONS.index('status') * 2 + 1]
+
+    def __uint(self, section, index):
+        return struct.unpack_from(
+            str('<Q'), self.__map, self.__sections[section] + 8 * index)[0]
+
+    def __string(self, section, index):
+        start = self.__uint(section + '_offsets', index)
+        end = self.__uint(section + '_offsets', index + 1)
+        base = self.__sections[section + 's']
+        return self.__map[base + start:base + end]
+
+    def __status(self, section, index):
+        return status.ALL[six.indexbytes(
+            self.__map, self.__sections[section] + index)]
+
+    def meta(self):
+        """Return the decoded metadata of the file."""
+        start = self.__sections['meta']
+        end = self.__sections['name_offsets']
+        return json.loads(self.__map[start:end].decode('utf-8'))
+
+    def __find(self, name):
+        """Return the row of name, or raise a KeyError."""
+        key = name.encode('utf-8')
+        lo, hi = 0, self.__len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__string('name', mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.__len and self.__string('name', lo) == key:
+            return lo
+        raise KeyError(name)
+
+    def __blob(self, index):
+        """Decode the blob of a row."""
+        offset, length = struct.unpack_from(
+            str('<QQ'), self.__map, self.__sections['blob_index'] + 16 * index)
+        base = self.__sections['blobs'] + offset
+        return json.loads(self.__map[base:base + length].decode('utf-8'))
+
+    def __row(self, index):
+        """Create a TestResult from a row.
+
+        The blob isn't decoded until one of the fields in it is accessed.
+        """
+        result = results.TestResult(self.__status('status', index),
+                                    source=functools.partial(self.__blob,
+                                                             index))
+        start, end = struct.unpack_from(
+            str('<dd'), self.__map, self.__sections['time'] + 16 * index)
+        result.time = results.TimeAttribute(start, end)
+
+        for sub in six.moves.range(self.__uint('subtest_index', index),
+                                   self.__uint('subtest_index', index + 1)):
+            name = self.__string('subtest_name', sub).decode('utf-8')
+            result.subtests[name] = self.__status('subtest_status', sub)
+
+        return result
+
+    def __getitem__(self, name):
+        return self.__row(self.__find(name))
+
+    def __contains__(self, name):
+        try:
+            self.__find(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        for index in six.moves.range(self.__len):
+            yield self.__string('name', index).decode('utf-8')
+
+    def __len__(self):
+        return self.__len
+
+    def iteritems(self):
+        """Iterate over the tests in order without searching for each."""
+        for index in six.moves.range(self.__len):
+            yield self.__string('name', index).decode('utf-8'), self.__row(index)
+
+    def items(self):
+        if six.PY2:
+            return list(self.iteritems())
+        return _ItemsView(self)
+
+
+class _ItemsView(collections.ItemsView):
+    """An items view that doesn't look up each key."""
+    def __iter__(self):
+        return self._mapping.iteritems()
+
+
+class ColumnarBackend(JSONBackend):
+    """Backend that writes a columnar results file.
+
+    While the tests are running this writes the json backend's journal, in
+    finalize the journal is converted into the columnar file.
+    """
+    def finalize(self, metadata=None):
+        self._close()
+
+        with open(os.path.join(self._dest, 'metadata.json'), 'r') as f:
+            meta = json.load(f)
+        if metadata:
+            meta.update(metadata)
+
+        writer = _Writer()
+        for name, value in _iter_tests(os.path.join(self._dest, 'tests')):
+            writer.add(name, results.TestResult.from_dict(json.loads(value)))
+        writer.write(os.path.join(self._dest, 'results.columnar'), meta)
+
+        # Delete the temporary files
+        os.unlink(os.path.join(self._dest, 'metadata.json'))
+        shutil.rmtree(os.path.join(self._dest, 'tests'))
+
+
+def convert(testrun, filename):
+    """Write a TestrunResult, loaded from any backend, to a columnar file.
+
+    Arguments:
+    testrun -- a TestrunResult instance.
+    filename -- the file to write.
+
+    """
+    writer = _Writer()
+    for name, result in six.iteritems(testrun.tests):
+        writer.add(name, result)
+
+    meta = {f: getattr(testrun, f) for f in _META_FIELDS}
+    meta['time_elapsed'] = testrun.time_elapsed
+    writer.write(filename, meta)
+
+
+def load_results(filename, compression_):
+    """Load a columnar results file.
+
+    Columnar files are never compressed, since they're memory mapped, so
+    compression_ is ignored.
+    """
+    if os.path.isdir(filename):
+        filename = os.path.join(filename, 'results.columnar')
+
+    tests = ColumnarTests(filename)
+    meta = tests.meta()
+
+    testrun = results.TestrunResult()
+    for name in _META_FIELDS:
+        if meta.get(name):
+            setattr(testrun, name, meta[name])
+    testrun.results_version = meta['results_version']
+    if 'time_elapsed' in meta:
+        testrun.time_elapsed = results.TimeAttribute.from_dict(
+            meta['time_elapsed'])
+    testrun.totals = {n: results.Totals.from_dict(t)
+                      for n, t in six.iteritems(meta['totals'])}
+    testrun.tests = tests
+
+    return testrun
+
+
+def set_meta(testrun):
+    """Set columnar specific metadata on a TestrunResult."""
+    testrun.results_version = CURRENT_VERSION
+
+
+REGISTRY = Registry(
+    extensions=['.columnar'],
+    backend=ColumnarBackend,
+    load=load_results,
+    meta=set_meta,
+)
@@ -24,11 +24,12 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import collections
-import functools
+import contextlib
 import os
-import posixpath
 import shutil
+import struct
 import sys
+import threading
 
 try:
     import simplejson as json
@@ -36,13 +37,8 @@ except ImportError:
     import json
 
 import six
-try:
-    import jsonstreams
-    _STREAMS = True
-except ImportError:
-    _STREAMS = False
 
-from framework import status, results, exceptions, compat
+from framework import status, results, exceptions, compat, options
 from .abstract import FileBackend, write_compressed
 from .register import Registry
 from . import compression
@@ -61,6 +57,32 @@ MINIMUM_SUPPORTED_VERSION = 7
 # The level to indent a final file
 INDENT = 4
 
+# The name of the journal in the tests directory.
+JOURNAL = 'journal.bin'
+
+# The name of the completion index in the tests directory. It has a line with
+# the json encoded name and status of a test each time a record is appended to
+# the journal, so that resuming only needs to read this to find out which
+# tests have run.
+INDEX = 'completed.json'
+
+# The journal starts with a magic string and the version of its format, so
+# that a file that isn't a journal (or is one of another format) is rejected
+# rather than misread.
+_JOURNAL_MAGIC = b'PIGLITJ\0'
+_JOURNAL_VERSION = 1
+_JOURNAL_HEADER = struct.Struct(str('<8sI'))
+
+# Each record of the journal is this header (the length in bytes of the
+# name, the counted result, and the data), followed by the utf-8 encoded name
+# of the test, the json encoded status and subtests of the test (which is all
+# the group totals need, so they can be recalculated without decoding the
+# data), and the json encoded TestResult.
+_HEADER = struct.Struct(str('<III'))
+
+# The part of a TestResult that the group totals are calculated from
+_Counted = collections.namedtuple('_Counted', ['result', 'subtests'])
+
 
 def piglit_encoder(obj):
     """ Encoder for piglit that can transform additional classes into json
@@ -84,13 +106,29 @@ class JSONBackend(FileBackend):
     json module or the simplejson.
 
     This class is atomic, writes either completely fail or completley succeed.
-    To achieve this it writes individual files for each test and for the
-    metadata, and composes them at the end into a single file and removes the
-    intermediate files. When it tries to compose these files if it cannot read
-    a file it just ignores it, making the result atomic.
+    To achieve this it appends each test to a journal as a length prefixed
+    record, first as incomplete, then with the final result. When the journal
+    is read the last complete record for each test wins, and a record that was
+    only partially written (because piglit was killed, for example) is
+    ignored, making the result atomic.
+
+    The group totals are updated as each record is appended, and written into
+    the final file, so they never need to be calculated when it is loaded.
 
     """
     _file_extension = 'json'
+    _write = None  # write_test appends to the journal instead
+
+    def __init__(self, dest, file_start_count=0, **kwargs):
+        super(JSONBackend, self).__init__(dest, file_start_count, **kwargs)
+        self.__journal = None
+        self.__index = None
+        self.__lock = threading.Lock()
+        self.__totals = None
+        self.__counted = {}
+        self.__pending = set()
+
+    __INCOMPLETE = results.TestResult(result=status.INCOMPLETE)
 
     def initialize(self, metadata):
         """ Write boilerplate json code
@@ -118,94 +156,289 @@ class JSONBackend(FileBackend):
         except OSError:
             pass
 
-    def finalize(self, metadata=None):
-        """ End json serialization and cleanup
+        # An empty index means that no tests have run, load_completed only
+        # falls back to reading the journal if there isn't one.
+        with open(os.path.join(self._dest, 'tests', INDEX), 'w'):
+            pass
 
-        This method is called after all of tests are written, it closes any
-        containers that are still open and closes the file
+    def __load_totals(self):
+        """Count the tests that are already written.
 
+        This only finds tests when resuming a run, the tests written before it
+        was interrupted are counted once, when the first test is written.
+        This must be called with the lock held.
         """
+        self.__totals = collections.defaultdict(results.Totals)
         tests_dir = os.path.join(self._dest, 'tests')
-        file_list = sorted(
-            (f for f in os.listdir(tests_dir) if f.endswith('.json')),
-            key=lambda p: int(os.path.splitext(p)[0]))
-
-        # If jsonstreams is not present then build a complete tree of all of
-        # the data and write it with json.dump
-        if not _STREAMS:
-            # Create a dictionary that is full of data to be written to a
-            # single file
-            data = collections.OrderedDict()
-
-            # Load the metadata and put it into a dictionary
-            with open(os.path.join(self._dest, 'metadata.json'), 'r') as f:
-                data.update(json.load(f))
-
-            # If there is more metadata add it the dictionary
-            if metadata:
-                data.update(metadata)
-
-            # Add the tests to the dictionary
-            data['tests'] = collections.OrderedDict()
-
-            for test in file_list:
-                test = os.path.join(tests_dir, test)
-                if os.path.isfile(test):
-                    # Try to open the json snippets. If we fail to open a test
-                    # then throw the whole thing out. This gives us atomic
-                    # writes, the writing worked and is valid or it didn't
-                    # work.
-                    try:
-                        with open(test, 'r') as f:
-                            data['tests'].update(json.load(f))
-                    except ValueError:
-                        pass
-            assert data['tests']
-
-            data = results.TestrunResult.from_dict(data)
-
-            # write out the combined file. Use the compression writer from the
-            # FileBackend
-            with self._write_final(os.path.join(self._dest, 'results.json')) as f:
-                json.dump(data, f, default=piglit_encoder, indent=INDENT)
-
-        # Otherwise use jsonstreams to write the final dictionary. This uses an
-        # external library, but is slightly faster and uses considerably less
-        # memory that building a complete tree.
-        else:
-            encoder = functools.partial(json.JSONEncoder, default=piglit_encoder)
+        if os.path.exists(tests_dir):
+            for name, counted in _iter_counted(tests_dir):
+                self.__count(name, counted)
+
+    def __count(self, name, result):
+        """Replace the contribution of a test to the group totals.
+
+        This must be called with the lock held.
+        """
+        if self.__totals is None:
+            self.__load_totals()
+
+        old = self.__counted.get(name)
+        if old is not None:
+            results.update_totals(self.__totals, name, old, -1)
+        results.update_totals(self.__totals, name, result)
+        self.__counted[name] = result
+
+    def __append(self, name, result, final=True):
+        """Append a record for a test to the journal.
 
-            with self._write_final(os.path.join(self._dest, 'results.json')) as f:
-                with jsonstreams.Stream(jsonstreams.Type.object, fd=f, indent=4,
-                                        encoder=encoder, pretty=True) as s:
-                    s.write('__type__', 'TestrunResult')
-                    with open(os.path.join(self._dest, 'metadata.json'),
-                              'r') as n:
-                        s.iterwrite(six.iteritems(json.load(n, object_pairs_hook=collections.OrderedDict)))
+        Only final results are counted as they're written, tests that never
+        get one are counted as incomplete when the journal is closed.
+        """
+        counted = _Counted(result.result, dict(result.subtests))
+        data = json.dumps(result, default=piglit_encoder).encode('utf-8')
+        # simplejson encodes namedtuples as objects, so counted is encoded as
+        # a list explicitly.
+        encoded = [name.encode('utf-8'),
+                   json.dumps(list(counted),
+                              default=piglit_encoder).encode('utf-8'),
+                   data]
+        record = _HEADER.pack(*[len(e) for e in encoded]) + b''.join(encoded)
+        line = json.dumps([name, six.text_type(result.result)]).encode('utf-8')
+
+        with self.__lock:
+            if final:
+                self.__pending.discard(name)
+                self.__count(name, counted)
+            else:
+                self.__pending.add(name)
+            if self.__journal is None:
+                self.__journal = _open_journal(
+                    os.path.join(self._dest, 'tests', JOURNAL))
+            self.__journal.write(record)
+            self.__journal.flush()
+            if options.OPTIONS.sync:
+                os.fsync(self.__journal.fileno())
+
+            # The index is written after the journal, so a test in the index
+            # is always in the journal.
+            if self.__index is None:
+                self.__index = _open_index(
+                    os.path.join(self._dest, 'tests', INDEX))
+            self.__index.write(line + b'\n')
+            self.__index.flush()
+
+    @contextlib.contextmanager
+    def write_test(self, name):
+        """Write a test.
+
+        When this context manager is opened it will first append a record
+        with the status incomplete to the journal. When it is called to write
+        the final result it appends another record, which replaces the
+        incomplete one when the journal is read.
+
+        """
+        self.__append(name, self.__INCOMPLETE, final=False)
+
+        yield lambda val: self.__append(name, val)
+
+    def _close(self):
+        """Close the journal, so that it can be read.
 
-                    if metadata:
-                        s.iterwrite(six.iteritems(metadata))
+        Returns the group totals of the tests in the journal.
+        """
+        with self.__lock:
+            if self.__journal is not None:
+                self.__journal.close()
+                self.__journal = None
+            if self.__index is not None:
+                self.__index.close()
+                self.__index = None
+
+            if self.__totals is None:
+                self.__load_totals()
+            for name in self.__pending:
+                self.__count(name, _Counted(status.INCOMPLETE, {}))
+            self.__pending.clear()
+
+            # Groups that only held incomplete placeholders are left at zero
+            return {n: t for n, t in six.iteritems(self.__totals) if t}
 
-                    with s.subobject('tests') as t:
-                        for test in file_list:
-                            test = os.path.join(tests_dir, test)
-                            if os.path.isfile(test):
-                                try:
-                                    with open(test, 'r') as f:
-                                        a = json.load(f)
-                                except ValueError:
-                                    continue
+    def finalize(self, metadata=None):
+        """ End json serialization and cleanup
 
-                                t.iterwrite(six.iteritems(a))
+        This method is called after all of tests are written. It copies the
+        last record of each test from the journal into the final file without
+        decoding it, so the memory used only depends on the number of tests,
+        not on the size of their results.
 
+        """
+        totals = self._close()
+
+        tests_dir = os.path.join(self._dest, 'tests')
+
+        with open(os.path.join(self._dest, 'metadata.json'), 'r') as f:
+            data = json.load(f, object_pairs_hook=collections.OrderedDict)
+        data['__type__'] = 'TestrunResult'
+        if metadata:
+            data.update(metadata)
+        data['totals'] = totals
+
+        with self._write_final(os.path.join(self._dest, 'results.json')) as f:
+            f.write('{\n')
+            for key, value in six.iteritems(data):
+                f.write('{}{}: {},\n'.format(
+                    ' ' * INDENT, json.dumps(key),
+                    json.dumps(value, default=piglit_encoder)))
+            f.write('{}"tests": {{'.format(' ' * INDENT))
+
+            sep = '\n'
+            for name, value in _iter_tests(tests_dir):
+                f.write('{}{}{}: '.format(sep, ' ' * INDENT * 2,
+                                          json.dumps(name)))
+                f.write(value)
+                sep = ',\n'
+            f.write('\n{}}}\n}}\n'.format(' ' * INDENT))
 
         # Delete the temporary files
         os.unlink(os.path.join(self._dest, 'metadata.json'))
         shutil.rmtree(os.path.join(self._dest, 'tests'))
 
-    @staticmethod
-    def _write(f, name, data):
-        json.dump({name: data}, f, default=piglit_encoder)
+
+def _scan_journal(f):
+    """Yield the name, counted result, offset, and length of the data of each
+    record.
+
+    Stops at the first record that was only partially written. Raises
+    PiglitFatalError if f isn't a journal piglit can read.
+    """
+    size = os.fstat(f.fileno()).st_size
+    # The journal is created when the first test starts, and may have been
+    # left empty if piglit was killed before anything was flushed to it.
+    if not size:
+        return
+    f.seek(0)
+    magic, version = _JOURNAL_HEADER.unpack(
+        f.read(_JOURNAL_HEADER.size).ljust(_JOURNAL_HEADER.size, b'\0'))
+    if magic != _JOURNAL_MAGIC or version != _JOURNAL_VERSION:
+        raise exceptions.PiglitFatalError(
+            '"{}" is not a version {} piglit journal'.format(
+                f.name, _JOURNAL_VERSION))
+
+    offset = _JOURNAL_HEADER.size
+    while offset + _HEADER.size <= size:
+        name_len, counted_len, data_len = _HEADER.unpack(f.read(_HEADER.size))
+        start = offset + _HEADER.size + name_len + counted_len
+        offset = start + data_len
+        if offset > size:
+            return
+        name = f.read(name_len)
+        counted = f.read(counted_len)
+        f.seek(offset)
+        yield name.decode('utf-8'), counted, start, data_len
+
+
+def _open_journal(path):
+    """Open a journal to append records to.
+
+    If the journal already exists (when resuming) any partially written
+    record at the end is removed first, otherwise it would corrupt the records
+    appended after it.
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        f = open(path, 'wb')
+        f.write(_JOURNAL_HEADER.pack(_JOURNAL_MAGIC, _JOURNAL_VERSION))
+        return f
+
+    f = open(path, 'r+b')
+    end = _JOURNAL_HEADER.size
+    for _, _, start, length in _scan_journal(f):
+        end = start + length
+    f.seek(end)
+    f.truncate()
+    return f
+
+
+def _open_index(path):
+    """Open the completion index to append lines to.
+
+    Like _open_journal any partially written line at the end is removed
+    first.
+    """
+    if not os.path.exists(path):
+        return open(path, 'wb')
+
+    f = open(path, 'r+b')
+    f.seek(f.read().rfind(b'\n') + 1)
+    f.truncate()
+    return f
+
+
+def _index_journal(tests_dir):
+    """Return an OrderedDict mapping the name of each test in the journal to
+    the counted result, offset, and length of its last record.
+    """
+    journal = os.path.join(tests_dir, JOURNAL)
+    index = collections.OrderedDict()
+    if os.path.exists(journal):
+        with open(journal, 'rb') as f:
+            for name, counted, start, length in _scan_journal(f):
+                index[name] = (counted, start, length)
+    return index
+
+
+def _iter_snippets(tests_dir, index):
+    """Yield the name and value of each test in the individual N.json files
+    written by older versions of piglit, that are not in the index.
+    """
+    snippets = sorted(
+        (f for f in os.listdir(tests_dir)
+         if f.endswith('.json') and os.path.splitext(f)[0].isdigit()),
+        key=lambda p: int(os.path.splitext(p)[0]))
+
+    for snippet in snippets:
+        try:
+            with open(os.path.join(tests_dir, snippet), 'r') as f:
+                test = json.load(f)
+        except ValueError:
+            continue
+        for name, value in six.iteritems(test):
+            if name not in index:
+                yield name, value
+
+
+def _iter_counted(tests_dir):
+    """Yield the name and counted result of each test written to tests_dir.
+
+    This only decodes the small counted part of each record of the journal.
+    """
+    index = _index_journal(tests_dir)
+
+    for name, value in _iter_snippets(tests_dir, index):
+        yield name, results.TestResult.from_dict(value, lazy=True)
+
+    for name, (counted, _, _) in six.iteritems(index):
+        result, subtests = json.loads(counted.decode('utf-8'))
+        yield name, _Counted(status.status_lookup(result), subtests)
+
+
+def _iter_tests(tests_dir):
+    """Yield the name and raw json of each test written to tests_dir.
+
+    Tests are yielded in the order they were started, with the last result
+    written for them. Results from individual N.json files, as written by
+    older versions of piglit, are also read so that those runs can still be
+    resumed and finalized.
+    """
+    index = _index_journal(tests_dir)
+
+    for name, value in _iter_snippets(tests_dir, index):
+        yield name, json.dumps(value)
+
+    if index:
+        with open(os.path.join(tests_dir, JOURNAL), 'rb') as f:
+            for name, (_, start, length) in six.iteritems(index):
+                f.seek(start)
+                yield name, f.read(length).decode('utf-8')
 
 
 def load_results(filename, compression_):
@@ -247,7 +480,10 @@ def load_results(filename, compression_):
     with compression.DECOMPRESSORS[compression_](filepath) as f:
         testrun = _load(f)
 
-    return results.TestrunResult.from_dict(_update_results(testrun, filepath))
+    # The output of the tests is only decoded if it's used, most consumers
+    # only need the statuses.
+    return results.TestrunResult.from_dict(_update_results(testrun, filepath),
+                                           lazy=True)
 
 
 def set_meta(results):
@@ -289,21 +525,54 @@ def _resume(results_dir):
     meta['tests'] = collections.OrderedDict()
 
     # Load all of the test names and added them to the test list
-    tests_dir = os.path.join(results_dir, 'tests')
-    file_list = sorted(
-        (l for l in os.listdir(tests_dir) if l.endswith('.json')),
-        key=lambda p: int(os.path.splitext(p)[0]))
-
-    for file_ in file_list:
-        with open(os.path.join(tests_dir, file_), 'r') as f:
-            try:
-                meta['tests'].update(json.load(f))
-            except ValueError:
-                continue
+    for name, value in _iter_tests(os.path.join(results_dir, 'tests')):
+        meta['tests'][name] = json.loads(value)
 
     return results.TestrunResult.from_dict(meta)
 
 
+def load_completed(results_dir):
+    """Load the metadata and the status of each test of a partial run.
+
+    Returns a tuple of the metadata and an OrderedDict mapping the name of
+    each test that was started to its status name, which is 'incomplete' if
+    the test didn't finish. Only the completion index is read, none of the
+    results, so this is cheap even for a run that is nearly done.
+
+    Runs started before the index was added are read from the journal (or the
+    individual N.json files) instead, and the index is written from them so
+    that the tests written after resuming are added to a complete index.
+    """
+    with open(os.path.join(results_dir, 'metadata.json'), 'r') as f:
+        meta = json.load(f)
+    assert meta['results_version'] == CURRENT_JSON_VERSION, \
+        "Old results version, resume impossible"
+
+    tests_dir = os.path.join(results_dir, 'tests')
+    index = os.path.join(tests_dir, INDEX)
+    completed = collections.OrderedDict()
+
+    if os.path.exists(index):
+        with open(index, 'rb') as f:
+            for line in f:
+                # A partially written line is the last one
+                if not line.endswith(b'\n'):
+                    break
+                name, result = json.loads(line.decode('utf-8'))
+                completed[name] = result
+        return meta, completed
+
+    for name, counted in _iter_counted(tests_dir):
+        completed[name] = six.text_type(counted.result)
+
+    with open(index + '.tmp', 'wb') as f:
+        for name, result in six.iteritems(completed):
+            f.write(json.dumps([name, result]).encode('utf-8') + b'\n')
+    os.rename(index + '.tmp', index)
+
+    return meta, completed
+
+
 def _update_results(results, filepath):
     """ Update results to the lastest version
 
@@ -0,0 +1,437 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Running the tests of a run in worker processes, which may be on other hosts.
+
+The coordinator is the piglit run process. It builds the filtered list of
+tests like any run, but rather than running them it serves their names over a
+socket. Workers (started with piglit run --worker <host:port>) load the same
+profiles, ask the coordinator for a few tests at a time, run them with
+Test.execute, and send the results back. The coordinator logs and writes every
+result with its backend, so the run has a single results directory.
+
+Since a worker only asks for more tests when it has finished the ones it has,
+a long test only holds up the worker running it, and the others take the rest
+of the tests between them. Workers send a heartbeat while they run tests, the
+tests given to a worker that disconnects or stops sending heartbeats are
+handed out again, one at a time. A test whose worker dies every time it is
+handed out is written as a crash rather than taking every worker down.
+
+Every message is a json object on a line of its own, with a "type" key.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import collections
+import multiprocessing
+import multiprocessing.dummy
+import socket
+import threading
+import time
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import six
+from six.moves import socketserver
+
+from framework import dmesg, exceptions, monitoring, profile, results, status
+from framework.backends.json import piglit_encoder
+from framework.log import LogManager
+from framework.options import OPTIONS
+from framework.test.base import DummyTest
+
+__all__ = [
+    'Coordinator',
+    'parse_address',
+    'work',
+]
+
+# The number of seconds between the heartbeats of a worker. A worker that
+# hasn't sent anything for three times as long is assumed to be dead.
+HEARTBEAT = 10
+
+# The number of times a test is handed out before the death of its worker is
+# blamed on it.
+MAX_HANDOUTS = 2
+
+
+def parse_address(address):
+    """Split a <host>:<port> string into a (host, port) tuple."""
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise exceptions.PiglitFatalError(
+            'Invalid address "{}", it must be <host>:<port>'.format(address))
+    return host or 'localhost', int(port)
+
+
+class _Connection(object):
+    """Sends and receives messages over a socket.
+
+    Sending is thread safe, so that a worker can send heartbeats while it
+    sends results.
+    """
+
+    def __init__(self, sock):
+        self.__sock = sock
+        self.__file = sock.makefile('rb')
+        self.__lock = threading.Lock()
+
+    def send(self, type_, **message):
+        message['type'] = type_
+        data = json.dumps(message, default=piglit_encoder).encode('utf-8')
+        with self.__lock:
+            self.__sock.sendall(data + b'\n')
+
+    def receive(self):
+        """Return the next message, or None if the connection was closed."""
+        line = self.__file.readline()
+        if not line:
+            return None
+        return json.loads(line.decode('utf-8'))
+
+    def close(self):
+        self.__file.close()
+        self.__sock.close()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves one worker."""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        self.request.settimeout(coordinator.heartbeat * 3)
+        conn = _Connection(self.request)
+        try:
+            coordinator.serve(self, conn)
+        except (socket.error, ValueError):
+            # socket.timeout is a socket.error, a worker that stopped sending
+            # heartbeats is handled like one that disconnected.
+            pass
+        finally:
+            coordinator.requeue(self)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator(object):
+    """Serves the tests of a run to workers.
+
+    The tests are handed out in the order of the profiles, and a test is
+    handed out again, on its own, if the worker it was given to dies before
+    sending its result. A test that was handed out max_handouts times and
+    never got a result is written as a crash.
+
+    Arguments:
+    address -- a (host, port) tuple to listen on, port 0 picks a free port.
+    setup -- a dictionary sent to the workers when they connect, with the
+             names of the profiles ('profiles'), the dmesg and monitoring
+             options ('dmesg' and 'monitoring').
+
+    Keyword Arguments:
+    heartbeat -- the number of seconds between the heartbeats of workers.
+                 Default: HEARTBEAT
+    max_handouts -- the number of times a test is handed out.
+                    Default: MAX_HANDOUTS
+    """
+
+    def __init__(self, address, setup, heartbeat=HEARTBEAT,
+                 max_handouts=MAX_HANDOUTS):
+        self.setup = dict(setup)
+        self.heartbeat = heartbeat
+        self.max_handouts = max_handouts
+        self.__server = _Server(address, _Handler)
+        self.__server.coordinator = self
+        self.__lock = threading.Condition()
+        self.__pending = collections.deque()
+        self.__running = {}
+        self.__finished = set()
+        self.__handouts = collections.Counter()
+        self.__total = 0
+        self.__abort = None
+        self.__write = None
+
+    @property
+    def address(self):
+        """The (host, port) tuple the coordinator listens on."""
+        return self.__server.server_address
+
+    def run(self, profiles, logger, backend):
+        """Hand out the tests of profiles until they have all run.
+
+        Raises PiglitAbort if a worker detected a monitored error.
+
+        Arguments:
+        profiles -- a list of TestProfiles, in the order of setup['profiles'].
+        logger -- the name of a logger, see log.LogManager.
+        backend -- a backend instance to write the results with.
+        """
+        self.__pending.extend(
+            (i, name) for i, p in enumerate(profiles)
+            for name, _ in p.itertests())
+        self.__total = len(self.__pending)
+        if not self.__total:
+            self.__server.server_close()
+            raise exceptions.PiglitUserError('no matching tests')
+
+        log = LogManager(logger, self.__total)
+
+        def write(name, result, status_):
+            l = log.get()
+            l.start(name)
+            with backend.write_test(name) as w:
+                w(result)
+            l.log(status_)
+
+        self.__write = write
+        thread = threading.Thread(target=self.__server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print('Waiting for workers on {}:{}'.format(*self.address))
+
+        try:
+            with self.__lock:
+                while (self.__abort is None and
+                       len(self.__finished) < self.__total):
+                    self.__lock.wait(1)
+                # Results that arrive from now on are not written
+                self.__write = None
+        finally:
+            self.__server.shutdown()
+            self.__server.server_close()
+            log.get().summary()
+
+        if self.__abort is not None:
+            raise exceptions.PiglitAbort(self.__abort)
+
+    def serve(self, worker, conn):
+        """Handle the messages of a worker until it disconnects."""
+        while True:
+            message = conn.receive()
+            if message is None:
+                return
+            type_ = message['type']
+
+            if type_ == 'hello':
+                conn.send('setup', options=dict(OPTIONS),
+                          heartbeat=self.heartbeat, **self.setup)
+            elif type_ == 'request':
+                tests = self.__take(worker, message['count'])
+                if tests is None:
+                    conn.send('tests', tests=[])
+                elif tests:
+                    conn.send('tests', tests=tests)
+                else:
+                    conn.send('wait')
+            elif type_ == 'result':
+                self.__finish(worker, (message['index'], message['name']),
+                              results.TestResult.from_dict(message['result']),
+                              message['status'])
+            elif type_ == 'abort':
+                with self.__lock:
+                    self.__abort = message['message']
+                    self.__lock.notify_all()
+            # heartbeats only need to be received
+
+    def __take(self, worker, count):
+        """Hand out up to count tests to worker.
+
+        Returns None if all of the tests have run, or an empty list if the
+        remaining tests are running on other workers, which could still die.
+        """
+        with self.__lock:
+            if self.__abort is not None or (
+                    not self.__pending and not any(self.__running.values())):
+                return None
+            running = self.__running.setdefault(worker, [])
+            tests = []
+            while self.__pending and len(tests) < count:
+                test = self.__pending[0]
+                # A test that was handed out before may have killed its
+                # worker, so it is handed out on its own, and the tests it
+                # would share a worker with aren't blamed if it does again.
+                retry = self.__handouts[test] > 0
+                if retry and tests:
+                    break
+                self.__pending.popleft()
+                if test not in self.__finished:
+                    self.__handouts[test] += 1
+                    running.append(test)
+                    tests.append(test)
+                if retry:
+                    break
+            return tests
+
+    def __finish(self, worker, test, result, status_):
+        """Write the result of a test, test is a (profile index, name) tuple.
+        """
+        with self.__lock:
+            if test in self.__running.get(worker, []):
+                self.__running[worker].remove(test)
+            # A test that was handed out again after its worker was presumed
+            # dead may be finished twice.
+            if test in self.__finished or self.__write is None:
+                return
+            self.__finished.add(test)
+            self.__write(test[1], result, status_)
+            self.__lock.notify_all()
+
+    def requeue(self, worker):
+        """Hand out the tests that worker was running again.
+
+        A test that has been handed out max_handouts times is written as a
+        crash instead.
+        """
+        with self.__lock:
+            running = [t for t in self.__running.pop(worker, [])
+                       if t not in self.__finished]
+            requeued = []
+            for test in running:
+                if self.__handouts[test] < self.max_handouts:
+                    requeued.append(test)
+                elif self.__write is not None:
+                    result = results.TestResult(status.CRASH)
+                    result.err = ('The worker running this test died {} '
+                                  'times.'.format(self.__handouts[test]))
+                    self.__finished.add(test)
+                    self.__write(test[1], result, status.CRASH.name)
+            self.__pending.extendleft(reversed(requeued))
+            self.__lock.notify_all()
+
+
+def _heartbeat(conn, interval, stop):
+    """Send a heartbeat every interval seconds until stop is set."""
+    while not stop.wait(interval):
+        try:
+            conn.send('heartbeat')
+        except socket.error:
+            return
+
+
+def _load_profiles(setup):
+    """Load the profiles a coordinator runs, and set their options."""
+    profiles = [profile.load_test_profile(p) for p in setup['profiles']]
+
+    if setup.get('dmesg'):
+        dmesg_ = dmesg.get_dmesg(setup['dmesg'])
+        for p in profiles:
+            p.options['dmesg'] = dmesg_
+
+    if setup.get('monitoring'):
+        monitor = monitoring.Monitoring(setup['monitoring'])
+        for p in profiles:
+            p.options['monitor'] = monitor
+
+    return profiles
+
+
+def work(address):
+    """Run the tests a coordinator hands out until there are none left.
+
+    The tests that aren't thread safe in each batch are run one at a time,
+    then the rest are run concurrently, so each host should only have one
+    worker. With dmesg or monitoring all of the tests are run one at a time.
+
+    Arguments:
+    address -- a (host, port) tuple of the coordinator.
+    """
+    conn = _Connection(socket.create_connection(address))
+    conn.send('hello')
+    setup = conn.receive()
+
+    # The options are the coordinator's, but the source directory is this
+    # host's.
+    source = OPTIONS.env['PIGLIT_SOURCE_DIR']
+    for key, value in six.iteritems(setup['options']):
+        setattr(OPTIONS, key, value)
+    OPTIONS.env['PIGLIT_SOURCE_DIR'] = source
+
+    profiles = _load_profiles(setup)
+    serial = bool(setup.get('dmesg') or setup.get('monitoring'))
+    slots = 1 if serial else multiprocessing.cpu_count()
+    pool = multiprocessing.dummy.Pool(slots)
+    started = set()
+
+    def run_test(test):
+        index, name = test
+        p = profiles[index]
+        if name in p.test_list:
+            test_ = p.test_list[name]
+        else:
+            test_ = DummyTest(name, status.NOTRUN)
+        log = profile._ResultLog()  # pylint: disable=protected-access
+        test_.execute(name, log, p.options)
+        conn.send('result', index=index, name=name, result=test_.result,
+                  status=log.status)
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat,
+                                 args=(conn, setup['heartbeat'], stop))
+    heartbeat.daemon = True
+    heartbeat.start()
+
+    try:
+        while True:
+            conn.send('request', count=slots)
+            message = conn.receive()
+            if message is None or (message['type'] == 'tests' and
+                                   not message['tests']):
+                break
+            if message['type'] == 'wait':
+                time.sleep(1)
+                continue
+
+            tests = [tuple(t) for t in message['tests']]
+            for index in set(i for i, _ in tests) - started:
+                profiles[index].setup()
+                started.add(index)
+
+            concurrent = [t for t in tests
+                          if not serial and _is_concurrent(profiles, t)]
+            for test in tests:
+                if test not in concurrent:
+                    run_test(test)
+            pool.map(run_test, concurrent)
+
+            aborted = [p for p in profiles
+                       if p.options['monitor'].abort_needed]
+            if aborted:
+                conn.send('abort',
+                          message=aborted[0].options['monitor'].error_message)
+                break
+    finally:
+        stop.set()
+        pool.close()
+        pool.join()
+        for index in started:
+            profiles[index].teardown()
+        profile.close_readers(profiles)
+        conn.close()
+
+
+def _is_concurrent(profiles, test):
+    index, name = test
+    p = profiles[index]
+    return name not in p.test_list or p.test_list[name].run_concurrent
@@ -41,6 +41,7 @@ __all__ = [
     'PLATFORMS',
     'PiglitConfig',
     'collect_system_info',
+    'get_cache_path',
     'parse_listfile',
 ]
 
@@ -117,6 +118,27 @@ def get_config(arg=None):
                 pass
 
 
+def get_cache_path(value, *default):
+    """Return the path of one of piglit's caches, or None if it's disabled.
+
+    Arguments:
+    value -- the path the user configured, None if they didn't set one. The
+             value "none" (in any case) disables the cache.
+    default -- components of the path used when value is None, relative to
+               $XDG_CACHE_HOME/piglit (or ~/.cache/piglit)
+
+    """
+    if value is None:
+        # expanduser falls back to the password database when HOME isn't set
+        value = os.path.join(
+            os.environ.get('XDG_CACHE_HOME') or
+            os.path.join(os.path.expanduser('~'), '.cache'),
+            'piglit', *default)
+    if value.lower() == 'none':
+        return None
+    return os.path.expanduser(value)
+
+
 def check_dir(dirname, failifexists=False, handler=None):
     """Check for the existence of a directory and create it if possible.
 
@@ -227,6 +249,10 @@ class lazy_property(object):  # pylint: disable=invalid-name,too-few-public-meth
         self.__func = func
 
     def __get__(self, instance, cls):
+        # Accessed through the class (by mock's autospec for example), there's
+        # nothing to calculate.
+        if instance is None:
+            return self
         value = self.__func(instance)
         setattr(instance, self.__func.__name__, value)
         return value
@@ -21,9 +21,10 @@
 
 """ Module implementing classes for reading posix dmesg
 
-Currently this module only has the default DummyDmesg, and a LinuxDmesg.
-The method used on Linux requires that timetamps are enabled, and no other
-posix system has timestamps.
+Currently this module only has the default DummyDmesg, and on Linux a
+KmsgDmesg, which reads /dev/kmsg, and a LinuxDmesg, which calls dmesg and is
+used when /dev/kmsg can't be read. The method used by LinuxDmesg requires that
+timetamps are enabled, and no other posix system has timestamps.
 
 On OSX and *BSD one would likely want to implement a system that reads the
 sysloger, since timestamps can be added by the sysloger, and are not inserted
@@ -39,10 +40,15 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import abc
+import collections
+import errno
 import gzip
+import os
 import re
+import select
 import subprocess
 import sys
+import threading
 import warnings
 
 import six
@@ -52,11 +58,40 @@ from framework import exceptions
 __all__ = [
     'BaseDmesg',
     'DummyDmesg',
+    'KmsgDmesg',
     'LinuxDmesg',
     'get_dmesg',
+    'parse_kmsg_record',
 ]
 
 
+def parse_kmsg_record(line):
+    """Parse a line read from /dev/kmsg.
+
+    Returns a (level, sequence number, message) tuple, with the message
+    formatted the way dmesg prints it, or None if the line isn't the start of
+    a record. Lines starting with a space continue the previous record with
+    key/value pairs, which dmesg doesn't print either.
+
+    Arguments:
+    line -- a line of /dev/kmsg as bytes, without the newline
+
+    """
+    if not line or line.startswith(b' '):
+        return None
+    try:
+        prefix, message = line.split(b';', 1)
+        fields = prefix.split(b',')
+        level = int(fields[0]) & 7
+        seq = int(fields[1])
+        usec = int(fields[2])
+    except (ValueError, IndexError):
+        return None
+
+    return level, seq, '[{:5d}.{:06d}] {}'.format(
+        usec // 1000000, usec % 1000000, message.decode('utf-8', 'replace'))
+
+
 @six.add_metaclass(abc.ABCMeta)
 class BaseDmesg(object):
     """ Abstract base class for Dmesg derived objects
@@ -113,6 +148,13 @@ class BaseDmesg(object):
         result -- A TestResult instance
 
         """
+        # Get a new snapshot of dmesg
+        self.update_dmesg()
+
+        return self._update_result(result, self._new_messages)
+
+    def _update_result(self, result, messages):
+        """Update result with the messages logged while the test ran."""
         def replace(res):
             """ helper to replace statuses with the new dmesg status
 
@@ -126,15 +168,12 @@ class BaseDmesg(object):
                 "fail": "dmesg-fail"
             }.get(res, res)
 
-        # Get a new snapshot of dmesg
-        self.update_dmesg()
-
         # if update_dmesg() found new entries replace the results of the test
         # and subtests
-        if self._new_messages:
+        if messages:
 
             if self.regex:
-                for line in self._new_messages:
+                for line in messages:
                     if self.regex.search(line):
                         break
                 else:
@@ -147,10 +186,14 @@ class BaseDmesg(object):
                 result.subtests[key] = replace(value)
 
             # Add the dmesg values to the result
-            result.dmesg = "\n".join(self._new_messages)
+            result.dmesg = "\n".join(messages)
 
         return result
 
+    def close(self):
+        """Release anything held open to read the kernel log."""
+        pass
+
     def __repr__(self):
         return 'BaseDmesg()'
 
@@ -227,6 +270,195 @@ class LinuxDmesg(BaseDmesg):
         return 'LinuxDmesg()'
 
 
+class KmsgDmesg(BaseDmesg):
+    """ Read the kernel log from /dev/kmsg on Linux
+
+    Rather than reading the whole ring buffer before and after each test, this
+    reads /dev/kmsg from where it was opened, so each message is only read
+    once. Every record in /dev/kmsg has a sequence number, when a test starts
+    the sequence number of the last message read is stored, and when it ends
+    the messages read since then are the ones logged while it ran. Messages
+    are kept only as long as a running test may still need them.
+
+    The messages are read by a reader thread shared by all of the tests, so
+    that the ring buffer doesn't overwrite any messages during a long test,
+    and also before the start and at the end of each test, so that no message
+    that was logged before is missed.
+
+    The start of each test is tracked per thread, so the tests running in
+    different threads each get the messages logged while they ran.
+
+    Only messages of the levels that LinuxDmesg reads (notice and more
+    severe) are kept, and they are formatted like dmesg does.
+
+    Arguments:
+    path -- the file to read the kernel log from, /dev/kmsg by default.
+
+    """
+    # Levels above this (info and debug) are ignored, like the --level
+    # argument of LinuxDmesg.DMESG_COMMAND does.
+    _MAX_LEVEL = 5
+
+    def __init__(self, path='/dev/kmsg'):
+        """ Create a kmsg instance
+
+        Raises OSError if path cannot be opened.
+        """
+        # BaseDmesg.__init__ reads dmesg to populate it, which isn't needed
+        # here since only the messages after the end of the log are read.
+        self._new_messages = []
+        self.regex = None
+
+        self._path = path
+        self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+        # Only the messages logged from now on are interesting.
+        os.lseek(self._fd, 0, os.SEEK_END)
+
+        self._lock = threading.Lock()
+        self._buffer = b''
+        self._records = collections.deque()
+        self._last = -1
+        self._starts = {}
+
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._read_loop)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _read(self):
+        """Read and store all of the messages available, returning how many
+        records were read.
+
+        Must be called with the lock held.
+        """
+        count = 0
+        # A copy sent to a worker process has no file to read.
+        if self._fd is None:
+            return count
+        while True:
+            try:
+                data = os.read(self._fd, 8192)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                elif e.errno == errno.EPIPE:
+                    # Messages were overwritten in the ring buffer before they
+                    # could be read, the next read continues after them.
+                    continue
+                raise
+            if not data:
+                break
+
+            # A read of /dev/kmsg returns exactly one record, but a regular
+            # file (such as a saved copy) may return several or part of one.
+            lines = (self._buffer + data).split(b'\n')
+            self._buffer = lines.pop()
+            for line in lines:
+                count += 1
+                self._add(line)
+        return count
+
+    def _add(self, line):
+        """Store a single line of /dev/kmsg."""
+        record = parse_kmsg_record(line)
+        if record is None:
+            return
+
+        level, seq, message = record
+        self._last = seq
+        if level <= self._MAX_LEVEL:
+            self._records.append((seq, message))
+
+    def _prune(self):
+        """Drop the messages no running test needs.
+
+        Must be called with the lock held.
+        """
+        oldest = min(six.itervalues(self._starts)) if self._starts \
+            else self._last
+        while self._records and self._records[0][0] <= oldest:
+            self._records.popleft()
+
+    def _read_loop(self):
+        """Body of the reader thread."""
+        while not self._stop.is_set():
+            try:
+                ready = select.select([self._fd], [], [], 0.5)[0]
+                if not ready:
+                    continue
+                with self._lock:
+                    count = self._read()
+                    self._prune()
+            except (OSError, select.error, ValueError):
+                # The file was closed.
+                return
+            if not count:
+                # At the end of a regular file, which is always ready.
+                self._stop.wait(0.1)
+
+    def update_dmesg(self):
+        """ Mark the start of a test in the calling thread
+
+        Also sets _new_messages to the messages since the last call in this
+        thread.
+
+        """
+        key = threading.current_thread().ident
+        with self._lock:
+            self._read()
+            start = self._starts.get(key, self._last)
+            self._new_messages = [m for s, m in self._records if s > start]
+            self._starts[key] = self._last
+            self._prune()
+
+    def update_result(self, result):
+        """ Takes a TestResult object and updates it with dmesg statuses
+
+        The messages are those logged since update_dmesg was last called in
+        the calling thread.
+
+        """
+        key = threading.current_thread().ident
+        with self._lock:
+            self._read()
+            start = self._starts.pop(key, self._last)
+            messages = [m for s, m in self._records if s > start]
+            self._prune()
+        return self._update_result(result, messages)
+
+    def close(self):
+        """Stop the reader thread and close the file."""
+        self._stop.set()
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+            os.close(self._fd)
+            self._fd = None
+
+    def __getstate__(self):
+        # The tests are sent to worker processes with their options, which
+        # include this. The kernel log is only read in the piglit process, so
+        # a copy without the file and the reader is sent, which doesn't read
+        # any messages.
+        state = self.__dict__.copy()
+        for key in ['_fd', '_lock', '_stop', '_reader']:
+            del state[key]
+        state['_buffer'] = b''
+        state['_records'] = collections.deque()
+        state['_starts'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._fd = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reader = None
+
+    def __repr__(self):
+        return 'KmsgDmesg()'
+
+
 class DummyDmesg(BaseDmesg):
     """ An dummy class for dmesg on non unix-like systems
 
@@ -261,5 +493,10 @@ def get_dmesg(not_dummy=True):
 
     """
     if sys.platform.startswith('linux') and not_dummy:
-        return LinuxDmesg()
+        # /dev/kmsg can only be read by root unless dmesg_restrict is 0, and
+        # older kernels don't have it, in both cases call dmesg instead.
+        try:
+            return KmsgDmesg()
+        except OSError:
+            return LinuxDmesg()
     return DummyDmesg()
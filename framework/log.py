@@ -32,7 +32,9 @@ from __future__ import (
 import sys
 import abc
 import itertools
+import socket
 import threading
+import time
 import collections
 try:
     import simplejson as json
@@ -41,6 +43,7 @@ except ImportError:
 
 import six
 from six.moves.BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from six.moves.socketserver import ThreadingMixIn
 
 from framework.core import PIGLIT_CONFIG
 from framework import grouptools
@@ -267,44 +270,207 @@ class DummyLog(BaseLog):
         pass
 
 
+def _publish(state):
+    """Replace the snapshot of the state that the http server reads.
+
+    This must be called with the state lock held. The snapshot is replaced
+    rather than modified, so the server can read it without the lock.
+    """
+    state['snapshot'] = {
+        'complete': state['complete'],
+        'running': list(state['running']),
+        'total': state['total'],
+        'results': dict(state['summary']),
+        'done': (state.get('finished', False) or
+                 state['complete'] >= state['total']),
+    }
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    """An HTTPServer that handles each request in a thread of its own."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # The number of recent completions the throughput is measured over
+    WINDOW = 100
+
+    def __init__(self, address, handler, state):
+        HTTPServer.__init__(self, address, handler)
+        self.state = state
+        self.started = time.time()
+        # Set once a client has been sent the results of a finished run
+        self.delivered = threading.Event()
+
+    def summary(self):
+        """Return the counters, with the throughput and the ETA."""
+        # The snapshot must be read before the events, so that when it says
+        # the run is done every event is already in the list.
+        summary = dict(self.state['snapshot'])
+        events = self.state['events']
+        now = time.time()
+
+        # The throughput of the last WINDOW tests, so that it follows the run
+        # slowing down or speeding up.
+        if len(events) > self.WINDOW:
+            count, since = self.WINDOW, events[-self.WINDOW - 1][2]
+        else:
+            count, since = len(events), self.started
+        rate = count / (now - since) if now > since else 0.0
+
+        remaining = summary['total'] - summary['complete']
+        if summary['done']:
+            eta = 0.0
+        elif rate:
+            eta = remaining / rate
+        else:
+            eta = None
+
+        summary['elapsed'] = now - self.started
+        summary['rate'] = rate
+        summary['eta'] = eta
+        return summary
+
+
 class HTTPLogServer(threading.Thread):
+    """Serves the progress of the run over http.
+
+    /summary returns a json snapshot of the counters, with the throughput
+    ('rate', in tests per second) and the estimated number of seconds until
+    the run is done ('eta'). /events is a stream of server-sent events, one
+    for each test that completes, and finally an "end" event with the
+    summary. /stream is the same as newline delimited json. The id of each
+    event is its index, the streams start after the event given by the
+    Last-Event-ID header or the "from" query, or at the start of the run.
+
+    Each request is handled in a thread of its own, and none of them take the
+    state lock: the counters are read from a snapshot that HTTPLog replaces,
+    and the events from a list that is only appended to.
+
+    The server keeps running after the run is done, until the final results
+    have been sent to a client, and [http] linger seconds have passed.
+    """
+    # The number of seconds between checks for new events
+    POLL = 0.2
+
     class RequestHandler(BaseHTTPRequestHandler):
         INDENT = 4
 
         def do_GET(self):
-            if self.path == "/summary":
-                self.send_response(200)
-                self.end_headers()
-                with self.server.state_lock:
-                    status = {
-                        "complete": self.server.state["complete"],
-                        "running" : self.server.state["running"],
-                        "total"   : self.server.state["total"],
-                        "results" : self.server.state["summary"],
-                    }
-                self.wfile.write(json.dumps(status, indent=self.INDENT))
+            path, _, query = self.path.partition('?')
+            if path == "/summary":
+                self._send_summary()
+            elif path in ["/events", "/stream"]:
+                self._send_events(path == "/events", query)
             else:
                 self.send_response(404)
                 self.end_headers()
 
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            # Don't print every request in the middle of the test output
+            pass
+
+        def _send_summary(self):
+            summary = self.server.summary()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(
+                json.dumps(summary, indent=self.INDENT).encode('utf-8'))
+            if summary['done']:
+                self.server.delivered.set()
+
+        def _first_event(self, query):
+            """Return the index of the first event to send."""
+            last = self.headers.get('Last-Event-ID')
+            if last is None:
+                for pair in query.split('&'):
+                    key, _, value = pair.partition('=')
+                    if key == 'from':
+                        last = value
+            try:
+                return int(last) + 1 if last is not None else 0
+            except ValueError:
+                return 0
+
+        def _send_events(self, sse, query):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream' if sse
+                             else 'application/x-ndjson')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+
+            def send(data, id_=None, event=None):
+                data = json.dumps(data)
+                if sse:
+                    lines = []
+                    if event is not None:
+                        lines.append('event: {}'.format(event))
+                    if id_ is not None:
+                        lines.append('id: {}'.format(id_))
+                    lines.append('data: {}\n\n'.format(data))
+                    data = '\n'.join(lines)
+                else:
+                    data += '\n'
+                self.wfile.write(data.encode('utf-8'))
+
+            index = self._first_event(query)
+            events = self.server.state['events']
+            try:
+                while True:
+                    # Checked before reading the events, see summary()
+                    done = self.server.state['snapshot']['done']
+                    for name, status, end in events[index:]:
+                        send({'id': index, 'name': name, 'result': status,
+                              'time': end}, id_=index)
+                        index += 1
+                    if done:
+                        send(self.server.summary(), event='end')
+                        self.server.delivered.set()
+                        return
+                    self.wfile.flush()
+                    time.sleep(HTTPLogServer.POLL)
+            except socket.error:
+                # The client went away
+                pass
+
     def __init__(self, state, state_lock):
         super(HTTPLogServer, self).__init__()
         port = int(PIGLIT_CONFIG.safe_get("http", "port", fallback=8080))
-        self._httpd = HTTPServer(("", port), HTTPLogServer.RequestHandler)
-        self._httpd.state = state
-        self._httpd.state_lock = state_lock
+        self._linger = float(
+            PIGLIT_CONFIG.safe_get("http", "linger", fallback=10))
+        with state_lock:
+            state['events'] = []
+            _publish(state)
+        self._httpd = _HTTPServer(("", port), HTTPLogServer.RequestHandler,
+                                  state)
+
+    @property
+    def address(self):
+        """The (host, port) tuple the server listens on."""
+        return self._httpd.server_address
 
     def run(self):
-        while True:
-            with self._httpd.state_lock:
-                # stop handling requests after the request for the final results
-                if self._httpd.state["complete"] == self._httpd.state["total"]:
-                    break;
-            self._httpd.handle_request()
+        serve = threading.Thread(target=self._httpd.serve_forever)
+        serve.daemon = True
+        serve.start()
+
+        while not self._httpd.state['snapshot']['done']:
+            time.sleep(self.POLL)
+
+        # Stop as soon as a client has the final summary, but don't keep
+        # piglit from exiting for longer than linger if none comes.
+        self._httpd.delivered.wait(self._linger)
+
+        self._httpd.shutdown()
+        self._httpd.server_close()
 
 
 class HTTPLog(BaseLog):
-    """ A Logger that serves status information over http """
+    """ A Logger that serves status information over http
+
+    Along with the counters it records the name, status and end time of each
+    test that completes, which HTTPLogServer streams.
+    """
 
     def __init__(self, state, state_lock):
         super(HTTPLog, self).__init__(state, state_lock)
@@ -314,6 +480,7 @@ class HTTPLog(BaseLog):
         with self._LOCK:
             self._name = name
             self._state['running'].append(self._name)
+            _publish(self._state)
 
     def log(self, status):
         with self._LOCK:
@@ -321,9 +488,17 @@ class HTTPLog(BaseLog):
             self._state['complete'] += 1
             assert status in self.SUMMARY_KEYS
             self._state['summary'][str(status)] += 1
+            # The event must be added before the snapshot can say the run is
+            # done.
+            self._state['events'].append(
+                (self._name, str(status), time.time()))
+            _publish(self._state)
 
     def summary(self):
-        pass
+        # The run is over, even if it stopped before all of the tests ran
+        with self._LOCK:
+            self._state['finished'] = True
+            _publish(self._state)
 
 
 class LogManager(object):
@@ -371,3 +546,16 @@ class LogManager(object):
     def get(self):
         """ Return a new log instance """
         return self._log(self._state, self._state_lock)
+
+    def account(self, status, count):
+        """Count tests that completed without being run through a Log.
+
+        This is for tests that are given a result in bulk, like the ones skipped
+        before the run starts. Nothing is printed, the counts show up the next
+        time a Log prints.
+        """
+        with self._state_lock:
+            self._state['complete'] += count
+            self._state['summary'][status] += count
+            if 'snapshot' in self._state:
+                _publish(self._state)
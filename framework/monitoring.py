@@ -29,29 +29,62 @@ monitored-errors.
 When one of the regex is found in the corresponding source Piglit will abort
 with code 3.
 
+Rules that watch the same source share a single reader, and the regexes of
+the rules of a source are combined into one. The sources are read
+incrementally, both after each test and by a background thread, so an error
+is noticed shortly after it is logged however many tests are running.
+
 """
 
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import abc
+import collections
 import errno
 import os
 import re
+import select
+import stat
+import threading
+import time
 
 import six
 
 from framework.core import PIGLIT_CONFIG
-from framework.dmesg import LinuxDmesg
+from framework.dmesg import LinuxDmesg, parse_kmsg_record
 from framework import exceptions
 
 __all__ = [
     'BaseMonitoring',
     'Monitoring',
     'MonitoringFile',
+    'MonitoringKmsg',
     'MonitoringLinuxDmesg',
 ]
 
+# The file dmesg rules read when they only select levels
+_KMSG = '/dev/kmsg'
+
+_LEVELS = {
+    'emerg': 0,
+    'alert': 1,
+    'crit': 2,
+    'err': 3,
+    'warn': 4,
+    'notice': 5,
+    'info': 6,
+    'debug': 7,
+}
+
+# How long the background thread waits between reads of the sources that
+# can't be waited on with select, like regular files.
+_INTERVAL = 0.1
+
+# Regexes that use these can't be combined with others, since they would
+# change the meaning of the others (global flags) or refer to the wrong group
+# (numbered backreferences).
+_UNCOMBINABLE = re.compile(r'^\(\?[aiLmsux]+\)|\\[1-9]')
 
 
 class Monitoring(object):
@@ -61,6 +94,11 @@ class Monitoring(object):
     and initializes the monitoring objects. Their type must be derived from
     BaseMonitoring and specialized according the field 'type'.
 
+    Each source is only read by one monitoring object, however many rules
+    watch it. The sources are read each time update_monitoring or
+    check_monitoring is called, and by a background thread, which sets
+    abort_needed as soon as a rule matches. This object is thread safe.
+
     """
 
     # starting time: user must know current machine/GPU state before
@@ -74,6 +112,10 @@ class Monitoring(object):
         """Create a LinuxMonitored instance"""
         # Get the monitoring rules from piglit.conf and store them into a dict.
         self._monitoring_rules = {}
+        self._sources = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reader = None
 
         if monitoring_enabled and PIGLIT_CONFIG.has_section('monitored-errors'):
             for key, _ in PIGLIT_CONFIG.items('monitored-errors'):
@@ -84,6 +126,23 @@ class Monitoring(object):
 
                     self.add_rule(key, type, parameters, regex)
 
+    def __getstate__(self):
+        # The tests are sent to worker processes with their options, which
+        # include this. Monitoring is only done in the piglit process, so a
+        # copy without any rules is sent.
+        state = self.__dict__.copy()
+        for key in ['_lock', '_stop', '_reader', '_sources']:
+            del state[key]
+        state['_monitoring_rules'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._sources = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reader = None
+
     @property
     def abort_needed(self):
         """Simply return if _abort_error variable is not empty"""
@@ -98,7 +157,8 @@ class Monitoring(object):
         """Add a new monitoring rule
 
         This method adds a new monitoring rule. The type must be file,
-        locked_file or dmesg.
+        locked_file or dmesg. If another rule already watches the same source
+        it's reused.
 
         Arguments:
         key -- The key for storing the rule in a dict
@@ -108,22 +168,31 @@ class Monitoring(object):
         regex -- The rule regex
 
         """
-        rule = None
-
-        if type == 'file':
-            rule = MonitoringFile(parameters,
-                                  regex)
-        elif type == 'locked_file':
-            rule = MonitoringFile(parameters,
-                                  regex, True)
+        if type in ['file', 'locked_file']:
+            source_key = ('file', os.path.abspath(parameters))
         elif type == 'dmesg':
-            rule = MonitoringLinuxDmesg(parameters,
-                                        regex)
+            source_key = ('dmesg', tuple(parameters.split()))
         else:
             raise exceptions.PiglitFatalError(
                 "No available monitoring class for the type {}.".format(type))
 
-        self._monitoring_rules[key] = rule
+        self.delete_rule(key)
+        with self._lock:
+            source = self._sources.get(source_key)
+            if source is None:
+                if type in ['file', 'locked_file']:
+                    source = MonitoringFile(parameters)
+                else:
+                    source = _dmesg_source(parameters)
+                self._sources[source_key] = source
+
+            source.add_rule(key, regex)
+            self._monitoring_rules[key] = source
+
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_loop)
+            self._reader.daemon = True
+            self._reader.start()
 
     def delete_rule(self, key):
         """Remove a monitoring rule
@@ -132,36 +201,90 @@ class Monitoring(object):
         key -- The rule key
 
         """
-        self._monitoring_rules.pop(key, None)
+        with self._lock:
+            source = self._monitoring_rules.pop(key, None)
+            if source is None:
+                return
+            source.remove_rule(key)
+            if not source.rules:
+                for source_key, value in list(six.iteritems(self._sources)):
+                    if value is source:
+                        del self._sources[source_key]
+                source.close()
+
+    def _update(self, sources=None):
+        """Read the new messages of sources (all of them by default) and
+        check them against the rules.
+
+        Must be called with the lock held. Returns True if any source had new
+        messages.
+        """
+        found = False
+        for source in sources or list(six.itervalues(self._sources)):
+            source.update_monitoring()
+            if not source.new_messages:
+                continue
+            found = True
+            match = source.check_monitoring()
+            if match is not None and self._abort_error is None:
+                self._abort_error = "From the rule {}:\n{}".format(*match)
+        return found
+
+    def _read_loop(self):
+        """Body of the background thread."""
+        last = {}
+        while not self._stop.is_set() and not self.abort_needed:
+            with self._lock:
+                sources = list(six.itervalues(self._sources))
+            fds = [s.fileno() for s in sources if s.fileno() is not None]
+
+            try:
+                if fds:
+                    select.select(fds, [], [], _INTERVAL)
+                else:
+                    self._stop.wait(_INTERVAL)
+            except (OSError, select.error, ValueError):
+                # A source was closed while waiting on it.
+                continue
+
+            now = time.time()
+            due = [s for s in sources
+                   if now - last.get(id(s), 0) >= s.poll_interval]
+            for source in due:
+                last[id(source)] = now
+            with self._lock:
+                found = self._update(
+                    [s for s in due if s in self._sources.values()])
+            if not found:
+                # Nothing new, wait so that a source that is always ready
+                # (at the end of a pipe) doesn't make this spin.
+                self._stop.wait(_INTERVAL)
 
     def update_monitoring(self):
         """Update the new messages for each monitoring object"""
-        if self._monitoring_rules:
-            for monitoring_rule in six.itervalues(self._monitoring_rules):
-                monitoring_rule.update_monitoring()
+        with self._lock:
+            self._update()
 
     def check_monitoring(self):
         """Check monitoring objects statue
 
-        This method checks the state for each monitoring object.
-        If one of them found the pattern in the new messages,
-        set itself on abort_needed state.
+        This method reads the new messages of each monitoring object. If one
+        of them matches a rule set the abort_needed state. Once it's set it
+        is never cleared.
 
         """
-        # Get a new snapshot of the source
-        self.update_monitoring()
-
-        if self._monitoring_rules:
-            for rule_key, monitoring_rule in six.iteritems(
-                    self._monitoring_rules):
-                # Get error message
-                self._abort_error = monitoring_rule.check_monitoring()
-                # if error message is not empty, abort is requested
-                if self.abort_needed:
-                    self._abort_error = "From the rule {}:\n{}".format(
-                        rule_key,
-                        self._abort_error)
-                    break
+        with self._lock:
+            self._update()
+
+    def close(self):
+        """Stop the background thread and close the sources."""
+        self._stop.set()
+        if self._reader is not None:
+            self._reader.join()
+        with self._lock:
+            for source in six.itervalues(self._sources):
+                source.close()
+            self._sources.clear()
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -172,27 +295,76 @@ class BaseMonitoring(object):
     super() in __init__(). It provides a concrete implementation of the
     check_monitoring() method, which should be suitible for all subclasses.
 
+    A monitoring object reads one source, and any number of rules can be
+    added to it with add_rule. Their regexes are combined into one, so each
+    new message is only searched once.
+
     The update_monitoring() method need to be override for all subclasses.
 
     """
+    # The least number of seconds between reads by the background thread.
+    poll_interval = 0
+
     @abc.abstractmethod
-    def __init__(self, monitoring_source, regex):
+    def __init__(self, monitoring_source):
         """Abstract constructor for BaseMonitoring subclasses
 
         Arguments;
         monitoring_source -- The source to monitor
-        regex -- The errors pattern
 
         """
         self._monitoring_source = monitoring_source
-        self._monitoring_regex = re.compile(regex)
-        self._new_messages = ''
+        self._rules = collections.OrderedDict()
+        self._monitoring_regex = None
+        self._groups = {}
+        self._new_messages = []
 
     @property
     def new_messages(self):
-        """Simply return if _abort_error variable is not empty"""
+        """Return the messages read by the last update_monitoring call"""
         return self._new_messages
 
+    @property
+    def rules(self):
+        """The keys of the rules of this source"""
+        return list(self._rules)
+
+    def add_rule(self, key, regex):
+        """Add a rule, which matches new messages with regex"""
+        self._rules[key] = re.compile(regex)
+        self._combine()
+
+    def remove_rule(self, key):
+        """Remove a rule"""
+        self._rules.pop(key, None)
+        self._combine()
+
+    def _combine(self):
+        """Combine the regexes that can be into one, with a named group for
+        each rule.
+        """
+        self._groups = {}
+        parts = []
+        for i, (key, regex) in enumerate(six.iteritems(self._rules)):
+            if _UNCOMBINABLE.search(regex.pattern):
+                continue
+            name = '_rule{}'.format(i)
+            self._groups[name] = key
+            parts.append('(?P<{}>{})'.format(name, regex.pattern))
+
+        self._monitoring_regex = None
+        if parts:
+            try:
+                self._monitoring_regex = re.compile('|'.join(parts))
+            except re.error:
+                # The regexes use a named group twice, for example. Search
+                # them one at a time.
+                self._groups = {}
+
+    def fileno(self):
+        """The file descriptor to wait on for new messages, or None"""
+        return None
+
     @abc.abstractmethod
     def update_monitoring(self):
         """Update _new_messages list
@@ -207,109 +379,269 @@ class BaseMonitoring(object):
     def check_monitoring(self):
         """Check _new_messages
 
-        This method checks if the regex is found in the new messages,
-        then return a string that contain the monitored location and
-        the matched line
+        This method checks if the regex of a rule is found in the new
+        messages, then returns a (rule key, matched line) tuple, or None if
+        nothing matched.
 
         """
-        if self._new_messages and self._monitoring_regex:
-            for line in self._new_messages:
-                if self._monitoring_regex.search(line):
-                    return line
+        separate = [(k, r) for k, r in six.iteritems(self._rules)
+                    if k not in six.itervalues(self._groups)]
+        for line in self._new_messages:
+            if self._monitoring_regex is not None:
+                match = self._monitoring_regex.search(line)
+                if match:
+                    for name, key in six.iteritems(self._groups):
+                        if match.group(name) is not None:
+                            return key, line
+            for key, regex in separate:
+                if regex.search(line):
+                    return key, line
+        return None
+
+    def close(self):
+        """Release anything held open to read the source"""
+        pass
 
 
-if os.name == 'posix':
-    import fcntl
+def _split(data, partial):
+    """Split data into lines, after what's left of the previous read.
 
+    Returns the lines and the new partial line. The partial line is included
+    in the lines too, so that a message that doesn't end in a newline isn't
+    missed, it will be returned again once it's complete.
+    """
+    lines = (partial + data).split(b'\n')
+    partial = lines[-1]
+    return [l for l in lines if l], partial
 
+
+if os.name == 'posix':
     class MonitoringFile(BaseMonitoring):
         """Monitoring from a file
 
         This class is for monitoring the system from a file that
-        can be a standard file or a locked file. The locked file
-        algorithm uses fnctl, so it doesn't work on non Unix systems
+        can be a standard file or a locked file, which are read the same way.
 
-        Arguments:
-        is_locked -- True if the target is a locked file
+        A regular file is read from where the last read ended, as long as it
+        has only been appended to. If it has been rewritten (or is a file in
+        proc, sys or debugfs, which don't report a size) it's read whole, and
+        the lines after the last line of the previous read are new.
 
+        Anything else (a locked file, like a device or a pipe) is kept open
+        and read without blocking, so every read returns only new messages.
         """
-        _is_locked = False
 
-        def __init__(self, monitoring_source, regex, is_locked=False):
+        # The number of bytes from the start of a regular file used to tell
+        # whether it has been rewritten.
+        _HEAD = 256
+
+        def __init__(self, monitoring_source):
             """Create a MonitoringFile instance"""
+            super(MonitoringFile, self).__init__(monitoring_source)
+            self._fd = None
+            self._ino = None
+            self._offset = 0
+            self._head = b''
+            self._partial = b''
             self._last_message = None
-            self._is_locked = is_locked
-            super(MonitoringFile, self).__init__(monitoring_source, regex)
-
-        def update_monitoring(self):
-            """Open the file and get the differences
-
-            Get the contents of the file, then calculate new messages.
-            This implements also a specific method for reading locked files.
 
-            """
+            # Only messages added from now on are new.
+            self._open()
+            self.update_monitoring()
+            self._new_messages = []
 
+        def _open(self):
+            """Open the file if it is not a regular file."""
             try:
-                with open(self._monitoring_source, 'r') as f:
-                    lines = []
-                    if self._is_locked:
-                        # Create a duplicated file descriptor, this avoid lock
-                        fd = os.dup(f.fileno())
-                        # use I/O control for reading the lines
-                        fcntl.fcntl(fd, fcntl.F_SETFL, os.O_NONBLOCK)
-
-                        while True:
-                            try:
-                                line = os.read(fd, 1024)
-                                if not line:
-                                    break;
-                            except OSError as e:
-                                if e.errno == errno.EAGAIN:
-                                    break
-                                else:
-                                    raise e
-                            lines.append(line.decode("utf-8", "strict"))
-                        os.close(fd)
-
-                    else:
-                        lines = f.read().splitlines()
-
-                    f.close()
-
-                    # Find all new entries, do this by slicing the list of the
-                    # lines to only returns elements after the last element
-                    # stored. If there are not matches a value error is raised,
-                    # that means all of the lines are new
-                    l = 0
+                mode = os.stat(self._monitoring_source).st_mode
+                if stat.S_ISREG(mode):
+                    return
+                self._fd = os.open(self._monitoring_source,
+                                   os.O_RDONLY | os.O_NONBLOCK)
+                # For /dev/kmsg this skips the messages logged before now
+                try:
+                    os.lseek(self._fd, 0, os.SEEK_END)
+                except OSError:
+                    pass
+            except (IOError, OSError):
+                pass
+
+        def fileno(self):
+            return self._fd
+
+        def _read_fd(self):
+            """Read everything available from the open file."""
+            data = []
+            while True:
+                try:
+                    chunk = os.read(self._fd, 8192)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        break
+                    elif e.errno == errno.EPIPE:
+                        # Records in /dev/kmsg were overwritten, the next
+                        # read continues after them.
+                        continue
+                    raise
+                if not chunk:
+                    break
+                data.append(chunk)
+            lines, self._partial = _split(b''.join(data), self._partial)
+            return lines
+
+        def _read_regular(self):
+            """Read what was added to a regular file since the last read."""
+            with open(self._monitoring_source, 'rb') as f:
+                st = os.fstat(f.fileno())
+                head = f.read(self._HEAD)
+                appended = (st.st_size > 0 and st.st_ino == self._ino and
+                            st.st_size >= self._offset and
+                            head[:len(self._head)] == self._head)
+
+                if appended:
+                    f.seek(self._offset)
+                    data = f.read()
+                    lines, self._partial = _split(data, self._partial)
+                else:
+                    f.seek(0)
+                    data = f.read()
+                    lines, self._partial = _split(data, b'')
+                    # Find all new entries, do this by slicing the list of
+                    # the lines to only returns elements after the last
+                    # element stored. If there are not matches all of the
+                    # lines are new
                     for index, item in enumerate(reversed(lines)):
                         if item == self._last_message:
-                            l = len(lines) - index  # don't include the matched element
+                            lines = lines[len(lines) - index:]
                             break
-                    self._new_messages = lines[l:]
-                    # Attempt to store the last element of lines,
-                    # unless there was no line
-                    self._last_message = lines[-1] if lines else None
+
+                self._ino = st.st_ino
+                self._offset = f.tell()
+                self._head = head
+                if lines:
+                    self._last_message = lines[-1]
+            return lines
+
+        def update_monitoring(self):
+            """Read the new messages of the file"""
+            try:
+                if self._fd is not None:
+                    lines = self._read_fd()
+                else:
+                    lines = self._read_regular()
+                self._new_messages = [l.decode('utf-8', 'replace')
+                                      for l in lines]
             except Exception:
                 # if an error occured, we consider there are no new messages
                 self._new_messages = []
-                pass
+
+        def close(self):
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+    class MonitoringKmsg(BaseMonitoring):
+        """Monitoring on the kernel log, read from /dev/kmsg
+
+        This is used for dmesg rules that only select the levels of the
+        messages, like "--level emerg,alert,crit,err". The messages are
+        formatted like dmesg prints them.
+
+        Arguments:
+        levels -- the set of levels (as ints) to keep, or None for all
+        path -- the file to read, /dev/kmsg by default
+
+        Raises OSError if path cannot be opened.
+
+        """
+        def __init__(self, monitoring_source, levels=None, path=None):
+            """Create a MonitoringKmsg instance"""
+            super(MonitoringKmsg, self).__init__(monitoring_source)
+            self._levels = levels
+            self._partial = b''
+            self._fd = os.open(path or _KMSG, os.O_RDONLY | os.O_NONBLOCK)
+            os.lseek(self._fd, 0, os.SEEK_END)
+
+        def fileno(self):
+            return self._fd
+
+        def update_monitoring(self):
+            """Read the records logged since the last read"""
+            data = []
+            while True:
+                try:
+                    chunk = os.read(self._fd, 8192)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        break
+                    elif e.errno == errno.EPIPE:
+                        continue
+                    self._new_messages = []
+                    return
+                if not chunk:
+                    break
+                data.append(chunk)
+
+            # A partial record is never returned by /dev/kmsg, but may be by
+            # a regular file standing in for it.
+            lines = (self._partial + b''.join(data)).split(b'\n')
+            self._partial = lines.pop()
+            self._new_messages = []
+            for line in lines:
+                record = parse_kmsg_record(line)
+                if record is not None and (self._levels is None or
+                                           record[0] in self._levels):
+                    self._new_messages.append(record[2])
+
+        def close(self):
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
 
 
     class MonitoringLinuxDmesg(BaseMonitoring, LinuxDmesg):
         """Monitoring on dmesg
 
         This class is for monitoring on the system dmesg. It's inherited
-        from LinuxDmesg for the dmesg processing methods.
+        from LinuxDmesg for the dmesg processing methods. It's used for dmesg
+        rules with options other than the levels, or if /dev/kmsg can't be
+        read. Since this runs dmesg, the background thread only reads it once
+        a second.
 
         Work only on Linux operating system.
 
         """
-        def __init__(self, monitoring_source, regex):
+        poll_interval = 1
+
+        def __init__(self, monitoring_source):
             """Create a MonitoringLinuxDmesg instance"""
             self.DMESG_COMMAND = ['dmesg']+monitoring_source.split()
-            BaseMonitoring.__init__(self, monitoring_source, regex)
+            BaseMonitoring.__init__(self, monitoring_source)
             LinuxDmesg.__init__(self)
 
         def update_monitoring(self):
             """Call update_dmesg"""
             self.update_dmesg()
+
+
+    def _dmesg_source(parameters):
+        """Return the monitoring object for a dmesg rule.
+
+        If the options only select levels /dev/kmsg is read, otherwise dmesg
+        is run with the options.
+        """
+        args = parameters.split()
+        levels = None
+        if len(args) == 2 and args[0] in ['--level', '-l']:
+            levels = args[1]
+        elif len(args) == 1 and args[0].startswith('--level='):
+            levels = args[0][len('--level='):]
+
+        if levels is not None:
+            try:
+                return MonitoringKmsg(
+                    parameters, {_LEVELS[l] for l in levels.split(',')})
+            except (KeyError, OSError):
+                pass
+        return MonitoringLinuxDmesg(parameters)
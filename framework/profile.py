@@ -33,29 +33,46 @@ from __future__ import (
 import collections
 import contextlib
 import copy
+import functools
 import importlib
 import itertools
 import multiprocessing
 import multiprocessing.dummy
 import os
 import re
+import sys
+import threading
+import time
+import traceback
 
 import six
 
-from framework import grouptools, exceptions, status
+from framework import core, grouptools, exceptions, scheduling, status
 from framework.dmesg import get_dmesg
 from framework.log import LogManager
 from framework.monitoring import Monitoring
+from framework.options import OPTIONS
 from framework.test.base import Test, DummyTest
+from framework.test.opengl import find_skips
+from framework.test.shader_test import MultiShaderTest
 
 __all__ = [
+    'EXECUTORS',
+    'ExcludeFilter',
     'RegexFilter',
     'TestDict',
     'TestProfile',
+    'close_readers',
     'load_test_profile',
     'run',
 ]
 
+# The ways that tests can be dispatched by run(). "thread" runs every test in a
+# thread of the piglit process, "process" runs them in a pool of worker
+# processes and sends the results back to the piglit process to be logged and
+# written.
+EXECUTORS = ['thread', 'process']
+
 
 class RegexFilter(object):
     """An object to be passed to TestProfile.filter.
@@ -93,6 +110,33 @@ class RegexFilter(object):
             return not any(r.search(name) for r in self.filters)
 
 
+class ExcludeFilter(object):
+    """An object to be passed to TestProfile.filter.
+
+    This removes the tests with the given names, like the tests that already
+    ran when a run is resumed. Like RegexFilter it only looks at the name of
+    the test.
+
+    Arguments:
+    names -- a set of test names.
+    """
+
+    def __init__(self, names):
+        self.names = names
+
+    def __call__(self, name, _):  # pylint: disable=invalid-name
+        return name not in self.names
+
+
+class _Factory(object):
+    """A test in a TestDict that hasn't been constructed yet."""
+
+    __slots__ = ['factory']
+
+    def __init__(self, factory):
+        self.factory = factory
+
+
 class TestDict(collections.MutableMapping):
     """A special kind of dict for tests.
 
@@ -100,6 +144,11 @@ class TestDict(collections.MutableMapping):
     strings (not bytes) and that values are Test derived objects. It is also a
     wrapper around collections.OrderedDict.
 
+    Tests can also be added as a factory with add_factory, a callable that
+    returns the Test. The factory isn't called until the test is looked up, so
+    building a profile that most tests will be filtered out of doesn't pay for
+    constructing them.
+
     This class doesn't accept keyword arguments, this is intentional. This is
     because the TestDict class is ordered, and keyword arguments are unordered,
     which is a design mismatch.
@@ -111,40 +160,40 @@ class TestDict(collections.MutableMapping):
         self.__allow_reassignment = 0
         self.__container = collections.OrderedDict()
 
-    def __setitem__(self, key, value):
-        """Enforce types on set operations.
-
-        Keys should only be strings, and values should only be Tests.
-
-        This method makes one additional requirement, it lowers the key before
-        adding it. This solves a couple of problems, namely that we want to be
-        able to use file-system hierarchies as groups in some cases, and those
-        are assumed to be all lowercase to avoid problems on case insensitive
-        file-systems.
-        """
+    @staticmethod
+    def __check_key(key):
         # keys should be strings
         if not isinstance(key, six.text_type):
             raise exceptions.PiglitFatalError(
                 "TestDict keys must be strings, but was {}".format(type(key)))
 
+    @staticmethod
+    def __check_value(value):
         # Values should either be more Tests
         if not isinstance(value, Test):
             raise exceptions.PiglitFatalError(
                 "TestDict values must be a Test, but was a {}".format(
                     type(value)))
 
+    def __add(self, key, value):
+        """Add a Test or a _Factory to the container."""
         # This must be lowered before the following test, or the test can pass
         # in error if the key has capitals in it.
         key = key.lower()
 
         # If there is already a test of that value in the tree it is an error
         if not self.__allow_reassignment and key in self.__container:
-            if self.__container[key] != value:
+            # Both tests have to be constructed to compare them, but this is
+            # an error anyway.
+            old = self[key]
+            if isinstance(value, _Factory):
+                value = value.factory()
+            if old != value:
                 error = (
                     'Further, the two tests are not the same,\n'
                     'The original test has this command:   "{0}"\n'
                     'The new test has this command:        "{1}"'.format(
-                        ' '.join(self.__container[key].command),
+                        ' '.join(old.command),
                         ' '.join(value.command))
                 )
             else:
@@ -156,9 +205,52 @@ class TestDict(collections.MutableMapping):
 
         self.__container[key] = value
 
+    def __setitem__(self, key, value):
+        """Enforce types on set operations.
+
+        Keys should only be strings, and values should only be Tests.
+
+        This method makes one additional requirement, it lowers the key before
+        adding it. This solves a couple of problems, namely that we want to be
+        able to use file-system hierarchies as groups in some cases, and those
+        are assumed to be all lowercase to avoid problems on case insensitive
+        file-systems.
+        """
+        self.__check_key(key)
+        self.__check_value(value)
+        self.__add(key, value)
+
+    def add_factory(self, key, factory):
+        """Add a test that will be constructed when it's first looked up.
+
+        This has the same requirements on key as setting an item does, and
+        factory must return a Test when called without arguments.
+
+        Arguments:
+        key     -- the name of the test
+        factory -- a callable returning the Test, functools.partial of the
+                   Test class for example.
+        """
+        self.__check_key(key)
+        assert callable(factory), factory
+        self.__add(key, _Factory(factory))
+
     def __getitem__(self, key):
-        """Lower the value before returning."""
-        return self.__container[key.lower()]
+        """Lower the value before returning.
+
+        If the test was added with a factory it's constructed now, and kept.
+        """
+        key = key.lower()
+        value = self.__container[key]
+        if isinstance(value, _Factory):
+            value = value.factory()
+            self.__check_value(value)
+            self.__container[key] = value
+        return value
+
+    def __contains__(self, key):
+        # Don't construct tests just to find out whether they exist
+        return key.lower() in self.__container
 
     def __delitem__(self, key):
         """Lower the value before returning."""
@@ -234,10 +326,11 @@ class TestDict(collections.MutableMapping):
             assert isinstance(name, six.string_types)
             lgroup = grouptools.join(group, name)
 
-            self[lgroup] = test_class(
+            self.add_factory(lgroup, functools.partial(
+                test_class,
                 args,
                 **dict(itertools.chain(six.iteritems(default_args),
-                                       six.iteritems(kwargs))))
+                                       six.iteritems(kwargs)))))
 
         yield adder
 
@@ -278,6 +371,10 @@ class TestProfile(object):
     handled by the run function in this module, which is able to process and
     run multiple TestProfile objects at once.
     """
+    # Set by profiles that read the kernel log from setup() even without
+    # --dmesg, which can only be done with the thread executor.
+    reads_dmesg = False
+
     def __init__(self):
         self.test_list = TestDict()
         self.forced_test_list = []
@@ -310,23 +407,47 @@ class TestProfile(object):
     def itertests(self):
         """Iterate over tests while filtering.
 
+        RegexFilters and ExcludeFilters only look at the name, so they're
+        applied first, and tests (added to the TestDict with a factory) that
+        they remove are never constructed. The rest of the filters are applied
+        in order.
+
         This iterator is non-destructive.
         """
+        by_name = (RegexFilter, ExcludeFilter)
+        regex = [f for f in self.filters if isinstance(f, by_name)]
+        others = [f for f in self.filters if not isinstance(f, by_name)]
+
         if self.forced_test_list:
-            opts = collections.OrderedDict()
-            for n in self.forced_test_list:
-                if self.options['ignore_missing'] and n not in self.test_list:
-                    opts[n] = DummyTest(n, status.NOTRUN)
-                else:
-                    opts[n] = self.test_list[n]
+            names = collections.OrderedDict.fromkeys(self.forced_test_list)
         else:
-            opts = self.test_list  # pylint: disable=redefined-variable-type
+            names = self.test_list
 
-        for k, v in six.iteritems(opts):
-            if all(f(k, v) for f in self.filters):
+        for k in names:
+            if not all(f(k, None) for f in regex):
+                continue
+
+            if (self.forced_test_list and self.options['ignore_missing'] and
+                    k not in self.test_list):
+                v = DummyTest(k, status.NOTRUN)
+            else:
+                v = self.test_list[k]
+
+            if all(f(k, v) for f in others):
                 yield k, v
 
 
+def close_readers(profiles):
+    """Stop reading the kernel log and monitored files for profiles.
+
+    The dmesg and monitoring instances are usually shared by the profiles of
+    a run, each one is closed once.
+    """
+    for reader in set(p.options[k] for p in profiles
+                      for k in ['dmesg', 'monitor']):
+        reader.close()
+
+
 def load_test_profile(filename):
     """Load a python module and return it's profile attribute.
 
@@ -365,16 +486,268 @@ def load_test_profile(filename):
             'Did you specify the right file?'.format(filename))
 
 
-def run(profiles, logger, backend, concurrency):
+class _ResultLog(object):
+    """A stand-in logger for tests executed in a worker process.
+
+    The LogManager lives in the piglit process, so rather than logging this
+    records the status the test would have logged, which is sent back to the
+    piglit process along with the result.
+    """
+    def __init__(self):
+        self.status = None
+
+    def start(self, name):
+        pass
+
+    def log(self, status):
+        self.status = status
+
+    def summary(self):
+        pass
+
+
+def _init_worker(opts):
+    """Copy the options of the piglit process into a worker process."""
+    for key, value in opts:
+        setattr(OPTIONS, key, value)
+
+
+def _execute(name, test, options):
+    """Execute a test in a worker process.
+
+    Returns a tuple of the TestResult and the status to log.
+    """
+    log = _ResultLog()
+    test.execute(name, log, options)
+    return test.result, log.status
+
+
+def _predict_makespan(test_list, durations, concurrency):
+    """Predict how long running test_list will take in seconds."""
+    if concurrency == "none":
+        return sum(durations[n] for n, _ in test_list)
+    elif concurrency == "all":
+        concurrent = test_list
+        serial = 0
+    else:
+        concurrent = [x for x in test_list if x[1].run_concurrent]
+        serial = sum(durations[n] for n, t in test_list
+                     if not t.run_concurrent)
+
+    # The serial tests run on their own before the concurrent ones.
+    return serial + scheduling.makespan(
+        (durations[n] for n, _ in scheduling.longest_first(concurrent,
+                                                           durations)),
+        multiprocessing.cpu_count())
+
+
+def _skip_unsupported(profiles, log, backend):
+    """Skip the tests whose OpenGL requirements the driver doesn't meet.
+
+    Rather than each test finding out it should be skipped while holding a
+    slot in the pool, the requirements of every test are checked before the
+    run starts. The skipped tests are written to the backend and counted by
+    the log in bulk, and removed from the test lists.
+
+    Returns the profiles with the skipped tests removed.
+    """
+    start = time.time()
+    skipped = 0
+    ret = []
+    for profile, test_list in profiles:
+        skips = find_skips(test_list)
+        if skips:
+            tests = dict(test_list)
+            for name, reason in six.iteritems(skips):
+                test = tests[name]
+                test.skip(reason)
+                with backend.write_test(name) as w:
+                    w(test.result)
+            test_list = [x for x in test_list if x[0] not in skips]
+            skipped += len(skips)
+        ret.append((profile, test_list))
+
+    if skipped:
+        log.account('skip', skipped)
+        print('Skipped {} tests with unsupported requirements in {:.2f}s'.format(
+            skipped, time.time() - start))
+    return ret
+
+
+class _Assembly(object):
+    """The result of a test that is run in batches, put back together.
+
+    Each batch that runs subtests of the test adds its result, and once they
+    all have the result is complete. The time of the result is the time spent
+    running its subtests, with the time of a batch shared evenly between the
+    subtests it ran.
+
+    Arguments:
+    name -- the name of the test
+    test -- the Test instance
+    batches -- the number of batches that run subtests of the test
+    """
+    def __init__(self, name, test, batches):
+        self.name = name
+        self.result = test.result
+        self.__pending = batches
+        self.__lock = threading.Lock()
+        self.__out = []
+        self.__err = []
+        self.__commands = []
+        self.__busy = 0.0
+
+    def add(self, result, subtests):
+        """Add the result of a batch, return True if this was the last."""
+        with self.__lock:
+            for subtest in subtests:
+                self.result.subtests[subtest] = result.subtests[subtest]
+            self.__out.append(result.out)
+            self.__err.append(result.err)
+            self.__commands.append(result.command)
+            self.__busy += \
+                result.time.total * len(subtests) / len(result.subtests)
+            self.result.pid.extend(result.pid)
+            if result.returncode and not self.result.returncode:
+                self.result.returncode = result.returncode
+            if result.exception and not self.result.exception:
+                self.result.exception = result.exception
+                self.result.traceback = result.traceback
+            if not self.result.time.start or \
+                    result.time.start < self.result.time.start:
+                self.result.time.start = result.time.start
+
+            self.__pending -= 1
+            if self.__pending:
+                return False
+
+            self.result.time.end = self.result.time.start + self.__busy
+            self.result.out = '\n\n====BATCH====\n\n'.join(self.__out)
+            self.result.err = '\n\n====BATCH====\n\n'.join(self.__err)
+            self.result.command = '\n'.join(self.__commands)
+            if self.result.returncode is None:
+                self.result.returncode = 0
+            return True
+
+
+class _Batch(object):
+    """A test that runs subtests of other tests, in their place.
+
+    Arguments:
+    test -- the Test that runs the batch
+    parts -- a list of (_Assembly, subtests) tuples, one for each of the tests
+             the batch runs subtests of
+    """
+    def __init__(self, test, parts):
+        self.test = test
+        self.parts = parts
+
+    @property
+    def result(self):
+        return self.test.result
+
+    @property
+    def run_concurrent(self):
+        return self.test.run_concurrent
+
+    def finish(self):
+        """Add the result to each test, returning the completed ones."""
+        return [a for a, subtests in self.parts
+                if a.add(self.test.result, subtests)]
+
+
+def _plan_batches(test_list, history, durations, target):
+    """Run the MultiShaderTests of test_list in planned batches.
+
+    Instead of running every MultiShaderTest in one process, their subtests
+    are run in batches that should take about target seconds according to
+    history (see scheduling.plan_batches). Long tests are split over several
+    batches that can run at the same time, short ones are run together, and
+    subtests that crashed in the history are run in a process of their own,
+    rather than restarting a long batch. The results are put back together
+    under the name of each test, so they look no different from an unbatched
+    run.
+
+    The estimated duration of each batch is added to durations, if it isn't
+    None.
+
+    Returns the test list with the batches in place of the MultiShaderTests.
+    """
+    # Without any timings every batch would be estimated to take no time at
+    # all, and everything would end up in one.
+    if not history.subtests:
+        return test_list
+
+    estimates = scheduling.Durations(history.subtests)
+    kinds = collections.OrderedDict()
+    planned = []
+    for name, test in test_list:
+        # A test without subtests to run is skipped, leave it be.
+        if isinstance(test, MultiShaderTest) and test.expected:
+            kinds.setdefault(test.batch_key, []).append((name, test))
+        else:
+            planned.append((name, test))
+
+    batched = 0
+    batches = 0
+    for tests in six.itervalues(kinds):
+        lookup = dict(tests)
+        plans = scheduling.plan_batches(
+            [(n, t.expected) for n, t in tests], estimates, target,
+            history.crashed)
+        counts = collections.Counter(n for plan in plans for n, _ in plan)
+        assemblies = {n: _Assembly(n, lookup[n], c)
+                      for n, c in six.iteritems(counts)}
+        for i, plan in enumerate(plans):
+            test = MultiShaderTest.from_parts(
+                [(lookup[n], subtests) for n, subtests in plan])
+            name = '{} (batch {})'.format(plan[0][0], i)
+            if durations is not None:
+                durations[name] = sum(
+                    estimates[grouptools.join(n, s)]
+                    for n, subtests in plan for s in subtests)
+            planned.append(
+                (name, _Batch(test, [(assemblies[n], subtests)
+                                     for n, subtests in plan])))
+            batches += 1
+        batched += len(tests)
+
+    if batched:
+        print('Running {} shader tests in {} batches'.format(batched, batches))
+    return planned
+
+
+def run(profiles, logger, backend, concurrency, executor='thread',
+        timings=None, history=None):
     """Runs all tests using Thread pool.
 
     When called this method will flatten out self.tests into self.test_list,
     then will prepare a logger, and begin executing tests through it's Thread
     pools.
 
-    Based on the value of options.OPTIONS.concurrent it will either run all the
-    tests concurrently, all serially, or first the thread safe tests then the
-    serial tests.
+    Based on the value of concurrency it will either run all the tests
+    concurrently, all serially, or first the serial tests with nothing else
+    running, then the thread safe tests concurrently. Each profile is run to
+    completion before the next one starts, and the wall time and idle time of
+    each of these phases is printed at the end.
+
+    When executor is "process" the tests are sent to a pool of worker
+    processes instead of threads, and the results are logged and written by
+    this process as they are returned. The dmesg and monitoring options are
+    only updated in the workers, so they require the "thread" executor.
+
+    Tests whose OpenGL requirements (see FastSkip) aren't met by the driver
+    are skipped before the run starts, without being scheduled.
+
+    When timings are provided the concurrent tests are started longest first,
+    so that long tests don't start at the end of the run and leave the rest of
+    the pool idle. The predicted and actual makespan of the run are printed at
+    the end.
+
+    When a history is provided the MultiShaderTests are run in batches that
+    take about 'batch duration' seconds (from the [core] section of
+    piglit.conf, 30 by default) rather than one process each, see
+    _plan_batches.
 
     Finally it will print a final summary of the tests.
 
@@ -382,8 +755,22 @@ def run(profiles, logger, backend, concurrency):
     profiles -- a list of Profile instances.
     logger   -- a log.LogManager instance.
     backend  -- a results.Backend derived instance.
+
+    Keyword Arguments:
+    executor -- one of EXECUTORS. Default: "thread"
+    timings  -- a dictionary mapping test names to durations in seconds, as
+                returned by scheduling.load_timings. Default: None
+    history  -- a scheduling.History, as returned by scheduling.load_history.
+                If timings is None they are taken from the history.
+                Default: None
     """
-    chunksize = 1
+    assert executor in EXECUTORS, executor
+    slots = multiprocessing.cpu_count()
+    phases = []
+    if history is not None and timings is None:
+        timings = history.timings
+    durations = scheduling.Durations(timings) if timings else None
+    target = float(core.PIGLIT_CONFIG.safe_get('core', 'batch duration', 30))
 
     # The logger needs to know how many tests are running. Because of filters
     # there's no way to do that without making a concrete list out of the
@@ -395,6 +782,12 @@ def run(profiles, logger, backend, concurrency):
     if not any(l for _, l in profiles):
         raise exceptions.PiglitUserError('no matching tests')
 
+    if OPTIONS.execute:
+        profiles = _skip_unsupported(profiles, log, backend)
+        if history is not None:
+            profiles = [(p, _plan_batches(l, history, durations, target))
+                        for p, l in profiles]
+
     def test(name, test, profile, this_pool=None):
         """Function to call test.execute from map"""
         with backend.write_test(name) as w:
@@ -403,46 +796,154 @@ def run(profiles, logger, backend, concurrency):
         if profile.options['monitor'].abort_needed:
             this_pool.terminate()
 
-    def run_threads(pool, profile, test_list, filterby=None):
-        """ Open a pool, close it, and join it """
-        if filterby:
-            # Although filterby could be attached to TestProfile as a filter,
-            # it would have to be removed when run_threads exits, requiring
-            # more code, and adding side-effects
-            test_list = (x for x in test_list if filterby(x))
+    def write(name, test, returned):
+        """Log and write a result returned by a worker process."""
+        result, status_ = returned
+        test.result = result
+        l = log.get()
+        l.start(name)
+        with backend.write_test(name) as w:
+            w(result)
+        l.log(status_)
+
+    def write_assembled(assembly):
+        """Log and write a test that was run in batches."""
+        l = log.get()
+        l.start(assembly.name)
+        with backend.write_test(assembly.name) as w:
+            w(assembly.result)
+        l.log(assembly.result.result)
+
+    def batch(name, batch_, profile, this_pool=None):
+        """Function to run a batch from map"""
+        batch_.test.execute(name, _ResultLog(), profile.options)
+        for assembly in batch_.finish():
+            write_assembled(assembly)
+        if profile.options['monitor'].abort_needed:
+            this_pool.terminate()
+
+    def finish(batch_, returned):
+        """Write the tests completed by a batch run in a worker process."""
+        batch_.test.result = returned[0]
+        for assembly in batch_.finish():
+            write_assembled(assembly)
+
+    def failed(test_, callback, pending):
+        """Write a test that a worker process failed to run as a fail.
+
+        This happens when the test or its options can't be sent to the
+        worker, or when the worker raises outside of Test.execute, and the
+        callback is never called.
+        """
+        try:
+            pending.get()
+        # As in Test.execute, a bare exception is okay, it's being logged
+        except:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            traceback.print_exc(file=sys.stderr)
+            test_.result.result = 'fail'
+            test_.result.exception = "{}{}".format(exc_type, exc_value)
+            # On python 3 the traceback of the worker is kept as the cause
+            test_.result.traceback = "".join(
+                traceback.format_tb(exc_traceback) +
+                [six.text_type(getattr(exc_value, '__cause__', None) or '')])
+            callback((test_.result, test_.result.result))
+
+    def run_threads(pool, profile, test_list):
+        """Submit test_list to pool.
+
+        Returns a list of pending results, each with a function to call if
+        the task failed, or None.
+        """
+        pending = []
+        for name, test_ in test_list:
+            if executor == 'process':
+                if isinstance(test_, _Batch):
+                    args = (name, test_.test, profile.options)
+                    callback = functools.partial(finish, test_)
+                else:
+                    args = (name, test_, profile.options)
+                    callback = functools.partial(write, name, test_)
+                pending.append((
+                    pool.apply_async(_execute, args, callback=callback),
+                    functools.partial(failed, args[1], callback)))
+            else:
+                func = batch if isinstance(test_, _Batch) else test
+                pending.append((
+                    pool.apply_async(func, (name, test_, profile, pool)),
+                    None))
+        return pending
 
-        pool.imap(lambda pair: test(pair[0], pair[1], profile, pool),
-                  test_list, chunksize)
+    def run_phase(name, pool, slots, profile, test_list):
+        """Run test_list in pool and wait for all of the tests to finish.
+
+        Waiting for the pool to drain is what allows the exclusive tests to
+        have the GPU to themselves.
+        """
+        if not test_list:
+            return
+        start = time.time()
+        for pending, on_failure in run_threads(pool, profile, test_list):
+            # If a monitored error was detected the pool is terminated, and
+            # the remaining results will never be ready.
+            while not pending.ready():
+                if profile.options['monitor'].abort_needed:
+                    return
+                pending.wait(1)
+            if on_failure is not None and not pending.successful():
+                on_failure(pending)
+        phases.append(scheduling.Phase(
+            name, slots, len(test_list), time.time() - start,
+            sum(t.result.time.total for _, t in test_list)))
+
+    def longest_first(test_list):
+        # Only the concurrent tests are reordered, there's nothing to gain by
+        # reordering the tests that run serially.
+        if durations is None:
+            return test_list
+        return scheduling.longest_first(test_list, durations)
 
     def run_profile(profile, test_list):
         """Run an individual profile."""
         profile.setup()
         if concurrency == "all":
-            run_threads(multi, profile, test_list)
+            run_phase('concurrent', multi, slots, profile,
+                      longest_first(test_list))
         elif concurrency == "none":
-            run_threads(single, profile, test_list)
+            run_phase('exclusive', single, 1, profile, test_list)
         else:
             assert concurrency == "some"
-            # Filter and return only thread safe tests to the threaded pool
-            run_threads(multi, profile, test_list,
-                        lambda x: x[1].run_concurrent)
-
-            # Filter and return the non thread safe tests to the single
-            # pool
-            run_threads(single, profile, test_list,
-                        lambda x: not x[1].run_concurrent)
+            # Tests that are not thread safe need the whole GPU, so they are
+            # run first, while nothing else is running and the pool is empty.
+            # The concurrent tests are then run with every slot of the pool,
+            # so the pool is only drained once per profile.
+            run_phase('exclusive', single, 1, profile,
+                      [x for x in test_list if not x[1].run_concurrent])
+            if not profile.options['monitor'].abort_needed:
+                run_phase('concurrent', multi, slots, profile, longest_first(
+                    [x for x in test_list if x[1].run_concurrent]))
         profile.teardown()
 
-    # Multiprocessing.dummy is a wrapper around Threading that provides a
-    # multiprocessing compatible API
-    #
-    # The default value of pool is the number of virtual processor cores
-    single = multiprocessing.dummy.Pool(1)
-    multi = multiprocessing.dummy.Pool()
-
+    if executor == 'process':
+        # The workers need the same global options as this process, which
+        # they wouldn't get if the platform spawns rather than forks.
+        opts = list(OPTIONS)
+        single = multiprocessing.Pool(1, _init_worker, (opts, ))
+        multi = multiprocessing.Pool(slots, _init_worker, (opts, ))
+    else:
+        # Multiprocessing.dummy is a wrapper around Threading that provides a
+        # multiprocessing compatible API
+        #
+        # The default value of pool is the number of virtual processor cores
+        single = multiprocessing.dummy.Pool(1)
+        multi = multiprocessing.dummy.Pool(slots)
+
+    start = time.time()
     try:
         for p in profiles:
             run_profile(*p)
+            if p[0].options['monitor'].abort_needed:
+                break
 
         for pool in [single, multi]:
             pool.close()
@@ -450,6 +951,16 @@ def run(profiles, logger, backend, concurrency):
     finally:
         log.get().summary()
 
+    for phase in phases:
+        print(phase)
+
+    if durations is not None:
+        # Each profile runs to completion before the next one starts.
+        predicted = sum(_predict_makespan(l, durations, concurrency)
+                        for _, l in profiles)
+        print('Predicted makespan: {:.1f}s, actual makespan: {:.1f}s'.format(
+            predicted, time.time() - start))
+
     for p, _ in profiles:
         if p.options['monitor'].abort_needed:
             raise exceptions.PiglitAbort(p.options['monitor'].error_message)
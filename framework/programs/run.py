@@ -34,11 +34,14 @@ import time
 import six
 
 from framework import core, backends, options
+from framework import coordinator
 from framework import dmesg
 from framework import exceptions
 from framework import monitoring
 from framework import profile
+from framework import scheduling
 from framework.results import TimeAttribute
+from framework.test import opengl
 from . import parsers
 
 __all__ = ['run',
@@ -55,6 +58,19 @@ def booltype(val):
         '"1" are accepted.')
 
 
+def shardtype(val):
+    """Parse the i/N argument of --shard into a tuple of ints."""
+    try:
+        index, count = (int(v) for v in val.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'A shard must be given as i/N, like 1/4.')
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            'The shard index must be between 1 and the number of shards.')
+    return index, count
+
+
 def _default_platform():
     """ Logic to determine the default platform to use
 
@@ -97,6 +113,21 @@ def _default_backend():
     return backend
 
 
+def _default_executor():
+    """Logic to set the default executor to use.
+
+    Either the one set via the --executor option, or the one in the config
+    file. The default if that fails is to use threads.
+
+    """
+    executor = core.PIGLIT_CONFIG.safe_get('core', 'executor', 'thread')
+    if executor not in profile.EXECUTORS:
+        raise exceptions.PiglitFatalError(
+            'Executor is not valid\nvalid executors are: {}'.format(
+                ' '.join(profile.EXECUTORS)))
+    return executor
+
+
 def _run_parser(input_):
     """ Parser for piglit run command """
     unparsed = parsers.parse_config(input_)[1]
@@ -140,6 +171,40 @@ def _run_parser(input_):
                              const="none",
                              dest="concurrency",
                              help="Disable concurrent test runs")
+    parser.add_argument('--executor',
+                        default=_default_executor(),
+                        choices=profile.EXECUTORS,
+                        help='Run tests in threads of the piglit process, or '
+                             'in a pool of worker processes. The process '
+                             'executor scales better on machines with many '
+                             'cores.')
+    parser.add_argument('--timings',
+                        type=path.realpath,
+                        metavar='<Results Path>',
+                        help='Path to the results of a previous run. The '
+                             'concurrent tests are started longest first '
+                             'using the times recorded in those results, '
+                             'and batched shader tests are split into '
+                             'batches of about the same duration, with '
+                             'shader tests that crashed run on their own.')
+    parser.add_argument('--shard',
+                        type=shardtype,
+                        metavar='<i/N>',
+                        help='Split the tests into N shards that are '
+                             'expected to take about the same time, using '
+                             'the --timings results if given, and only run '
+                             'the i-th one (counting from 1). The shards can '
+                             'be run on different machines and combined with '
+                             'piglit merge, as long as they run the same '
+                             'profiles with the same filters and timings.')
+    parser.add_argument('--coordinator',
+                        type=coordinator.parse_address,
+                        metavar='<host:port>',
+                        help='Rather than running the tests, hand them out to '
+                             'the workers that connect to this address, and '
+                             'write their results. Workers are started with '
+                             'piglit run --worker <host:port>, on this or '
+                             'other hosts.')
     parser.add_argument("-p", "--platform",
                         choices=core.PLATFORMS,
                         default=_default_platform(),
@@ -150,17 +215,23 @@ def _run_parser(input_):
     parser.add_argument("--dmesg",
                         action="store_true",
                         help="Capture a difference in dmesg before and "
-                             "after each test. Implies -1/--no-concurrency")
+                             "after each test. Implies -1/--no-concurrency "
+                             "and --executor=thread")
     parser.add_argument("--abort-on-monitored-error",
                         action="store_true",
                         dest="monitored",
                         help="Enable monitoring according the rules defined "
                              "in piglit.conf, and stop the execution when a "
                              "monitored error is detected. Exit code 3. "
-                             "Implies -1/--no-concurrency")
+                             "Implies -1/--no-concurrency and "
+                             "--executor=thread")
     parser.add_argument("-s", "--sync",
                         action="store_true",
                         help="Sync results to disk after every test")
+    parser.add_argument("--refresh-wflinfo",
+                        action="store_true",
+                        help="Ignore the cached wflinfo answers for this "
+                             "platform and driver, and call wflinfo again")
     parser.add_argument("--junit_suffix",
                         type=str,
                         default="",
@@ -230,7 +301,11 @@ def _create_metadata(args, name, forced_test_list):
     opts = dict(options.OPTIONS)
     opts['profile'] = args.test_profile
     opts['log_level'] = args.log_level
+    opts['backend'] = args.backend
     opts['concurrent'] = args.concurrency
+    opts['executor'] = args.executor
+    opts['timings'] = args.timings
+    opts['shard'] = args.shard
     opts['include_filter'] = args.include_tests
     opts['exclude_filter'] = args.exclude_tests
     opts['dmesg'] = args.dmesg
@@ -247,6 +322,42 @@ def _create_metadata(args, name, forced_test_list):
     return metadata
 
 
+def _shard_profiles(profiles, shard, history):
+    """Filter out the tests that the other shards run.
+
+    This must be done after every other filter has been added, so that all of
+    the shards split the same list of tests.
+
+    Arguments:
+    profiles -- a list of TestProfiles.
+    shard -- a tuple of the index (from 1) and the number of shards.
+    history -- a scheduling.History, or None.
+    """
+    index, count = shard
+    names = [n for p in profiles for n, _ in p.itertests()]
+    durations = scheduling.Durations(history.timings if history else {})
+    others = set(names) - scheduling.shard(names, durations, index - 1, count)
+    for p in profiles:
+        p.filters.append(profile.ExcludeFilter(others))
+
+
+def _check_executor(profiles, executor):
+    """Return the executor to run profiles with.
+
+    The kernel log is only read in the piglit process, so if any of the
+    profiles reads it (igt does, even without --dmesg) the tests are run in
+    the piglit process with the thread executor.
+    """
+    if executor != 'thread' and any(
+            p.reads_dmesg or
+            not isinstance(p.options['dmesg'], dmesg.DummyDmesg)
+            for p in profiles):
+        print('Warning: dmesg is read, using the thread executor',
+              file=sys.stderr)
+        return 'thread'
+    return executor
+
+
 def _disable_windows_exception_messages():
     """Disable Windows error message boxes for this and all child processes."""
     if sys.platform == 'win32':
@@ -282,13 +393,26 @@ def run(input_):
     and piglit run
 
     """
+    # A worker gets everything else from the coordinator
+    worker = argparse.ArgumentParser(add_help=False)
+    worker.add_argument('--worker', type=coordinator.parse_address)
+    worker_args, unparsed = worker.parse_known_args(input_)
+    if worker_args.worker:
+        if parsers.parse_config(unparsed)[1]:
+            raise exceptions.PiglitFatalError(
+                '--worker takes no other arguments than -f/--config')
+        coordinator.work(worker_args.worker)
+        return
+
     args = _run_parser(input_)
     _disable_windows_exception_messages()
 
     # If dmesg is requested we must have serial run, this is because dmesg
-    # isn't reliable with threaded run
+    # isn't reliable with threaded run. Both are also only checked in the
+    # process running the test, so they need the thread executor.
     if args.dmesg or args.monitored:
         args.concurrency = "none"
+        args.executor = "thread"
 
     # Pass arguments into Options
     options.OPTIONS.execute = args.execute
@@ -299,6 +423,8 @@ def run(input_):
 
     # Set the platform to pass to waffle
     options.OPTIONS.env['PIGLIT_PLATFORM'] = args.platform
+    if args.refresh_wflinfo:
+        opengl.WflInfo().refresh()
 
     # Change working directory to the root of the piglit directory
     piglit_dir = path.dirname(path.realpath(sys.argv[0]))
@@ -342,14 +468,17 @@ def run(input_):
     if forced_test_list:
         profiles[0].forced_test_list = forced_test_list
 
-    # Set the dmesg type
+    # Set the dmesg type. The profiles share one dmesg and one monitoring
+    # instance, so each source is only read once.
     if args.dmesg:
+        dmesg_ = dmesg.get_dmesg(args.dmesg)
         for p in profiles:
-            p.options['dmesg'] = dmesg.get_dmesg(args.dmesg)
+            p.options['dmesg'] = dmesg_
 
     if args.monitored:
+        monitor = monitoring.Monitoring(args.monitored)
         for p in profiles:
-            p.options['monitor'] = monitoring.Monitoring(args.monitored)
+            p.options['monitor'] = monitor
 
     if args.ignore_missing:
         for p in profiles:
@@ -362,9 +491,28 @@ def run(input_):
         if args.include_tests:
             p.filters.append(profile.RegexFilter(args.include_tests))
 
+    history = None
+    if args.timings:
+        history = scheduling.load_history(args.timings)
+
+    if args.shard:
+        _shard_profiles(profiles, args.shard, history)
+
     time_elapsed = TimeAttribute(start=time.time())
 
-    profile.run(profiles, args.log_level, backend, args.concurrency)
+    try:
+        if args.coordinator:
+            coordinator.Coordinator(args.coordinator, {
+                'profiles': args.test_profile,
+                'dmesg': args.dmesg,
+                'monitoring': args.monitored,
+            }).run(profiles, args.log_level, backend)
+        else:
+            profile.run(profiles, args.log_level, backend, args.concurrency,
+                        _check_executor(profiles, args.executor),
+                        history=history)
+    finally:
+        profile.close_readers(profiles)
 
     time_elapsed.end = time.time()
     backend.finalize({'time_elapsed': time_elapsed.to_json()})
@@ -389,74 +537,130 @@ def resume(input_):
                         dest="no_retry",
                         action="store_true",
                         help="Do not retry incomplete tests")
+    conc_parser = parser.add_mutually_exclusive_group()
+    conc_parser.add_argument('-c', '--all-concurrent',
+                             action="store_const",
+                             const="all",
+                             dest="concurrency",
+                             help="Run all tests concurrently, instead of "
+                                  "the way the run was started")
+    conc_parser.add_argument("-1", "--no-concurrency",
+                             action="store_const",
+                             const="none",
+                             dest="concurrency",
+                             help="Disable concurrent test runs, instead of "
+                                  "the way the run was started")
+    parser.add_argument('--executor',
+                        choices=profile.EXECUTORS,
+                        help='Run tests in threads of the piglit process, or '
+                             'in a pool of worker processes, instead of the '
+                             'way the run was started.')
+    parser.add_argument("--refresh-wflinfo",
+                        action="store_true",
+                        help="Ignore the cached wflinfo answers for this "
+                             "platform and driver, and call wflinfo again")
     args = parser.parse_args(input_)
     _disable_windows_exception_messages()
 
-    results = backends.load(args.results_path)
-    options.OPTIONS.execute = results.options['execute']
-    options.OPTIONS.valgrind = results.options['valgrind']
-    options.OPTIONS.sync = results.options['sync']
-    options.OPTIONS.deqp_mustpass = results.options['deqp_mustpass']
-    options.OPTIONS.proces_isolation = results.options['process_isolation']
+    # Only the names and statuses of the tests that already ran are loaded,
+    # not their results.
+    meta, completed = backends.json.load_completed(args.results_path)
+    results_options = meta['options']
+    options.OPTIONS.execute = results_options['execute']
+    options.OPTIONS.valgrind = results_options['valgrind']
+    options.OPTIONS.sync = results_options['sync']
+    options.OPTIONS.deqp_mustpass = results_options['deqp_mustpass']
+    options.OPTIONS.process_isolation = results_options['process_isolation']
 
     core.get_config(args.config_file)
 
-    options.OPTIONS.env['PIGLIT_PLATFORM'] = results.options['platform']
-
-    results.options['env'] = core.collect_system_info()
-    results.options['name'] = results.name
-
-    # Resume only works with the JSON backend
-    backend = backends.get_backend('json')(
+    options.OPTIONS.env['PIGLIT_PLATFORM'] = results_options['platform']
+    if args.refresh_wflinfo:
+        opengl.WflInfo().refresh()
+
+    concurrency = args.concurrency or results_options['concurrent']
+    executor = args.executor or results_options.get('executor', 'thread')
+    if results_options['dmesg'] or results_options['monitoring']:
+        concurrency = "none"
+        executor = "thread"
+
+    # Resume only works with the backends that write the JSON journal. Runs
+    # started before the backend was recorded used the JSON backend.
+    backend_class = backends.get_backend(
+        results_options.get('backend', 'json'))
+    if not issubclass(backend_class, backends.json.JSONBackend):
+        raise exceptions.PiglitFatalError(
+            'Runs with the {} backend cannot be resumed'.format(
+                results_options['backend']))
+    backend = backend_class(
         args.results_path,
-        file_start_count=len(results.tests) + 1)
+        file_start_count=len(completed) + 1)
     # Specifically do not initialize again, everything initialize does is done.
 
     # Don't re-run tests that have already completed, incomplete status tests
-    # have obviously not completed.
-    exclude_tests = set()
-    for name, result in six.iteritems(results.tests):
-        if args.no_retry or result.result != 'incomplete':
-            exclude_tests.add(name)
+    # have obviously not completed. They're removed by name, so they're never
+    # constructed.
+    exclude_tests = set(n for n, r in six.iteritems(completed)
+                        if args.no_retry or r != 'incomplete')
 
     profiles = [profile.load_test_profile(p)
-                for p in results.options['profile']]
-    for p in profiles:
-        p.results_dir = args.results_path
+                for p in results_options['profile']]
 
-        if results.options['dmesg']:
-            p.dmesg = dmesg.get_dmesg(results.options['dmesg'])
+    # The profiles share one dmesg and one monitoring instance, like in run.
+    if results_options['dmesg']:
+        dmesg_ = dmesg.get_dmesg(results_options['dmesg'])
+        for p in profiles:
+            p.options['dmesg'] = dmesg_
+
+    if results_options['monitoring']:
+        monitor = monitoring.Monitoring(results_options['monitoring'])
+        for p in profiles:
+            p.options['monitor'] = monitor
 
-        if results.options['monitoring']:
-            p.options['monitor'] = monitoring.Monitoring(
-                results.options['monitoring'])
+    for p in profiles:
+        p.results_dir = args.results_path
 
-        if results.options['ignore_missing']:
-            p.options['ignore_missing'] = results.options['ignore_missing']
+        if results_options['ignore_missing']:
+            p.options['ignore_missing'] = results_options['ignore_missing']
 
-        if exclude_tests:
-            p.filters.append(lambda n, _: n not in exclude_tests)
-        if results.options['exclude_filter']:
+        if results_options['exclude_filter']:
             p.filters.append(
-                profile.RegexFilter(results.options['exclude_filter'],
+                profile.RegexFilter(results_options['exclude_filter'],
                                     inverse=True))
-        if results.options['include_filter']:
+        if results_options['include_filter']:
             p.filters.append(
-                profile.RegexFilter(results.options['include_filter']))
+                profile.RegexFilter(results_options['include_filter']))
+
+        if results_options['forced_test_list']:
+            p.forced_test_list = results_options['forced_test_list']
 
-        if results.options['forced_test_list']:
-            p.forced_test_list = results.options['forced_test_list']
+    history = None
+    if results_options.get('timings'):
+        history = scheduling.load_history(results_options['timings'])
+
+    # The shard is split before the completed tests are removed, so that it
+    # is the same one the run was started with.
+    if results_options.get('shard'):
+        _shard_profiles(profiles, results_options['shard'], history)
+
+    if exclude_tests:
+        for p in profiles:
+            p.filters.append(profile.ExcludeFilter(exclude_tests))
 
     # This is resumed, don't bother with time since it won't be accurate anyway
     try:
         profile.run(
             profiles,
-            results.options['log_level'],
+            results_options['log_level'],
             backend,
-            results.options['concurrent'])
+            concurrency,
+            _check_executor(profiles, executor),
+            history=history)
     except exceptions.PiglitUserError as e:
         if str(e) != 'no matching tests':
             raise
+    finally:
+        profile.close_readers(profiles)
 
     backend.finalize()
 
@@ -32,14 +32,17 @@ import errno
 import six
 
 from framework import summary, status, core, backends, exceptions
+from framework.results import merge_runs
 from . import parsers
 
 __all__ = [
     'aggregate',
     'console',
+    'convert',
     'csv',
     'html',
-    'feature'
+    'feature',
+    'merge',
 ]
 
 
@@ -55,9 +58,21 @@ def html(input_):
 
     # Adding the parent is necissary to get the help options
     parser = argparse.ArgumentParser(parents=[parsers.CONFIG])
-    parser.add_argument("-o", "--overwrite",
+    update = parser.add_mutually_exclusive_group()
+    update.add_argument("-o", "--overwrite",
                         action="store_true",
                         help="Overwrite existing directories")
+    update.add_argument("-u", "--update",
+                        action="store_true",
+                        help="Update an existing summary directory in place, "
+                             "only rendering the pages of tests whose "
+                             "results have changed")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=None,
+                        metavar="<int>",
+                        help="Number of processes to render test pages with. "
+                             "Default: the number of CPUs")
     parser.add_argument("-l", "--list",
                         action="store",
                         help="Load a newline separated list of results. These "
@@ -102,11 +117,13 @@ def html(input_):
 
     # If the requested directory doesn't exist, create it or throw an error
     try:
-        core.check_dir(args.summaryDir, not args.overwrite)
+        core.check_dir(args.summaryDir,
+                       not (args.overwrite or args.update))
     except exceptions.PiglitException:
         raise exceptions.PiglitFatalError(
             '{} already exists.\n'
-            'use -o/--overwrite if you want to overwrite it.'.format(
+            'use -o/--overwrite if you want to overwrite it, or '
+            '-u/--update to update it.'.format(
                 args.summaryDir))
 
     # Merge args.list and args.resultsFiles
@@ -114,7 +131,8 @@ def html(input_):
         args.resultsFiles.extend(core.parse_listfile(args.list))
 
     # Create the HTML output
-    summary.html(args.resultsFiles, args.summaryDir, args.exclude_details)
+    summary.html(args.resultsFiles, args.summaryDir, args.exclude_details,
+                 args.jobs)
 
 
 @exceptions.handler
@@ -246,6 +264,72 @@ def aggregate(input_):
         outfile, backends.compression.get_mode()))
 
 
+@exceptions.handler
+def merge(input_):
+    """Combine the results of the shards of a run into one result."""
+    unparsed = parsers.parse_config(input_)[1]
+
+    # Adding the parent is necissary to get the help options
+    parser = argparse.ArgumentParser(parents=[parsers.CONFIG])
+    parser.add_argument('-n', '--name',
+                        metavar='<test name>',
+                        help='Name of the merged results. Default: the name '
+                             'of the first results')
+    parser.add_argument('results',
+                        type=path.realpath,
+                        nargs='+',
+                        metavar='<results path>',
+                        help='Paths to the results of each shard, which must '
+                             'not have any tests in common')
+    parser.add_argument('output',
+                        type=path.realpath,
+                        metavar='<output path>',
+                        help='Directory to write the merged results to')
+    args = parser.parse_args(unparsed)
+
+    merged = merge_runs(*[backends.load(r) for r in args.results])
+    if args.name:
+        merged.name = args.name
+
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    outfile = os.path.join(args.output, 'results.json')
+    backends.json._write(merged, outfile)
+
+    print("Merged results written to: {}".format(args.output))
+
+
+@exceptions.handler
+def convert(input_):
+    """Convert results into the columnar format."""
+    unparsed = parsers.parse_config(input_)[1]
+
+    # Adding the parent is necissary to get the help options
+    parser = argparse.ArgumentParser(parents=[parsers.CONFIG])
+    parser.add_argument('results',
+                        type=path.realpath,
+                        metavar='<results path>',
+                        help='Path to the results to convert')
+    parser.add_argument('-o', '--output',
+                        type=path.realpath,
+                        metavar='<output file>',
+                        help='File to write the converted results to. '
+                             'Default: results.columnar in the directory of '
+                             'the results')
+    args = parser.parse_args(unparsed)
+
+    outfile = args.output
+    if outfile is None:
+        outfile = path.join(
+            args.results if path.isdir(args.results)
+            else path.dirname(args.results),
+            'results.columnar')
+
+    backends.columnar.convert(backends.load(args.results), outfile)
+
+    print("Converted results written to: {}".format(outfile))
+
+
 @exceptions.handler
 def feature(input_):
     parser = argparse.ArgumentParser()
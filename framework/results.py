@@ -145,29 +145,84 @@ class TimeAttribute(object):
 
 
 class TestResult(object):
-    """An object represting the result of a single test."""
+    """An object represting the result of a single test.
+
+    The result, subtests and time of a test are always loaded, but the other
+    fields can be loaded lazily from a source, which is either a dictionary
+    (like the one passed to from_dict), or a callable returning one. The
+    source is only read the first time one of those fields is accessed, so
+    consumers that only look at statuses never pay to decode the output of
+    every test.
+
+    Keyword Arguments:
+    result -- the status of the test.
+    source -- a dict, or callable returning a dict, to load the other fields
+              from when they are first accessed.
+
+    """
     __slots__ = ['returncode', '_err', '_out', 'time', 'command', 'traceback',
                  'environment', 'subtests', 'dmesg', '__result', 'images',
-                 'exception', 'pid']
+                 'exception', 'pid', '__source']
     err = StringDescriptor('_err')
     out = StringDescriptor('_out')
 
-    def __init__(self, result=None):
-        self.returncode = None
+    # The fields that may be loaded from the source, with their slot and
+    # their default value. These aren't set by the constructor, they are set
+    # by __getattr__ the first time they're accessed.
+    _LAZY_FIELDS = collections.OrderedDict([
+        ('returncode', ('returncode', None)),
+        ('command', ('command', str)),
+        ('environment', ('environment', str)),
+        ('dmesg', ('dmesg', str)),
+        ('out', ('_out', six.text_type)),
+        ('err', ('_err', six.text_type)),
+        ('traceback', ('traceback', None)),
+        ('exception', ('exception', None)),
+        ('pid', ('pid', list)),
+    ])
+    _LAZY_SLOTS = {s: d for s, d in six.itervalues(_LAZY_FIELDS)}
+
+    def __init__(self, result=None, source=None):
+        self.__source = source
         self.time = TimeAttribute()
-        self.command = str()
-        self.environment = str()
         self.subtests = Subtests()
-        self.dmesg = str()
         self.images = None
-        self.traceback = None
-        self.exception = None
-        self.pid = []
         if result:
             self.result = result
         else:
             self.__result = status.NOTRUN
 
+    def __load(self):
+        """Set any fields that haven't been set from the source."""
+        source, self.__source = self.__source, None
+        if callable(source):
+            source = source()
+
+        for field, (slot, _) in six.iteritems(self._LAZY_FIELDS):
+            if field in source:
+                try:
+                    object.__getattribute__(self, slot)
+                except AttributeError:
+                    setattr(self, field, source[field])
+
+    def __getattr__(self, name):
+        # This is only called when a slot hasn't been set yet.
+        if name not in self._LAZY_SLOTS:
+            raise AttributeError(name)
+
+        if self.__source is not None:
+            self.__load()
+            try:
+                return object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+
+        default = self._LAZY_SLOTS[name]
+        if default is not None:
+            default = default()
+        object.__setattr__(self, name, default)
+        return default
+
     @property
     def result(self):
         """Return the result of the test.
@@ -210,24 +265,25 @@ class TestResult(object):
         return obj
 
     @classmethod
-    def from_dict(cls, dict_):
+    def from_dict(cls, dict_, lazy=False):
         """Load an already generated result in dictionary form.
 
         This is used as an alternate constructor which converts an existing
         dictionary into a TestResult object. It converts a key 'result' into a
         status.Status object
 
+        When lazy is True only the result, subtests and time are loaded, the
+        other fields are loaded from dict_ when they're first accessed.
+
         """
         # pylint will say that assining to inst.out or inst.err is a non-slot
         # because self.err and self.out are descriptors, methods that act like
         # variables. Just silence pylint
         # pylint: disable=assigning-non-slot
-        inst = cls()
+        inst = cls(source=dict_ if lazy else None)
 
-        for each in ['returncode', 'command', 'exception', 'environment',
-                     'traceback', 'dmesg', 'pid', 'result']:
-            if each in dict_:
-                setattr(inst, each, dict_[each])
+        if 'result' in dict_:
+            inst.result = dict_['result']
 
         # Set special instances
         if 'subtests' in dict_:
@@ -235,11 +291,11 @@ class TestResult(object):
         if 'time' in dict_:
             inst.time = TimeAttribute.from_dict(dict_['time'])
 
-        # out and err must be set manually to avoid replacing the setter
-        if 'out' in dict_:
-            inst.out = dict_['out']
-        if 'err' in dict_:
-            inst.err = dict_['err']
+        if not lazy:
+            # out and err are set through their descriptors
+            for each in six.iterkeys(cls._LAZY_FIELDS):
+                if each in dict_:
+                    setattr(inst, each, dict_[each])
 
         return inst
 
@@ -290,6 +346,98 @@ class Totals(dict):
         return tots
 
 
+def update_totals(totals, name, result, count=1):
+    """Add a test result to the totals of each group it belongs to.
+
+    Arguments:
+    totals -- a dictionary mapping group names to Totals instances, which
+              must create missing groups, like a defaultdict(Totals).
+    name -- the name of the test.
+    result -- the TestResult of the test, or any object with result and
+              subtests attributes.
+
+    Keyword Arguments:
+    count -- the amount to add, -1 removes a result that was previously
+             added. Default: 1
+
+    """
+    # If there are subtests treat the test as if it is a group instead of a
+    # test.
+    if result.subtests:
+        for res in six.itervalues(result.subtests):
+            res = str(res)
+            temp = name
+
+            totals[temp][res] += count
+            while temp:
+                temp = grouptools.groupname(temp)
+                totals[temp][res] += count
+            totals['root'][res] += count
+    else:
+        res = str(result.result)
+        while name:
+            name = grouptools.groupname(name)
+            totals[name][res] += count
+        totals['root'][res] += count
+
+
+def merge_totals(*totals):
+    """Merge the totals of runs of disjoint sets of tests.
+
+    Returns a new dictionary mapping group names to Totals instances.
+
+    Arguments:
+    totals -- dictionaries mapping group names to Totals instances.
+
+    """
+    merged = collections.defaultdict(Totals)
+    for each in totals:
+        for group, counts in six.iteritems(each):
+            for res, value in six.iteritems(counts):
+                merged[group][res] += value
+    return merged
+
+
+def merge_runs(*runs):
+    """Merge the TestrunResults of disjoint sets of tests into one.
+
+    This is used to combine the shards of a run. The name, options and system
+    information are those of the first run, and time_elapsed spans from the
+    earliest start to the latest end of the runs, since shards run at the same
+    time.
+
+    Arguments:
+    runs -- TestrunResult instances.
+
+    """
+    assert runs
+    merged = TestrunResult()
+    for name in ['name', 'uname', 'glxinfo', 'wglinfo', 'clinfo', 'lspci',
+                 'results_version']:
+        value = getattr(runs[0], name, None)
+        if value:
+            setattr(merged, name, value)
+    merged.options = dict(runs[0].options)
+    merged.options['shard'] = None
+
+    # Runs that were never finalized don't have a time_elapsed
+    elapsed = [r.time_elapsed for r in runs if r.time_elapsed.end]
+    if elapsed:
+        merged.time_elapsed = TimeAttribute(min(t.start for t in elapsed),
+                                            max(t.end for t in elapsed))
+
+    for run in runs:
+        for name, result in six.iteritems(run.tests):
+            if name in merged.tests:
+                raise exceptions.PiglitFatalError(
+                    'The test "{}" is in more than one of the results, they '
+                    'cannot be merged.'.format(name))
+            merged.tests[name] = result
+    merged.totals = merge_totals(*[r.totals for r in runs])
+
+    return merged
+
+
 class TestrunResult(object):
     """The result of a single piglit run."""
     def __init__(self):
@@ -327,24 +475,7 @@ class TestrunResult(object):
     def calculate_group_totals(self):
         """Calculate the number of pases, fails, etc at each level."""
         for name, result in six.iteritems(self.tests):
-            # If there are subtests treat the test as if it is a group instead
-            # of a test.
-            if result.subtests:
-                for res in six.itervalues(result.subtests):
-                    res = str(res)
-                    temp = name
-
-                    self.totals[temp][res] += 1
-                    while temp:
-                        temp = grouptools.groupname(temp)
-                        self.totals[temp][res] += 1
-                    self.totals['root'][res] += 1
-            else:
-                res = str(result.result)
-                while name:
-                    name = grouptools.groupname(name)
-                    self.totals[name][res] += 1
-                self.totals['root'][res] += 1
+            update_totals(self.totals, name, result)
 
     def to_json(self):
         if not self.totals:
@@ -356,7 +487,7 @@ class TestrunResult(object):
         return rep
 
     @classmethod
-    def from_dict(cls, dict_, _no_totals=False):
+    def from_dict(cls, dict_, _no_totals=False, lazy=False):
         """Convert a dictionary into a TestrunResult.
 
         This method is meant to be used for loading results from json or
@@ -365,6 +496,8 @@ class TestrunResult(object):
         _no_totals is not meant to be used externally, it allows us to control
         the generation of totals when loading old results formats.
 
+        When lazy is True the tests are loaded lazily, see TestResult.
+
         """
         res = cls()
         for name in ['name', 'uname', 'options', 'glxinfo', 'wglinfo', 'lspci',
@@ -379,8 +512,9 @@ class TestrunResult(object):
         if 'time_elapsed' in dict_:
             setattr(res, 'time_elapsed',
                     TimeAttribute.from_dict(dict_['time_elapsed']))
-        res.tests = collections.OrderedDict((n, TestResult.from_dict(t))
-                    for n, t in six.iteritems(dict_['tests']))
+        res.tests = collections.OrderedDict(
+            (n, TestResult.from_dict(t, lazy=lazy))
+            for n, t in six.iteritems(dict_['tests']))
 
         if not 'totals' in dict_ and not _no_totals:
             res.calculate_group_totals()
@@ -0,0 +1,301 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Scheduling tests using historical timings.
+
+A run's makespan (the wall clock time from the first test starting to the
+last test finishing) depends heavily on the order the concurrent tests are
+started in. If a handful of long tests start last the rest of the machine sits
+idle waiting for them. This module provides helpers for estimating how long
+tests will take from a previous run, and for ordering them so that the longest
+tests are started first (longest processing time first, or LPT).
+
+It also plans how tests that run many subtests in one process (like the
+MultiShaderTest) are batched. A single long batch is a long pole that keeps
+the rest of the machine idle at the end of a run, while many tiny batches
+spend their time starting processes; a subtest that crashed last time is
+likely to crash again, restarting the process running it.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import heapq
+
+import six
+
+from framework import backends, grouptools
+
+__all__ = [
+    'Durations',
+    'History',
+    'Phase',
+    'load_history',
+    'load_timings',
+    'longest_first',
+    'makespan',
+    'plan_batches',
+    'shard',
+]
+
+
+class History(object):
+    """What a previous run recorded about its tests.
+
+    Arguments:
+    timings -- a dictionary mapping test names to durations in seconds.
+    subtests -- a dictionary mapping the full names of subtests to their
+                estimated durations in seconds.
+    crashed -- a set of the names of the tests and subtests that crashed or
+               timed out.
+    """
+    def __init__(self, timings, subtests, crashed):
+        self.timings = timings
+        self.subtests = subtests
+        self.crashed = crashed
+
+
+def load_history(path):
+    """Load a History from a results file or directory.
+
+    Tests without a recorded time (for example because they were never run)
+    are left out of the timings. Only the total time of a test with subtests
+    is recorded, so it is split evenly between the subtests that ran.
+
+    Arguments:
+    path -- a path to any results that backends.load can read.
+    """
+    results = backends.load(path)
+    timings = {}
+    subtests = {}
+    crashed = set()
+    for name, result in six.iteritems(results.tests):
+        total = result.time.total
+        if total > 0:
+            timings[name] = total
+        if result.result.name in _CRASHED:
+            crashed.add(name)
+
+        ran = [s for s, r in six.iteritems(result.subtests)
+               if r.name not in _NOT_RUN]
+        for subtest in ran:
+            full = grouptools.join(name, subtest)
+            if total > 0:
+                subtests[full] = total / len(ran)
+            if result.subtests[subtest].name in _CRASHED:
+                crashed.add(full)
+    return History(timings, subtests, crashed)
+
+
+def load_timings(path):
+    """Load the duration of each test from a results file or directory.
+
+    Returns a dictionary mapping test names to their duration in seconds.
+    Tests without a recorded time (for example because they were never run)
+    are left out.
+
+    Arguments:
+    path -- a path to any results that backends.load can read.
+    """
+    return load_history(path).timings
+
+
+# Statuses are compared by name, since SKIP and NOTRUN compare equal to PASS.
+_CRASHED = frozenset(['crash', 'timeout'])
+_NOT_RUN = frozenset(['skip', 'notrun'])
+
+
+class Durations(object):
+    """Estimates the duration of tests from historical timings.
+
+    Tests that don't have a historical timing (new tests, or tests that were
+    filtered out of the previous run) are assumed to take the mean time of the
+    tests that do.
+
+    Durations that are set are only kept by the instance, timings isn't
+    changed.
+
+    Arguments:
+    timings -- a dictionary mapping test names to durations in seconds.
+    """
+    def __init__(self, timings):
+        self.__timings = dict(timings)
+        if timings:
+            self.default = sum(six.itervalues(timings)) / len(timings)
+        else:
+            self.default = 0.0
+
+    def __getitem__(self, name):
+        return self.__timings.get(name, self.default)
+
+    def __setitem__(self, name, duration):
+        self.__timings[name] = duration
+
+    def __contains__(self, name):
+        return name in self.__timings
+
+
+def longest_first(test_list, durations):
+    """Sort (name, test) pairs so that the longest tests come first.
+
+    This is stable, so tests with the same estimated duration keep their
+    original order.
+
+    Arguments:
+    test_list -- an iterable of (name, Test) tuples.
+    durations -- a Durations instance.
+    """
+    return sorted(test_list, key=lambda x: durations[x[0]], reverse=True)
+
+
+def plan_batches(tests, durations, target, isolate=frozenset()):
+    """Plan the batches the subtests of tests are run in.
+
+    Subtests are taken in order and added to a batch until it would take
+    longer than target, so a long test is split over several batches and
+    short tests that follow each other share one. A batch never holds two
+    subtests with the same name, since they couldn't be told apart. Subtests
+    named in isolate get a batch of their own.
+
+    Returns a list of batches, each of which is a list of (name, subtests)
+    tuples.
+
+    Arguments:
+    tests -- a list of (name, subtests) tuples, where subtests is a list of
+             the names of the subtests of the test.
+    durations -- a Durations instance for the full names of the subtests.
+    target -- the number of seconds a batch should take.
+
+    Keyword Arguments:
+    isolate -- a container of full subtest names to run on their own.
+    """
+    batches = []
+    current = []
+    names = set()
+    elapsed = 0.0
+
+    for name, subtests in tests:
+        for subtest in subtests:
+            full = grouptools.join(name, subtest)
+            if full in isolate:
+                batches.append([(name, [subtest])])
+                continue
+
+            duration = durations[full]
+            if current and (elapsed + duration > target or subtest in names):
+                batches.append(current)
+                current = []
+                names = set()
+                elapsed = 0.0
+
+            if current and current[-1][0] == name:
+                current[-1][1].append(subtest)
+            else:
+                current.append((name, [subtest]))
+            names.add(subtest)
+            elapsed += duration
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def shard(names, durations, index, count):
+    """Return the names of the tests that one of count shards runs.
+
+    The tests are split so that each shard is expected to take about the same
+    time, rather than run the same number of tests: they're taken longest
+    first, and each goes to the shard with the least work so far (the one with
+    the fewest tests, then the lowest index, if that's a tie). The partition
+    only depends on the names and durations, so every shard computes the same
+    one, as long as they are given the same tests and timings.
+
+    Arguments:
+    names -- an iterable of test names.
+    durations -- a Durations instance.
+    index -- the index of the shard, from 0 to count - 1.
+    count -- the number of shards.
+    """
+    assert 0 <= index < count
+    shards = [(0.0, 0, i) for i in range(count)]
+    mine = set()
+    for name in sorted(names, key=lambda n: (-durations[n], n)):
+        elapsed, tests, i = heapq.heappop(shards)
+        if i == index:
+            mine.add(name)
+        heapq.heappush(shards, (elapsed + durations[name], tests + 1, i))
+    return mine
+
+
+def makespan(durations, slots):
+    """Predict the makespan of running durations in order on slots workers.
+
+    This simulates a pool handing each task, in order, to the first worker to
+    become free, which is how both the thread and process pools behave.
+
+    Arguments:
+    durations -- an iterable of durations in seconds.
+    slots -- the number of workers running tasks.
+    """
+    assert slots > 0
+    workers = [0.0] * slots
+    for duration in durations:
+        heapq.heappush(workers, heapq.heappop(workers) + duration)
+    return max(workers)
+
+
+class Phase(object):
+    """The utilization of a pool while it ran one phase of a run.
+
+    A phase is a group of tests submitted to a pool, which is then drained
+    before anything else runs. Any time a slot of the pool spends not running a
+    test (starting tests, or waiting for the last tests to finish) is idle.
+
+    Arguments:
+    name  -- the name of the phase, "exclusive" or "concurrent".
+    slots -- the number of tests the pool runs at once.
+    tests -- the number of tests run in the phase.
+    wall  -- the wall clock time the phase took, in seconds.
+    busy  -- the sum of the time each test took, in seconds.
+    """
+    def __init__(self, name, slots, tests, wall, busy):
+        self.name = name
+        self.slots = slots
+        self.tests = tests
+        self.wall = wall
+        self.busy = busy
+
+    @property
+    def idle(self):
+        """The slot-seconds of the phase that no test was running."""
+        return max(self.wall * self.slots - self.busy, 0.0)
+
+    @property
+    def utilization(self):
+        """The fraction of the slot-seconds of the phase running tests."""
+        if not self.wall:
+            return 0.0
+        return min(self.busy / (self.wall * self.slots), 1.0)
+
+    def __str__(self):
+        return ('{} phase: {} tests in {:.1f}s, {:.1f} slot-seconds idle '
+                '({:.0%} utilization)'.format(
+                    self.name.capitalize(), self.tests, self.wall, self.idle,
+                    self.utilization))
@@ -210,6 +210,12 @@ class Status(object):
     def __hash__(self):
         return hash(self.name)
 
+    def __reduce__(self):
+        # Statuses are compared by identity in places, so make sure that
+        # unpickling (like when a result is returned from a worker process)
+        # returns the shared instance rather than a copy.
+        return status_lookup, (self.name, )
+
 
 class NoChangeStatus(Status):
     """ Special sublcass of status that overides rich comparison methods
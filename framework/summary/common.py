@@ -30,6 +30,11 @@ import operator
 
 import six
 from six.moves import zip
+try:
+    import numpy
+    _NUMPY = True
+except ImportError:
+    _NUMPY = False
 
 # a local variable status exists, prevent accidental overloading by renaming
 # the module
@@ -37,6 +42,13 @@ import framework.status as so
 from framework.core import lazy_property
 from framework import grouptools
 
+# In a StatusMatrix statuses are encoded as their index in status.ALL, and a
+# test that is missing from a run as _MISSING. This is keyed by name since some
+# statuses compare equal to each other.
+_CODES = {s.name: i for i, s in enumerate(so.ALL)}
+_MISSING = len(so.ALL)
+_STATUSES = list(so.ALL) + [None]
+
 
 class Results(object):  # pylint: disable=too-few-public-methods
     """Container object for results.
@@ -65,6 +77,87 @@ class Results(object):  # pylint: disable=too-few-public-methods
         return results
 
 
+class StatusMatrix(object):
+    """The status of every test in every run, encoded as small integers.
+
+    This is built once for a set of results, after which every category of
+    Names is a single table lookup over the whole matrix, rather than a call
+    to TestrunResult.get_result for each test in each run. If numpy is
+    available the lookups are vectorized.
+
+    Arguments:
+    results -- a list of results.TestrunResult instances
+    tests -- an iterable of test names, the rows of the matrix
+
+    """
+    def __init__(self, results, tests):
+        self.names = list(tests)
+        codes = []
+        for res in results:
+            encoded = self.__encode(res)
+            codes.append([encoded.get(n, _MISSING) for n in self.names])
+
+        if _NUMPY:
+            self.names = numpy.array(self.names, dtype=object)
+            self.codes = numpy.array(codes, dtype=numpy.uint8).reshape(
+                len(codes), len(self.names))
+        else:
+            self.codes = codes
+
+    @staticmethod
+    def __encode(result):
+        """Map every name that result.get_result can find to a code."""
+        encoded = {}
+        for name, test in six.iteritems(result.tests):
+            # get_result looks for a test before a subtest of the same name,
+            # and only finds subtests by splitting the name at the last
+            # separator.
+            encoded[name] = _CODES[test.result.name]
+            for subtest, status in six.iteritems(test.subtests):
+                full = grouptools.join(name, subtest)
+                if grouptools.splitname(full) == (name, subtest):
+                    encoded.setdefault(full, _CODES[status.name])
+        return encoded
+
+    def diffs(self, comparator, missing=lambda prev, cur: False):
+        """Find the names that changed between each pair of adjacent runs.
+
+        Arguments:
+        comparator -- a function with the signature f(prev, cur), that returns
+                      True when the test should be added to the set of diffs.
+        missing -- a function with the same signature, used instead of
+                   comparator when the test is missing from either run, in
+                   which case the missing status is None.
+
+        """
+        table = [[missing(p, c) if p is None or c is None else comparator(p, c)
+                  for c in _STATUSES] for p in _STATUSES]
+
+        diffs = []
+        for prev, cur in zip(self.codes[:-1], self.codes[1:]):
+            if _NUMPY:
+                mask = numpy.array(table, dtype=bool)[prev, cur]
+                diffs.append(set(self.names[mask].tolist()))
+            else:
+                diffs.append({n for n, p, c in zip(self.names, prev, cur)
+                              if table[p][c]})
+        return diffs
+
+    def single(self, func):
+        """Find the names in each run whose status func returns True for."""
+        table = [s is not None and func(s) for s in _STATUSES]
+
+        statuses = []
+        for codes in self.codes:
+            if _NUMPY:
+                mask = numpy.array(table, dtype=bool)[codes]
+                statuses.append(set(self.names[mask].tolist()))
+            else:
+                statuses.append({n for n, c in zip(self.names, codes)
+                                 if table[c]})
+        return statuses
+
+
 class Names(object):
     """Class containing names of tests for various statuses.
 
@@ -76,19 +169,22 @@ class Names(object):
     def __init__(self, tests):
         self.__results = tests.results
 
-    def __diff(self, comparator, handler=None):
-        """Helper for simplifying comparators using find_diffs."""
+    def __diff(self, comparator, missing=None):
+        """Helper for simplifying comparators using the status matrix."""
         ret = ['']
-        if handler is None:
-            ret.extend(find_diffs(self.__results, self.all, comparator))
+        if missing is None:
+            ret.extend(self._matrix.diffs(comparator))
         else:
-            ret.extend(find_diffs(self.__results, self.all, comparator,
-                                  handler=handler))
+            ret.extend(self._matrix.diffs(comparator, missing=missing))
         return ret
 
     def __single(self, comparator):
-        """Helper for simplifying comparators using find_single."""
-        return find_single(self.__results, self.all, comparator)
+        """Helper for simplifying comparators using the status matrix."""
+        return self._matrix.single(comparator)
+
+    @lazy_property
+    def _matrix(self):
+        return StatusMatrix(self.__results, self.all)
 
     @lazy_property
     def all(self):
@@ -105,26 +201,19 @@ class Names(object):
 
     @lazy_property
     def changes(self):
-        def handler(names, name, prev, cur):
+        def missing(prev, cur):
             """Handle missing tests.
 
             For changes we want literally anything where the first result
             isn't the same as the second result.
 
             """
-            def _get(res):
-                try:
-                    return res.get_result(name)
-                except KeyError:
-                    return so.NOTRUN
-
             # Add any case of a != b except skip <-> notrun
-            cur = _get(cur)
-            prev = _get(prev)
-            if cur != prev and {cur, prev} != {so.SKIP, so.NOTRUN}:
-                names.add(name)
+            cur = so.NOTRUN if cur is None else cur
+            prev = so.NOTRUN if prev is None else prev
+            return cur != prev and {cur, prev} != {so.SKIP, so.NOTRUN}
 
-        return self.__diff(operator.ne, handler=handler)
+        return self.__diff(operator.ne, missing=missing)
 
     @lazy_property
     def problems(self):
@@ -150,23 +239,15 @@ class Names(object):
 
     @lazy_property
     def enabled(self):
-        def handler(names, name, prev, cur):
-            if _result_in(name, cur) and not _result_in(name, prev):
-                names.add(name)
-
         return self.__diff(
             lambda x, y: x is so.NOTRUN and y is not so.NOTRUN,
-            handler=handler)
+            missing=lambda prev, cur: prev is None and cur is not None)
 
     @lazy_property
     def disabled(self):
-        def handler(names, name, prev, cur):
-            if _result_in(name, prev) and not _result_in(name, cur):
-                names.add(name)
-
         return self.__diff(
             lambda x, y: x is not so.NOTRUN and y is so.NOTRUN,
-            handler=handler)
+            missing=lambda prev, cur: prev is not None and cur is None)
 
     @lazy_property
     def incomplete(self):
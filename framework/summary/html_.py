@@ -27,10 +27,14 @@ from __future__ import (
 )
 import errno
 import getpass
+import hashlib
+import json
+import multiprocessing
 import os
 import shutil
 import sys
 import tempfile
+import time
 
 import mako
 from mako.lookup import TemplateLookup
@@ -38,7 +42,8 @@ import six
 
 # a local variable status exists, prevent accidental overloading by renaming
 # the module
-from framework import backends, exceptions, core
+from framework import backends, exceptions, core, results as results_
+from framework.backends.json import piglit_encoder
 
 from .common import Results, escape_filename, escape_pathname
 from .feature import FeatResults
@@ -76,22 +81,67 @@ def _copy_static_files(destination):
                 os.path.join(destination, "result.css"))
 
 
-def _make_testrun_info(results, destination, exclude=None):
-    """Create the pages for each results file."""
+def _render_page(page):
+    """Render a single test page.
+
+    This is run in the worker processes, the result is passed as its json
+    encoding since that's what the page cache hashes anyway, and it keeps
+    lazily loaded results from having to be pickled.
+    """
+    key, encoded, html_path, css, index = page
+    value = results_.TestResult.from_dict(json.loads(encoded))
+
+    core.check_dir(os.path.dirname(html_path))
+    with open(html_path, 'wb') as out:
+        out.write(_TEMPLATES.get_template('test_result.mako').render(
+            testname=key,
+            value=value,
+            css=css,
+            index=index))
+
+
+def _load_cache(path):
+    """Load the page cache of a previous run, or an empty one."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _make_testrun_info(results, destination, exclude=None, jobs=None):
+    """Create the pages for each results file.
+
+    The individual test pages are rendered by a pool of processes. Each run
+    directory has a cache mapping tests to a hash of their result and the
+    test_result.mako mtime, pages with a matching hash are not rendered
+    again.
+
+    Returns a tuple of the number of pages rendered, the number of unchanged
+    pages, and the time spent.
+    """
     exclude = exclude or {}
     result_css = os.path.join(destination, "result.css")
     index = os.path.join(destination, "index.html")
+    template = os.path.getmtime(
+        os.path.join(_TEMPLATE_DIR, 'test_result.mako'))
+
+    start = time.time()
+    seen = set()
+    caches = []
+    pages = []
+    unchanged = 0
 
     for each in results.results:
         name = escape_pathname(each.name)
-        try:
-            core.check_dir(os.path.join(destination, name), True)
-        except exceptions.PiglitException:
+        if name in seen:
             raise exceptions.PiglitFatalError(
                 'Two or more of your results have the same "name" '
                 'attribute. Try changing one or more of the "name" '
                 'values in your json files.\n'
                 'Duplicate value: {}'.format(name))
+        seen.add(name)
+        core.check_dir(os.path.join(destination, name))
 
         with open(os.path.join(destination, name, "index.html"), 'wb') as out:
             out.write(_TEMPLATES.get_template('testrun_info.mako').render(
@@ -104,22 +154,72 @@ def _make_testrun_info(results, destination, exclude=None):
                 clinfo=each.clinfo,
                 lspci=each.lspci))
 
+        cache_path = os.path.join(destination, name, '.pages.json')
+        old = _load_cache(cache_path)
+        new = {}
+
         # Then build the individual test results
         for key, value in six.iteritems(each.tests):
+            if value.result in exclude:
+                continue
+
             html_path = os.path.join(destination, name,
                                      escape_filename(key + ".html"))
             temp_path = os.path.dirname(html_path)
+            encoded = json.dumps(value, default=piglit_encoder,
+                                 sort_keys=True)
+            digest = hashlib.sha1(
+                '{}\0{}'.format(template, encoded).encode('utf-8')).hexdigest()
+            new[key] = digest
+
+            if old.pop(key, None) == digest and os.path.exists(html_path):
+                unchanged += 1
+                continue
+
+            pages.append((key, encoded, html_path,
+                          os.path.relpath(result_css, temp_path),
+                          os.path.relpath(index, temp_path)))
+
+        # Anything left in the old cache is a page for a test that is no
+        # longer in the results (or is now excluded)
+        for key in old:
+            try:
+                os.unlink(os.path.join(destination, name,
+                                       escape_filename(key + ".html")))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+        caches.append((cache_path, new))
+
+    jobs = jobs or multiprocessing.cpu_count()
+    if jobs > 1 and len(pages) > jobs:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for _ in pool.imap_unordered(_render_page, pages, chunksize=32):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for page in pages:
+            _render_page(page)
+
+    # Only write the caches once every page has been rendered, otherwise an
+    # interrupted summary could leave pages that the cache claims are current
+    for cache_path, cache in caches:
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f)
 
-            if value.result not in exclude:
-                core.check_dir(temp_path)
+    return len(pages), unchanged, time.time() - start
 
-                with open(html_path, 'wb') as out:
-                    out.write(_TEMPLATES.get_template(
-                        'test_result.mako').render(
-                            testname=key,
-                            value=value,
-                            css=os.path.relpath(result_css, temp_path),
-                            index=os.path.relpath(index, temp_path)))
+
+def _report(rendered, unchanged, elapsed):
+    """Print the test page render rate."""
+    print('Rendered {} test pages in {:.1f}s ({:.0f} pages/s), '
+          '{} unchanged'.format(rendered, elapsed,
+                                rendered / elapsed if elapsed else 0,
+                                unchanged))
 
 
 def _make_comparison_pages(results, destination, exclude):
@@ -162,7 +262,7 @@ def _make_feature_info(results, destination):
             results=results))
 
 
-def html(results, destination, exclude):
+def html(results, destination, exclude, jobs=None):
     """
     Produce HTML summaries.
 
@@ -171,19 +271,25 @@ def html(results, destination, exclude):
     The beauty of this approach is that mako is leveraged to do the
     heavy lifting, this method just passes it a bunch of dicts and lists
     of dicts, which mako turns into pretty HTML.
+
+    Test pages that are unchanged since the last time a summary was
+    generated into destination are not rendered again. jobs is the number of
+    processes to render with, defaulting to the number of CPUs.
     """
     results = Results([backends.load(i) for i in results])
 
     _copy_static_files(destination)
-    _make_testrun_info(results, destination, exclude)
+    stats = _make_testrun_info(results, destination, exclude, jobs)
     _make_comparison_pages(results, destination, exclude)
+    _report(*stats)
 
 
-def feat(results, destination, feat_desc):
+def feat(results, destination, feat_desc, jobs=None):
     """Produce HTML feature readiness summary."""
 
     feat_res = FeatResults([backends.load(i) for i in results], feat_desc)
 
     _copy_static_files(destination)
-    _make_testrun_info(feat_res, destination)
+    stats = _make_testrun_info(feat_res, destination, jobs=jobs)
     _make_feature_info(feat_res, destination)
+    _report(*stats)
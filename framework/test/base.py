@@ -252,21 +252,14 @@ class Test(object):
         * For 'returncode', the value will be the numeric exit code/value.
         * For 'command', the value will be command line program and arguments.
         """
-        self.result.command = ' '.join(self.command)
-        self.result.environment = " ".join(
-            '{0}="{1}"'.format(k, v) for k, v in itertools.chain(
-                six.iteritems(OPTIONS.env), six.iteritems(self.env)))
-
         try:
             self.is_skip()
         except TestIsSkip as e:
-            self.result.result = status.SKIP
-            for each in six.iterkeys(self.result.subtests):
-                self.result.subtests[each] = status.SKIP
-            self.result.out = e.reason
-            self.result.returncode = None
+            self.skip(e.reason)
             return
 
+        self._set_command()
+
         try:
             self._run_command()
         except TestRunError as e:
@@ -279,6 +272,26 @@ class Test(object):
 
         self.interpret_result()
 
+    def skip(self, reason):
+        """Set the result to skip, with reason as the output.
+
+        This is what run() does when is_skip() raises TestIsSkip, and can be
+        used to skip a test without running it at all.
+        """
+        self._set_command()
+        self.result.result = status.SKIP
+        for each in six.iterkeys(self.result.subtests):
+            self.result.subtests[each] = status.SKIP
+        self.result.out = reason
+        self.result.returncode = None
+
+    def _set_command(self):
+        """Record the command line and environment in the result."""
+        self.result.command = ' '.join(self.command)
+        self.result.environment = " ".join(
+            '{0}="{1}"'.format(k, v) for k, v in itertools.chain(
+                six.iteritems(OPTIONS.env), six.iteritems(self.env)))
+
     def is_skip(self):
         """ Application specific check for skip
 
@@ -288,18 +301,8 @@ class Test(object):
         """
         pass
 
-    def _run_command(self, **kwargs):
-        """ Run the test command and get the result
-
-        This method sets environment options, then runs the executable. If the
-        executable isn't found it sets the result to skip.
-
-        """
-        # This allows the ReducedProcessMixin to work without having to whack
-        # self.command (which should be treated as immutable), but is
-        # considered private.
-        command = kwargs.pop('_command', self.command)
-
+    def _full_env(self):
+        """Return the environment the test is run with."""
         # Setup the environment for the test. Environment variables are taken
         # from the following sources, listed in order of increasing precedence:
         #
@@ -322,14 +325,26 @@ class Test(object):
         _base = itertools.chain(six.iteritems(os.environ),
                                 six.iteritems(OPTIONS.env),
                                 six.iteritems(self.env))
-        fullenv = {f(k): f(v) for k, v in _base}
+        return {f(k): f(v) for k, v in _base}
+
+    def _run_command(self, **kwargs):
+        """ Run the test command and get the result
+
+        This method sets environment options, then runs the executable. If the
+        executable isn't found it sets the result to skip.
+
+        """
+        # This allows the ReducedProcessMixin to work without having to whack
+        # self.command (which should be treated as immutable), but is
+        # considered private.
+        command = kwargs.pop('_command', self.command)
 
         try:
             proc = subprocess.Popen(command,
                                     stdout=subprocess.PIPE,
                                     stderr=subprocess.PIPE,
                                     cwd=self.cwd,
-                                    env=fullenv,
+                                    env=self._full_env(),
                                     universal_newlines=True,
                                     **_EXTRA_POPEN_ARGS)
 
@@ -22,7 +22,12 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import abc
+import collections
+import functools
+import hashlib
 import os
+import re
+import shutil
 import subprocess
 try:
     from lxml import etree as et
@@ -32,13 +37,16 @@ except ImportError:
 import six
 from six.moves import range
 
-from framework import core, grouptools, exceptions
+from framework import core, grouptools, exceptions, status
 from framework import options
 from framework.profile import TestProfile
-from framework.test.base import Test, is_crash_returncode, TestRunError
+from framework.test.base import (
+    Test, is_crash_returncode, ReducedProcessMixin, TestRunError,
+)
 
 __all__ = [
     'DEQPBaseTest',
+    'DEQPBatchMixin',
     'gen_caselist_txt',
     'get_option',
     'iter_deqp_test_cases',
@@ -79,34 +87,93 @@ def select_source(bin_, filename, mustpass, extra_args):
             gen_caselist_txt(bin_, filename, extra_args))
 
 
-def make_profile(test_list, test_class):
-    """Create a TestProfile instance."""
+def make_profile(test_list, test_class, batch_class=None):
+    """Create a TestProfile instance.
+
+    The tests are added as factories, so they're only constructed when they
+    are run.
+
+    If batch_class is given and process isolation is disabled the cases of
+    each group are run together by one batch_class instance, which is named
+    after the group and has a subtest for each case.
+
+    """
     profile = TestProfile()
+    if batch_class is not None and not options.OPTIONS.process_isolation:
+        chunk_size = int(get_option('PIGLIT_DEQP_CHUNK_SIZE',
+                                    ('deqp', 'chunk_size'),
+                                    default=DEQPBatchMixin.chunk_size))
+
+        groups = collections.OrderedDict()
+        for testname in test_list:
+            groups.setdefault(testname.rpartition('.')[0], []).append(
+                testname)
+        for group, cases in six.iteritems(groups):
+            piglit_name = group.replace('.', grouptools.SEPARATOR)
+            profile.test_list.add_factory(piglit_name, functools.partial(
+                batch_class, cases, chunk_size=chunk_size))
+        return profile
+
+    # Only the names are kept until a test is looked up, there are hundreds
+    # of thousands of cases in some suites.
     for testname in test_list:
         # deqp uses '.' as the testgroup separator.
         piglit_name = testname.replace('.', grouptools.SEPARATOR)
-        profile.test_list[piglit_name] = test_class(testname)
+        profile.test_list.add_factory(piglit_name,
+                                      functools.partial(test_class, testname))
 
     return profile
 
 
 def gen_mustpass_tests(mp_list):
-    """Return a testlist from the mustpass list."""
-    root = et.parse(mp_list).getroot()
+    """Return a testlist from the mustpass list.
+
+    The list is parsed incrementally, and each element is discarded once it
+    has been read.
+
+    """
     group = []
+    depth = 0
 
-    def gen(base):
-        for elem in base:
+    for event, elem in et.iterparse(mp_list, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            # The root element isn't part of the names.
+            if depth == 1:
+                continue
             if elem.tag == 'Test':
                 yield '{}.{}'.format('.'.join(group), elem.get('name'))
             else:
                 group.append(elem.get('name'))
-                for test in gen(elem):
-                    yield test
+        else:
+            depth -= 1
+            if depth and elem.tag != 'Test':
                 del group[-1]
+            elem.clear()
 
-    for test in gen(root):
-        yield test
+
+def _caselist_cache(bin_, caselist, extra_args):
+    """Return the path a generated caselist is cached at, or None.
+
+    The caselist depends on the binary and the arguments it's given, so the
+    cached copy is keyed by both. The binary is identified by its path, size,
+    modification time and inode rather than its contents, which would mean
+    reading all of it every time a profile is loaded.
+    """
+    dir_ = core.get_cache_path(
+        get_option('PIGLIT_DEQP_CASELIST_CACHE', ('deqp', 'caselist_cache')),
+        'deqp')
+    if dir_ is None:
+        return None
+
+    real = os.path.realpath(bin_)
+    st = os.stat(real)
+    key = hashlib.sha1()
+    key.update('\0'.join(
+        [real, str(st.st_size),
+         str(getattr(st, 'st_mtime_ns', st.st_mtime)), str(st.st_ino)] +
+        list(extra_args)).encode('utf-8'))
+    return os.path.join(dir_, '{}-{}'.format(key.hexdigest()[:16], caselist))
 
 
 def gen_caselist_txt(bin_, caselist, extra_args):
@@ -114,7 +181,17 @@ def gen_caselist_txt(bin_, caselist, extra_args):
 
     Extra args should be a list of extra arguments to pass to deqp.
 
+    Generating a caselist means starting deqp, so a copy of it is kept in
+    the directory set by caselist_cache in the [deqp] section of piglit.conf
+    (or PIGLIT_DEQP_CASELIST_CACHE), which defaults to
+    $XDG_CACHE_HOME/piglit/deqp, and used until the binary or the arguments
+    change. Setting it to "none" disables the cache.
+
     """
+    cached = _caselist_cache(bin_, caselist, extra_args)
+    if cached is not None and os.path.exists(cached):
+        return cached
+
     # dEQP is stupid (2014-12-07):
     #   1. To generate the caselist file, dEQP requires that the process's
     #      current directory must be that same as that of the executable.
@@ -135,9 +212,42 @@ def gen_caselist_txt(bin_, caselist, extra_args):
             [bin_, '--deqp-runmode=txt-caselist'] + extra_args, cwd=basedir,
             stdout=d, stderr=d)
     assert os.path.exists(caselist_path)
+
+    if cached is not None:
+        # Failing to write the cache is not an error, the caselist will just
+        # be generated again next time.
+        try:
+            core.check_dir(os.path.dirname(cached))
+            tmp = '{}.{}'.format(cached, os.getpid())
+            shutil.copyfile(caselist_path, tmp)
+            os.rename(tmp, cached)
+        except (IOError, OSError):
+            pass
+        else:
+            return cached
     return caselist_path
 
 
+def caselist_trie(cases):
+    """Return cases in the trie format of dEQP's --deqp-caselist option.
+
+    >>> caselist_trie(['dEQP-GLES2.info.version', 'dEQP-GLES2.info.vendor'])
+    '{dEQP-GLES2{info{version,vendor}}}'
+
+    """
+    root = collections.OrderedDict()
+    for case in cases:
+        node = root
+        for part in case.split('.'):
+            node = node.setdefault(part, collections.OrderedDict())
+
+    def gen(node):
+        return '{' + ','.join(
+            k + (gen(v) if v else '') for k, v in six.iteritems(node)) + '}'
+
+    return gen(root)
+
+
 def iter_deqp_test_cases(case_file):
     """Iterate over original dEQP testcase names."""
     with open(case_file, 'r') as caselist_file:
@@ -153,7 +263,7 @@ def iter_deqp_test_cases(case_file):
 
 @six.add_metaclass(abc.ABCMeta)
 class DEQPBaseTest(Test):
-    __RESULT_MAP = {
+    _RESULT_MAP = {
         "Pass": "pass",
         "Fail": "fail",
         "QualityWarning": "warn",
@@ -199,7 +309,7 @@ class DEQPBaseTest(Test):
         # otherwise this requires some break/else/continue madness
         for line in self.result.out.split('\n'):
             line = line.lstrip()
-            for k, v in six.iteritems(self.__RESULT_MAP):
+            for k, v in six.iteritems(self._RESULT_MAP):
                 if line.startswith(k):
                     self.result.result = v
                     return
@@ -226,3 +336,146 @@ class DEQPBaseTest(Test):
             return
 
         raise TestRunError('Failed to connect to X server 5 times', 'fail')
+
+
+class DEQPBatchMixin(ReducedProcessMixin):
+    """Run several dEQP cases from the same group in one process.
+
+    This is combined with a DEQPBaseTest subclass, which provides the binary
+    and the extra arguments. The cases are passed to dEQP with
+    --deqp-caselist, at most chunk_size at a time, and each case is a subtest
+    named after the last part of its name. If dEQP crashes the case it was
+    running is marked crash and the cases of the chunk it hadn't started are
+    resumed in a new process.
+
+    Arguments:
+    case_names -- a list of dEQP case names, which must all be in the same
+                  group.
+
+    Keyword Arguments:
+    chunk_size -- the most cases to pass to a single dEQP process.
+    """
+    chunk_size = 500
+
+    __CASE = re.compile(r"^Test case '(.+)'\.\.$", re.MULTILINE)
+
+    def __init__(self, case_names, chunk_size=None):
+        assert case_names
+        assert len({c.rpartition('.')[0] for c in case_names}) == 1, \
+            'all cases must be in the same group'
+        # The command DEQPBaseTest builds for the first case is never used,
+        # the command getter below replaces it.
+        super(DEQPBatchMixin, self).__init__(case_names[0],
+                                             subtests=list(case_names))
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    @Test.command.getter
+    def command(self):
+        return self._caselist_command(self._expected)
+
+    def _caselist_command(self, cases):
+        return ([self.deqp_bin, '--deqp-caselist=' + caselist_trie(cases)] +
+                self.extra_args)
+
+    @staticmethod
+    def _subtest_name(test):
+        return test.rpartition('.')[2]
+
+    def _populate_subtests(self):
+        self.result.subtests.update(
+            {self._subtest_name(x): status.NOTRUN for x in self._expected})
+
+    def _is_subtest(self, line):
+        return line.startswith("Test case '")
+
+    def _resume(self, current):
+        # Not used, dEQP doesn't run a caselist in the order it is given, so
+        # _run_cases resumes by name rather than by index.
+        return self._caselist_command(self._expected[current:])
+
+    def _run_cases(self, cases, *args, **kwargs):
+        """Run cases, resuming the run until every case has run or crashed.
+
+        dEQP runs the cases of a caselist in the order of its own hierarchy
+        rather than the order of the list, so the case that crashed is the
+        last one dEQP started, and the run is resumed with the cases it
+        didn't start.
+        """
+        # Skip the ReducedProcessMixin, which resumes by index.
+        run = super(ReducedProcessMixin, self)._run_command
+        run(_command=self._caselist_command(cases) + list(args), **kwargs)
+        if self._is_cherry():
+            return
+
+        returncode = self.result.returncode
+        out = [self.result.out]
+        err = [self.result.err]
+        remaining = list(cases)
+        while True:
+            started = self.__CASE.findall(self.result.out)
+            # If dEQP didn't get as far as starting a case, blame the first
+            # remaining one so that the run makes progress.
+            crashed = started[-1] if started else remaining[0]
+            self.result.subtests[self._subtest_name(crashed)] = \
+                self._stop_status()
+
+            done = set(started)
+            done.add(crashed)
+            remaining = [c for c in remaining if c not in done]
+            if not remaining:
+                break
+
+            run(_command=self._caselist_command(remaining) + list(args),
+                **kwargs)
+            out.append(self.result.out)
+            err.append(self.result.err)
+            if self._is_cherry():
+                break
+
+        # Keep the returncode of the crash, the resumed run may return 0.
+        self.result.returncode = returncode
+        self.result.out = '\n\n====RESUME====\n\n'.join(out)
+        self.result.err = '\n\n====RESUME====\n\n'.join(err)
+
+    def _run_command(self, *args, **kwargs):
+        """Run the cases chunk_size at a time."""
+        cases = self._expected
+        if len(cases) <= self.chunk_size:
+            self._run_cases(cases, *args, **kwargs)
+            return
+
+        returncode = 0
+        out = []
+        err = []
+        for i in range(0, len(cases), self.chunk_size):
+            self._run_cases(cases[i:i + self.chunk_size], *args, **kwargs)
+            returncode = returncode or self.result.returncode
+            out.append(self.result.out)
+            err.append(self.result.err)
+
+        self.result.returncode = returncode
+        self.result.out = '\n\n====CHUNK====\n\n'.join(out)
+        self.result.err = '\n\n====CHUNK====\n\n'.join(err)
+
+    def interpret_result(self):
+        current = None
+        for line in self.result.out.split('\n'):
+            match = self.__CASE.match(line)
+            if match:
+                current = self._subtest_name(match.group(1))
+                continue
+            if current is None:
+                continue
+            line = line.lstrip()
+            for k, v in six.iteritems(self._RESULT_MAP):
+                if line.startswith(k):
+                    self.result.subtests[current] = v
+                    current = None
+                    break
+
+        # Cases that neither reported a status nor were marked by a crash
+        # couldn't be parsed, fall back to 'fail' like DEQPBaseTest.
+        for name in list(self.result.subtests):
+            if self.result.subtests[name].name == 'notrun':
+                self.result.subtests[name] = 'fail'
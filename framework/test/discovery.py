@@ -0,0 +1,210 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""A persistent index of the shader_test and glsl_parser_test files.
+
+Building the all profile means walking the tests directories, and opening
+and parsing every shader_test and glsl_parser_test file to find out which
+binary runs it and what it requires. This module keeps the result of that
+parsing on disk, keyed by the path, mtime and size of each file, so that only
+new and changed files are parsed again. When there are many of them (the
+first time for example) they are parsed by a pool of processes.
+
+The index lives in the directory set by 'discovery cache' in the [core]
+section of piglit.conf, which defaults to $XDG_CACHE_HOME/piglit. Setting it
+to "none" disables the index.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import hashlib
+import json
+import multiprocessing
+import os
+
+from framework import core
+from . import glsl_parser_test, shader_test
+
+__all__ = [
+    'discover',
+]
+
+# Bump this when the data stored for a file changes
+_VERSION = 1
+
+_SHADER_EXTENSIONS = frozenset(['.shader_test'])
+_GLSL_EXTENSIONS = frozenset(['.vert', '.tesc', '.tese', '.geom', '.frag',
+                              '.comp'])
+
+# Below this number of files to parse it's faster to not start a pool
+_PARALLEL_THRESHOLD = 256
+
+
+def _index_path(basedirs):
+    """Return the path of the index for basedirs, or None if it's disabled.
+
+    Each set of directories gets its own index, so that different checkouts
+    and build directories don't evict each other.
+    """
+    dir_ = core.get_cache_path(
+        core.PIGLIT_CONFIG.safe_get('core', 'discovery cache'))
+    if dir_ is None:
+        return None
+
+    key = hashlib.sha1(
+        '\0'.join(os.path.abspath(b) for b in basedirs).encode('utf-8'))
+    return os.path.join(dir_, 'discovery-{}.json'.format(key.hexdigest()[:16]))
+
+
+def _build():
+    """Return the parts of the build that change how files are parsed.
+
+    The glsl_parser_test commands depend on which glslparsertest binaries
+    were built.
+    """
+    return [
+        _VERSION,
+        glsl_parser_test._HAS_GL_BIN,
+        glsl_parser_test._HAS_GLES_BIN,
+        bool(glsl_parser_test._FORCE_DESKTOP_VERSION),
+    ]
+
+
+def _load(path):
+    """Load an index, returning an empty one if it's missing or stale."""
+    try:
+        with open(path, 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if not isinstance(index, dict) or index.get('build') != _build():
+        return {}
+    return index.get('files', {})
+
+
+def _write(path, files):
+    """Atomically replace an index.
+
+    Failing to write the index is not an error, the files will just be parsed
+    again next time.
+    """
+    try:
+        core.check_dir(os.path.dirname(path))
+        tmp = '{}.{}'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'build': _build(), 'files': files}, f)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+def _parse(path):
+    """Parse a file, returning the json form of its parser.
+
+    glsl_parser_test files without a config block are legacy tests that
+    aren't run, None is returned for those.
+    """
+    if os.path.splitext(path)[1] in _SHADER_EXTENSIONS:
+        parser = shader_test.Parser(path)
+        parser.parse()
+        return parser.to_json()
+
+    try:
+        return glsl_parser_test.Parser(path).to_json()
+    except glsl_parser_test.GLSLParserNoConfigError:
+        return None
+
+
+def _parser(path, data):
+    """Create a parser from the data stored in the index."""
+    if os.path.splitext(path)[1] in _SHADER_EXTENSIONS:
+        return shader_test.Parser.from_dict(path, data)
+    elif data is not None:
+        return glsl_parser_test.Parser.from_dict(data)
+    return None
+
+
+def _walk(basedirs):
+    """Yield (basedir, dirpath, filename) for each file to parse."""
+    for basedir in basedirs:
+        for dirpath, _, filenames in os.walk(basedir):
+            for filename in filenames:
+                ext = os.path.splitext(filename)[1]
+                if ext in _SHADER_EXTENSIONS or ext in _GLSL_EXTENSIONS:
+                    yield basedir, dirpath, filename
+
+
+def discover(basedirs, jobs=None):
+    """Find the shader_test and glsl_parser_test files in basedirs.
+
+    Yields a tuple of (basedir, dirpath, filename, parser) for each file, in
+    the order os.walk finds them. parser is a shader_test.Parser or a
+    glsl_parser_test.Parser that has already been parsed, or None for
+    glsl_parser_test files without a config block.
+
+    Arguments:
+    basedirs -- a list of directories to search
+
+    Keyword Arguments:
+    jobs -- the number of processes to parse changed files with. Default: the
+            number of CPUs.
+    """
+    path = _index_path(basedirs)
+    index = _load(path) if path is not None else {}
+
+    found = list(_walk(basedirs))
+    files = {}
+    stale = []
+    for _, dirpath, filename in found:
+        fpath = os.path.join(dirpath, filename)
+        st = os.stat(fpath)
+        stamp = [st.st_mtime, st.st_size]
+
+        entry = index.get(fpath)
+        if entry is not None and entry[0] == stamp:
+            files[fpath] = entry
+        else:
+            stale.append((fpath, stamp))
+
+    if stale:
+        paths = [p for p, _ in stale]
+        jobs = jobs or multiprocessing.cpu_count()
+        if jobs > 1 and len(stale) >= _PARALLEL_THRESHOLD:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                parsed = pool.map(_parse, paths, chunksize=64)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            parsed = [_parse(p) for p in paths]
+
+        for (fpath, stamp), data in zip(stale, parsed):
+            files[fpath] = [stamp, data]
+
+    # Write the index if files were parsed, or if files were removed
+    if path is not None and (stale or len(files) != len(index)):
+        _write(path, files)
+
+    for basedir, dirpath, filename in found:
+        fpath = os.path.join(dirpath, filename)
+        yield basedir, dirpath, filename, _parser(fpath, files[fpath][1])
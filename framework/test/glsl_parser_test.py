@@ -88,6 +88,11 @@ class Parser(object):
     """
     _CONFIG_KEYS = frozenset(['expect_result', 'glsl_version',
                               'require_extensions', 'check_link'])
+    _IS_HEADER = re.compile(r'(//|/\*|\*)\s*\[config\]')
+    _IS_FOOTER = re.compile(r'(//|/\*|\*)\s*\[end config\]')
+    _IS_METADATA = re.compile(
+        r'(//|/\*|\*)\s*(?P<key>[a-z_]*)\:\s(?P<value>.*)')
+    _BAD_VALUES = re.compile(r'(?![\w\.\! ]).*')
 
     def __init__(self, filepath):
         # a set that stores a list of keys that have been found already
@@ -97,8 +102,8 @@ class Parser(object):
         self.glsl_version = None
 
         try:
+            # Only the lines up to the end of the config block are read
             with io.open(filepath, mode='r', encoding='utf-8') as testfile:
-                testfile = testfile.read()
                 self.config = self.parse(testfile, filepath)
             self.command = self.get_command(filepath)
         except GLSLParserInternalError as e:
@@ -134,6 +139,29 @@ class Parser(object):
             self.gl_required.add(ext)
             self.command.append(ext)
 
+    def to_json(self):
+        """Return the parsed test in a form json can store."""
+        return {
+            'config': self.config,
+            'command': self.command,
+            'gl_required': sorted(self.gl_required),
+            'glsl_version': self.glsl_version,
+            'glsl_es_version': self.glsl_es_version,
+        }
+
+    @classmethod
+    def from_dict(cls, dict_):
+        """Create a Parser from the output of to_json without reading the
+        file again.
+        """
+        inst = cls.__new__(cls)
+        inst.config = dict_['config']
+        inst.command = dict_['command']
+        inst.gl_required = set(dict_['gl_required'])
+        inst.glsl_version = dict_['glsl_version']
+        inst.glsl_es_version = dict_['glsl_es_version']
+        return inst
+
     @staticmethod
     def pick_binary(version):
         """Pick the correct version of glslparsertest to use.
@@ -189,8 +217,10 @@ class Parser(object):
     def parse(self, testfile, filepath):
         """ Private helper that parses the config file
 
-        This method parses the lines of text file, and then returns a
-        StrinIO instance suitable to be parsed by a configparser class.
+        This method parses the lines of text file (which may be a string or
+        an iterable of lines, like a file), and then returns a dictionary of
+        the config keys and their values. Nothing after the end of the config
+        block is read.
 
         It will raise GLSLParserInternalError if any part of the parsing
         fails.
@@ -203,19 +233,20 @@ class Parser(object):
         # This allows us to run the loop until we find the header, stop and
         # then run again looking for the config sections.
         # This reduces the need for if statements substantially
-        lines = (l.strip() for l in testfile.split('\n'))
+        if isinstance(testfile, six.string_types):
+            testfile = testfile.split('\n')
+        lines = (l.strip() for l in testfile)
 
-        is_header = re.compile(r'(//|/\*|\*)\s*\[config\]')
+        is_header = self._IS_HEADER.match
         for line in lines:
-            if is_header.match(line):
+            if is_header(line):
                 break
         else:
             raise GLSLParserNoConfigError("No [config] section found!")
 
-        is_header = re.compile(r'(//|/\*|\*)\s*\[end config\]')
-        is_metadata = re.compile(
-            r'(//|/\*|\*)\s*(?P<key>[a-z_]*)\:\s(?P<value>.*)')
-        bad_values = re.compile(r'(?![\w\.\! ]).*')
+        is_footer = self._IS_FOOTER.match
+        is_metadata = self._IS_METADATA.match
+        bad_values = self._BAD_VALUES.search
 
         for line in lines:
             # If strip renendered '' that means we had a blank newline,
@@ -223,10 +254,10 @@ class Parser(object):
             if line in ['', '//', '*']:
                 continue
             # If we get to the end of the config break
-            elif is_header.match(line):
+            elif is_footer(line):
                 break
 
-            match = is_metadata.match(line)
+            match = is_metadata(line)
             if match:
                 if match.group('key') not in self._CONFIG_KEYS:
                     raise GLSLParserInternalError(
@@ -240,7 +271,7 @@ class Parser(object):
                         'Duplicate entry for key {}'.format(
                             match.group('key')))
                 else:
-                    bad = bad_values.search(match.group('value'))
+                    bad = bad_values(match.group('value'))
                     # XXX: this always seems to return a match object, even
                     # when the match is ''
                     if bad.group():
@@ -270,10 +301,14 @@ class GLSLParserTest(FastSkipMixin, PiglitBaseTest):
     Arguments:
     filepath -- the path to a glsl_parser_test which must end in .vert,
                 .tesc, .tese, .geom or .frag
+
+    Keyword Arguments:
+    parser -- an already parsed Parser for filepath, from the discovery index
+              for example. If this is None the file will be parsed.
     """
 
-    def __init__(self, filepath):
-        parsed = Parser(filepath)
+    def __init__(self, filepath, parser=None):
+        parsed = parser or Parser(filepath)
         super(GLSLParserTest, self).__init__(
             parsed.command,
             run_concurrent=True,
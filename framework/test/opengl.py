@@ -23,7 +23,12 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import collections
 import errno
+import functools
+import glob
+import hashlib
+import json
 import os
 import subprocess
 import warnings
@@ -39,6 +44,7 @@ from .base import TestIsSkip
 __all__ = [
     'FastSkip',
     'FastSkipMixin',
+    'find_skips',
 ]
 
 # An environment variable that when set to true disables the FastSkipMixin by
@@ -46,6 +52,144 @@ __all__ = [
 _DISABLED = bool(os.environ.get('PIGLIT_NO_FAST_SKIP', False))
 
 
+# Environment variables that can change which driver wflinfo ends up talking
+# to, or what that driver reports.
+_ENV_PREFIXES = ('MESA_', 'LIBGL_', 'GALLIUM_', 'LD_', '__GLX_', '__EGL_',
+                 'EGL_', 'DISPLAY', 'WAYLAND_DISPLAY')
+
+# The libraries (relative to the library directories) whose modification
+# times are part of the cache key, a driver upgrade will touch at least one.
+_LIBRARIES = ('libGL.so*', 'libGLX*.so*', 'libEGL*.so*', 'libGLES*.so*',
+              'libOpenGL.so*', 'libgbm.so*', 'libwaffle*.so*',
+              'libgallium*.so*', 'dri/*.so')
+_LIBRARY_DIRS = ('/usr/lib*', '/usr/lib/*-linux-gnu', '/usr/local/lib*',
+                 '/usr/local/lib/*-linux-gnu')
+
+# The number of different driver configurations to keep in the cache
+_CACHE_ENTRIES = 8
+
+
+def _cache_path():
+    """Return the path of the wflinfo cache, or None if it's disabled."""
+    return core.get_cache_path(
+        core.PIGLIT_CONFIG.safe_get('core', 'wflinfo cache'), 'wflinfo.json')
+
+
+def _which(name):
+    """Return the full path of an executable in PATH, or None."""
+    for dir_ in os.environ.get('PATH', '').split(os.pathsep):
+        path = os.path.join(dir_, name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def _mtime(path):
+    """Return the mtime of a file, or None if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _cache_key():
+    """Calculate the identity of the current platform and driver.
+
+    This is built only from things that can be found without starting a GL
+    context: the platform, the kernel drm drivers, the environment, and the
+    modification times of wflinfo and the GL libraries and drivers.
+    """
+    dirs = [d for e in ('LD_LIBRARY_PATH', 'LIBGL_DRIVERS_PATH')
+            for d in os.environ.get(e, '').split(os.pathsep) if d]
+    for pattern in _LIBRARY_DIRS:
+        dirs.extend(sorted(glob.glob(pattern)))
+
+    libraries = []
+    for dir_ in dirs:
+        for pattern in _LIBRARIES:
+            for lib in sorted(glob.glob(os.path.join(dir_, pattern))):
+                libraries.append((lib, _mtime(lib)))
+
+    drivers = []
+    for card in sorted(glob.glob('/sys/class/drm/card*/device/driver')):
+        try:
+            drivers.append(os.path.basename(os.readlink(card)))
+        except OSError:
+            pass
+
+    wflinfo = _which('wflinfo')
+    key = {
+        'platform': OPTIONS.env['PIGLIT_PLATFORM'],
+        'drivers': drivers,
+        'env': sorted((k, v) for k, v in six.iteritems(os.environ)
+                      if k.startswith(_ENV_PREFIXES)),
+        'wflinfo': [wflinfo, _mtime(wflinfo) if wflinfo else None],
+        'libraries': libraries,
+    }
+    return hashlib.sha1(
+        json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _load_cache(path):
+    """Load the wflinfo cache, an empty one if it doesn't exist or is bad."""
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f, object_pairs_hook=collections.OrderedDict)
+    except (IOError, OSError, ValueError):
+        return collections.OrderedDict()
+    if not isinstance(cache, dict):
+        return collections.OrderedDict()
+    return cache
+
+
+def _write_cache(path, cache):
+    """Atomically replace the wflinfo cache.
+
+    Failing to write the cache is not an error, the values will just be
+    calculated again next time.
+    """
+    while len(cache) > _CACHE_ENTRIES:
+        cache.popitem(last=False)
+    try:
+        core.check_dir(os.path.dirname(path))
+        tmp = '{}.{}'.format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        pass
+
+
+def _cached(convert=None):
+    """Decorator for WflInfo properties that are stored in the cache.
+
+    Arguments:
+    convert -- a callable to turn the cached json value back into the type
+               the property returns.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self):
+            name = func.__name__
+            try:
+                value = self._cache_entry[name]
+            except KeyError:
+                pass
+            else:
+                return convert(value) if convert else value
+
+            value = func(self)
+            # An empty or missing answer is what the property returns when
+            # wflinfo fails, which may only be for this run (the display isn't
+            # up yet, for example), so it's asked again next time.
+            if value:
+                self._cache_store(
+                    name, sorted(value) if isinstance(value, set) else value)
+            return value
+        return wrapper
+    return decorator
+
+
 class StopWflinfo(exceptions.PiglitException):
     """Exception called when wlfinfo getter should stop."""
     def __init__(self, reason):
@@ -67,6 +211,10 @@ class WflInfo(object):
 
     This solves all of that, and is
 
+    The answers are also kept in an on disk cache, keyed by the platform and
+    the identity of the driver (see _cache_key), so that a run doesn't need to
+    call wflinfo at all if nothing has changed since the last one.
+
     """
     __shared_state = {}
     def __new__(cls, *args, **kwargs):
@@ -116,6 +264,47 @@ class WflInfo(object):
         raise Exception('Unreachable')
 
     @core.lazy_property
+    def _cache_key(self):
+        return _cache_key()
+
+    @core.lazy_property
+    def _cache_entry(self):
+        path = _cache_path()
+        if path is None:
+            return {}
+        return _load_cache(path).get(self._cache_key, {})
+
+    def _cache_store(self, name, value):
+        """Add a value to the cache entry for the current driver."""
+        self._cache_entry[name] = value
+
+        path = _cache_path()
+        if path is not None:
+            cache = _load_cache(path)
+            entry = cache.pop(self._cache_key, {})
+            entry[name] = value
+            cache[self._cache_key] = entry
+            _write_cache(path, cache)
+
+    def refresh(self):
+        """Discard the cached values for the current driver.
+
+        They will be calculated by calling wflinfo again the next time they
+        are needed.
+        """
+        for name in ['_cache_key', '_cache_entry', 'gl_extensions',
+                     'gl_version', 'gles_version', 'glsl_version',
+                     'glsl_es_version']:
+            self.__dict__.pop(name, None)
+
+        path = _cache_path()
+        if path is not None:
+            cache = _load_cache(path)
+            if cache.pop(self._cache_key, None) is not None:
+                _write_cache(path, cache)
+
+    @core.lazy_property
+    @_cached(set)
     def gl_extensions(self):
         """Call wflinfo to get opengl extensions.
 
@@ -164,6 +353,7 @@ class WflInfo(object):
         return ret
 
     @core.lazy_property
+    @_cached()
     def gl_version(self):
         """Calculate the maximum opengl version.
 
@@ -196,6 +386,7 @@ class WflInfo(object):
         return ret
 
     @core.lazy_property
+    @_cached()
     def gles_version(self):
         """Calculate the maximum opengl es version.
 
@@ -235,6 +426,7 @@ class WflInfo(object):
         return ret
 
     @core.lazy_property
+    @_cached()
     def glsl_version(self):
         """Calculate the maximum OpenGL Shader Language version."""
         ret = None
@@ -261,6 +453,7 @@ class WflInfo(object):
         return ret
 
     @core.lazy_property
+    @_cached()
     def glsl_es_version(self):
         """Calculate the maximum OpenGL ES Shader Language version."""
         ret = None
@@ -288,6 +481,46 @@ class WflInfo(object):
         return ret
 
 
+# Every extension name that has been seen is given a bit, so that a set of
+# extensions can be represented (and compared) as a single int.
+_EXTENSION_BITS = {}
+_EXTENSION_NAMES = []
+
+# The last set of available extensions and its mask
+_AVAILABLE = [None, 0]
+
+
+def _mask(extensions):
+    """Return the bitset for an iterable of extension names."""
+    mask = 0
+    for ext in extensions:
+        try:
+            mask |= _EXTENSION_BITS[ext]
+        except KeyError:
+            bit = 1 << len(_EXTENSION_NAMES)
+            _EXTENSION_BITS[ext] = bit
+            _EXTENSION_NAMES.append(ext)
+            mask |= bit
+    return mask
+
+
+def _available(extensions):
+    """Return the bitset of the extensions the driver provides.
+
+    Every extension of the driver is given a bit before any test asks for one
+    it doesn't provide, so any extension interned after this can't be in the
+    returned mask, and the mask doesn't need to be recalculated.
+    """
+    if _AVAILABLE[0] is not extensions:
+        _AVAILABLE[:] = [extensions, _mask(extensions)]
+    return _AVAILABLE[1]
+
+
+def _first(mask):
+    """Return the name of the extension of the lowest bit in a mask."""
+    return _EXTENSION_NAMES[(mask & -mask).bit_length() - 1]
+
+
 class FastSkip(object):
     """A class for testing OpenGL requirements.
 
@@ -335,12 +568,13 @@ class FastSkip(object):
         Raises:
         TestIsSkip   -- if any of the conditions passed to self are false
         """
-        if self.info.gl_extensions:
-            for extension in self.gl_required:
-                if extension not in self.info.gl_extensions:
-                    raise TestIsSkip(
-                        'Test requires extension {} '
-                        'which is not available'.format(extension))
+        if self.info.gl_extensions and self.gl_required:
+            missing = (_mask(self.gl_required) &
+                       ~_available(self.info.gl_extensions))
+            if missing:
+                raise TestIsSkip(
+                    'Test requires extension {} '
+                    'which is not available'.format(_first(missing)))
 
         # TODO: Be able to handle any operator
         if (self.info.gl_version is not None
@@ -452,6 +686,11 @@ class FastSkipMixin(object):
     def glsl_es_version(self, new):
         self.__skiper.glsl_es_version = new
 
+    @property
+    def fast_skip(self):
+        """The FastSkip instance holding the requirements of this test."""
+        return self.__skiper
+
     def is_skip(self):
         """Skip this test if any of it's feature requirements are unmet.
 
@@ -463,6 +702,48 @@ class FastSkipMixin(object):
         super(FastSkipMixin, self).is_skip()
 
 
+def find_skips(test_list):
+    """Find the tests that FastSkip would skip, without running them.
+
+    Tests are grouped by their requirements (with the extensions as a bitset),
+    and each distinct set of requirements is tested once, so this is cheap
+    even for the tens of thousands of tests in the all profile.
+
+    Arguments:
+    test_list -- an iterable of (name, Test) tuples
+
+    Returns an OrderedDict mapping the names of the tests that should be
+    skipped to the reason they're skipped.
+    """
+    skips = collections.OrderedDict()
+    if _DISABLED:
+        return skips
+
+    reasons = {}
+    for name, test in test_list:
+        if not isinstance(test, FastSkipMixin):
+            continue
+        skipper = test.fast_skip
+        key = (_mask(skipper.gl_required), skipper.gl_version,
+               skipper.gles_version, skipper.glsl_version,
+               skipper.glsl_es_version)
+
+        try:
+            reason = reasons[key]
+        except KeyError:
+            try:
+                skipper.test()
+            except TestIsSkip as e:
+                reason = e.reason
+            else:
+                reason = None
+            reasons[key] = reason
+
+        if reason is not None:
+            skips[name] = reason
+    return skips
+
+
 class FastSkipDisabled(object):
     """A no-op version of FastSkip."""
 
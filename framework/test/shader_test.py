@@ -26,13 +26,21 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import copy
+import errno
 import io
 import os
 import re
 
+import six
+
 from framework import exceptions
 from framework import status
-from .base import ReducedProcessMixin, TestIsSkip
+from framework.options import OPTIONS
+from framework.results import TestResult
+from . import worker
+from .base import (ReducedProcessMixin, TestIsSkip, TestRunError,
+                   _SUPPRESS_TIMEOUT)
 from .opengl import FastSkipMixin, FastSkip
 from .piglit_test import PiglitBaseTest
 
@@ -63,14 +71,13 @@ class Parser(object):
 
     def parse(self):
         # Iterate over the lines in shader file looking for the config section.
-        # By using a generator this can be split into two for loops at minimal
-        # cost. The first one looks for the start of the config block or raises
-        # an exception. The second looks for the GL version or raises an
-        # exception
+        # By using an iterator over the file this can be split into two for
+        # loops, and only the lines up to the end of the config block are ever
+        # read. The first one looks for the start of the config block or
+        # raises an exception. The second looks for the GL version or raises
+        # an exception
         with io.open(self.filename, mode='r', encoding='utf-8') as shader_file:
-            # The mock in python 3.3 doesn't support readlines(), so use
-            # read().split() as a workaround
-            lines = (l for l in shader_file.read().split('\n'))
+            lines = iter(shader_file)
 
             # Find the config section
             for line in lines:
@@ -84,35 +91,35 @@ class Parser(object):
                 raise exceptions.PiglitFatalError(
                     "In file {}: Config block not found".format(self.filename))
 
-        for line in lines:
-            if line.startswith('GL_') and not line.startswith('GL_MAX'):
-                self.gl_required.add(line.strip())
-                continue
-
-            # Find any GLES requirements.
-            if not (self._gl_version or self._gles_version):
-                m = self._match_gl_version.match(line)
-                if m:
-                    self.__op = m.group('op')
-                    if m.group('es'):
-                        self._gles_version = float(m.group('ver'))
-                    else:
-                        self._gl_version = float(m.group('ver'))
-                    continue
-
-            if not (self._glsl_version or self._glsl_es_version):
-                # Find any GLSL requirements
-                m = self._match_glsl_version.match(line)
-                if m:
-                    self.__sl_op = m.group('op')
-                    if m.group('es'):
-                        self._glsl_es_version = float(m.group('ver'))
-                    else:
-                        self._glsl_version = float(m.group('ver'))
+            for line in lines:
+                if line.startswith('GL_') and not line.startswith('GL_MAX'):
+                    self.gl_required.add(line.strip())
                     continue
 
-            if line.startswith('['):
-                break
+                # Find any GLES requirements.
+                if not (self._gl_version or self._gles_version):
+                    m = self._match_gl_version.match(line)
+                    if m:
+                        self.__op = m.group('op')
+                        if m.group('es'):
+                            self._gles_version = float(m.group('ver'))
+                        else:
+                            self._gl_version = float(m.group('ver'))
+                        continue
+
+                if not (self._glsl_version or self._glsl_es_version):
+                    # Find any GLSL requirements
+                    m = self._match_glsl_version.match(line)
+                    if m:
+                        self.__sl_op = m.group('op')
+                        if m.group('es'):
+                            self._glsl_es_version = float(m.group('ver'))
+                        else:
+                            self._glsl_version = float(m.group('ver'))
+                        continue
+
+                if line.startswith('['):
+                    break
 
         # Select the correct binary to run the test, but be as conservative as
         # possible by always selecting the lowest version that meets the
@@ -126,6 +133,33 @@ class Parser(object):
         else:
             self.prog = 'shader_runner'
 
+    def to_json(self):
+        """Return the parsed requirements in a form json can store."""
+        return {
+            'gl_required': sorted(self.gl_required),
+            'gl_version': self._gl_version,
+            'gles_version': self._gles_version,
+            'glsl_version': self._glsl_version,
+            'glsl_es_version': self._glsl_es_version,
+            'op': self.__op,
+            'sl_op': self.__sl_op,
+            'prog': self.prog,
+        }
+
+    @classmethod
+    def from_dict(cls, filename, dict_):
+        """Create an already parsed Parser from the output of to_json."""
+        inst = cls(filename)
+        inst.gl_required = set(dict_['gl_required'])
+        inst._gl_version = dict_['gl_version']
+        inst._gles_version = dict_['gles_version']
+        inst._glsl_version = dict_['glsl_version']
+        inst._glsl_es_version = dict_['glsl_es_version']
+        inst.__op = dict_['op']
+        inst.__sl_op = dict_['sl_op']
+        inst.prog = dict_['prog']
+        return inst
+
     # FIXME: All of these properties are a work-around for the fact that the
     # FastSkipMixin assumes that operations are always > or >=
 
@@ -152,11 +186,19 @@ class ShaderTest(FastSkipMixin, PiglitBaseTest):
     This function parses a shader test to determine if it's a GL, GLES2 or
     GLES3 test, and then returns a PiglitTest setup properly.
 
+    Arguments:
+    filename -- the path to the shader_test file
+
+    Keyword Arguments:
+    parser -- an already parsed Parser for filename, from the discovery index
+              for example. If this is None the file will be parsed.
+
     """
 
-    def __init__(self, filename):
-        parser = Parser(filename)
-        parser.parse()
+    def __init__(self, filename, parser=None):
+        if parser is None:
+            parser = Parser(filename)
+            parser.parse()
 
         super(ShaderTest, self).__init__(
             [parser.prog, parser.filename],
@@ -184,23 +226,35 @@ class MultiShaderTest(ReducedProcessMixin, PiglitBaseTest):
     interpret the results, as well as handle pre-mature exit through crashes or
     from breaking import assupmtions in the utils about skipping.
 
+    When persistent workers are enabled (see framework.test.worker) the files
+    are instead handed one at a time to a shader_runner process that is kept
+    alive between tests, and a new one is started when a test kills it.
+
     Arguments:
     filenames -- a list of absolute paths to shader test files
+
+    Keyword Arguments:
+    parsers -- a list of already parsed Parsers, one for each of filenames. If
+               this is None the files will be parsed.
     """
 
-    def __init__(self, filenames):
+    def __init__(self, filenames, parsers=None):
         assert filenames
         prog = None
         files = []
         subtests = []
         skips = []
 
+        if parsers is None:
+            parsers = [Parser(f) for f in filenames]
+            for parser in parsers:
+                parser.parse()
+        assert len(parsers) == len(filenames)
+
         # Walk each subtest, and either add it to the list of tests to run, or
         # determine it is skip, and set the result of that test in the subtests
         # dictionary to skip without adding it ot the liest of tests to run
-        for each in filenames:
-            parser = Parser(each)
-            parser.parse()
+        for each, parser in zip(filenames, parsers):
             subtest = os.path.basename(os.path.splitext(each)[0]).lower()
 
             if prog is not None:
@@ -251,9 +305,109 @@ class MultiShaderTest(ReducedProcessMixin, PiglitBaseTest):
         """Add -auto to the test command."""
         return self._command + ['-auto', '-report-subtests']
 
+    @property
+    def expected(self):
+        """The names of the subtests that will be run, in order."""
+        return list(self._expected)
+
+    @property
+    def batch_key(self):
+        """Tests with the same batch_key can be run in the same process."""
+        return (self._command[0], self.run_concurrent, self.timeout,
+                self.cwd, tuple(sorted(six.iteritems(self.env))))
+
+    @classmethod
+    def from_parts(cls, parts):
+        """Create a test that runs some of the subtests of other tests.
+
+        The tests must all have the same batch_key, and there can't be two
+        subtests with the same name, since they couldn't be told apart in the
+        result.
+
+        Arguments:
+        parts -- a list of (MultiShaderTest, subtests) tuples, where subtests
+                 is a list of the names of the subtests of that test to run.
+        """
+        inst = copy.copy(parts[0][0])
+        files = []
+        expected = []
+        for test, subtests in parts:
+            assert test.batch_key == inst.batch_key
+            lookup = dict(zip(test._expected, test._command[1:]))
+            files.extend(lookup[s] for s in subtests)
+            expected.extend(subtests)
+        assert len(set(expected)) == len(expected), 'duplicate subtests'
+
+        inst._command = [inst._command[0]] + files
+        inst._expected = expected
+        inst.result = TestResult()
+        inst._populate_subtests()
+        return inst
+
     def _is_subtest(self, line):
         return line.startswith('PIGLIT TEST:')
 
+    def _run_command(self, *args, **kwargs):
+        if OPTIONS.valgrind or not worker.enabled():
+            super(MultiShaderTest, self)._run_command(*args, **kwargs)
+            return
+
+        # The same arguments as self.command, with the files given on stdin
+        # rather than on the command line.
+        command = ([self._command[0]] + self.command[len(self._command):] +
+                   ['-stdin'])
+        env = self._full_env()
+        timeout = None if _SUPPRESS_TIMEOUT else self.timeout
+        out = []
+        err = []
+        returncode = 0
+        current = None
+
+        def is_done(line):
+            return line.startswith('PIGLIT: {"subtest"')
+
+        try:
+            for filename, subtest in zip(self._command[1:], self._expected):
+                if current is None:
+                    try:
+                        current = worker.POOL.get(command, env=env,
+                                                  cwd=self.cwd)
+                    except OSError as e:
+                        if e.errno == errno.ENOENT:
+                            raise TestRunError("Test executable not found.\n",
+                                               'skip')
+                        raise
+                    self.result.pid.append(current.pid)
+
+                try:
+                    stdout, stderr, code = current.run(filename, is_done,
+                                                       timeout)
+                except worker.WorkerTimeout as e:
+                    out.append(e.out)
+                    err.append(e.err)
+                    self.result.subtests[subtest] = status.TIMEOUT
+                    current = None
+                    continue
+
+                out.append(stdout)
+                err.append(stderr)
+                if code is not None:
+                    # The worker exited before reporting a result, this is
+                    # the same case as a resume for the ReducedProcessMixin.
+                    self.result.out = stdout
+                    self.result.returncode = code
+                    self.result.subtests[subtest] = self._stop_status()
+                    returncode = returncode or code
+                    worker.POOL.put(current)
+                    current = None
+        finally:
+            if current is not None:
+                worker.POOL.put(current)
+
+        self.result.returncode = returncode
+        self.result.out = ''.join(out)
+        self.result.err = ''.join(err)
+
     def _resume(self, current):
         command = [self.command[0]]
         command.extend(self.command[current + 1:])
@@ -0,0 +1,310 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Long lived test processes that are handed one test at a time.
+
+Some test binaries can stay alive after a test, and read the next test to run
+from stdin (shader_runner -stdin for example). Starting the process and
+creating a GL context is a large part of the run time of a short test, so a
+Worker keeps such a process alive between tests, and the WorkerPool shares the
+idle workers between the tests of a run.
+
+A worker is handed a test by writing a line to its stdin, and the test is
+finished when the worker prints a line the caller recognizes. If the worker
+exits before that (it crashed, or reported a result and exited) it is dead,
+and the pool starts a new one the next time one is needed. Closing the stdin
+of a worker tells it to exit, which also happens if piglit itself dies.
+
+This relies on select() working with pipes, so workers are not available on
+windows.
+"""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import atexit
+import collections
+import errno
+import os
+import select
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+import six
+
+from framework import core
+from .base import subprocess, _EXTRA_POPEN_ARGS
+
+__all__ = [
+    'AVAILABLE',
+    'POOL',
+    'Worker',
+    'WorkerPool',
+    'WorkerTimeout',
+    'enabled',
+]
+
+AVAILABLE = not sys.platform.startswith('win32')
+
+
+def enabled():
+    """Return True if the user asked for persistent workers, and they work.
+
+    This is set by 'persistent workers' in the [core] section of piglit.conf.
+    """
+    return AVAILABLE and core.PIGLIT_CONFIG.safe_get(
+        'core', 'persistent workers', 'false').lower() in \
+        ['1', 'true', 'yes', 'on']
+
+
+class WorkerTimeout(Exception):
+    """Raised when a worker doesn't finish a test in time.
+
+    The worker has been killed when this is raised, and out and err are what
+    it printed for the test before that.
+    """
+    def __init__(self, out, err):
+        super(WorkerTimeout, self).__init__()
+        self.out = out
+        self.err = err
+
+
+class Worker(object):
+    """A test process that is handed tests over stdin.
+
+    stdout is read as tests are run, while stderr goes to a temporary file
+    that is read after each test. That way a worker that writes a lot to
+    stderr can't block on a pipe that nobody is reading.
+
+    Arguments:
+    command -- the command to start the worker
+
+    Keyword Arguments:
+    env -- the environment of the worker. Default: the environment of this
+           process.
+    cwd -- the working directory of the worker.
+    """
+
+    def __init__(self, command, env=None, cwd=None):
+        self.key = _key(command, env, cwd)
+        self.tests = 0
+        self._buffer = b''
+
+        # The worker appends to the file through its own descriptor, so
+        # reading it here doesn't move the position the worker writes at.
+        fd, path = tempfile.mkstemp(prefix='piglit-worker-')
+        try:
+            with open(path, 'ab') as err:
+                self._proc = subprocess.Popen(command,
+                                              stdin=subprocess.PIPE,
+                                              stdout=subprocess.PIPE,
+                                              stderr=err,
+                                              cwd=cwd,
+                                              env=env,
+                                              **_EXTRA_POPEN_ARGS)
+        except Exception:
+            os.close(fd)
+            raise
+        finally:
+            os.unlink(path)
+        self._err = os.fdopen(fd, 'rb')
+
+    @property
+    def pid(self):
+        return self._proc.pid
+
+    @property
+    def alive(self):
+        return self._proc.poll() is None
+
+    def run(self, line, is_done, timeout=None):
+        """Hand a test to the worker and wait for it to finish.
+
+        Returns a tuple of the stdout and stderr of the test, and the
+        returncode of the worker if it exited, or None if it is still alive.
+        Raises WorkerTimeout if the test isn't done after timeout seconds.
+
+        Arguments:
+        line -- the line that is written to the worker's stdin.
+        is_done -- a callable that is passed each line of stdout, and returns
+                   True for the line that ends the test.
+
+        Keyword Arguments:
+        timeout -- the number of seconds to wait for the test. Default: wait
+                   forever.
+        """
+        self.tests += 1
+        try:
+            self._proc.stdin.write(line.encode('utf-8') + b'\n')
+            self._proc.stdin.flush()
+        except (IOError, OSError) as e:
+            # The worker is already gone, which is handled below when its
+            # stdout is closed.
+            if e.errno != errno.EPIPE:
+                raise
+
+        fd = self._proc.stdout.fileno()
+        deadline = time.time() + timeout if timeout else None
+        out = []
+        while True:
+            while b'\n' in self._buffer:
+                each, self._buffer = self._buffer.split(b'\n', 1)
+                out.append(each + b'\n')
+                if is_done(each.decode('utf-8', 'replace')):
+                    return _decode(out), self._read_err(), None
+
+            wait = None
+            if deadline is not None:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    err = self._read_err()
+                    self.kill()
+                    raise WorkerTimeout(_decode(out), err)
+            try:
+                ready, _, _ = select.select([fd], [], [], wait)
+            except (IOError, OSError, select.error) as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
+            if not ready:
+                continue
+
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                out.append(self._buffer)
+                self._buffer = b''
+                returncode = self._proc.wait()
+                return _decode(out), self._read_err(), returncode
+            self._buffer += chunk
+
+    def _read_err(self):
+        err = self._err.read()
+        if err:
+            # The worker writes in append mode, so once the file is emptied
+            # it writes from the start again, and the file doesn't grow for
+            # the life of the worker.
+            os.ftruncate(self._err.fileno(), 0)
+            self._err.seek(0)
+        return err.decode('utf-8', 'replace')
+
+    def kill(self):
+        """Kill the worker, and anything it started."""
+        if self._proc.poll() is None:
+            if _EXTRA_POPEN_ARGS.get('start_new_session'):
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            else:
+                self._proc.kill()
+        self._proc.wait()
+        self._close_files()
+
+    def close(self):
+        """Ask the worker to exit, and kill it if it doesn't."""
+        try:
+            self._proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        for _ in range(20):
+            if self._proc.poll() is not None:
+                break
+            time.sleep(0.05)
+        self.kill()
+
+    def _close_files(self):
+        for f in [self._proc.stdin, self._proc.stdout, self._err]:
+            try:
+                f.close()
+            except (IOError, OSError):
+                pass
+
+
+class WorkerPool(object):
+    """The idle workers of a run.
+
+    Workers are only interchangeable if they were started with the same
+    command, environment and working directory, so the idle workers are kept
+    by those. A test takes a worker with get() for as long as it runs, and
+    gives it back with put(), so there are never more workers of a kind than
+    tests running at the same time.
+
+    A worker that has run max_tests tests isn't given back to the pool, so
+    that whatever a worker leaks over time can't pile up until it crashes on
+    some unrelated test.
+
+    Keyword Arguments:
+    max_tests -- the number of tests a worker runs before it is replaced.
+                 Default: 1000, None for no limit.
+    """
+
+    def __init__(self, max_tests=1000):
+        self.max_tests = max_tests
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, command, env=None, cwd=None):
+        """Return an idle worker, starting a new one if there isn't one."""
+        key = _key(command, env, cwd)
+        dead = []
+        worker = None
+        with self._lock:
+            idle = self._idle[key]
+            while idle:
+                candidate = idle.pop()
+                if candidate.alive:
+                    worker = candidate
+                    break
+                dead.append(candidate)
+        for each in dead:
+            each.kill()
+        return worker or Worker(command, env=env, cwd=cwd)
+
+    def put(self, worker):
+        """Give a worker back to the pool, or clean it up if it's done."""
+        if not worker.alive:
+            worker.kill()
+        elif self.max_tests is not None and worker.tests >= self.max_tests:
+            worker.close()
+        else:
+            with self._lock:
+                self._idle[worker.key].append(worker)
+
+    def close(self):
+        """Stop all of the idle workers."""
+        with self._lock:
+            workers = [w for l in six.itervalues(self._idle) for w in l]
+            self._idle.clear()
+        for worker in workers:
+            worker.close()
+
+
+def _key(command, env, cwd):
+    return (tuple(command),
+            frozenset(six.iteritems(env)) if env is not None else None,
+            cwd)
+
+
+def _decode(lines):
+    return b''.join(lines).decode('utf-8', 'replace')
+
+
+POOL = WorkerPool()
+atexit.register(POOL.close)
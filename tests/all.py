@@ -5,6 +5,7 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import collections
+import functools
 import itertools
 import os
 import platform
@@ -17,7 +18,8 @@ from framework import options
 from framework.profile import TestProfile
 from framework.driver_classifier import DriverClassifier
 from framework.test import (PiglitGLTest, GleanTest, PiglitBaseTest,
-                            GLSLParserTest, GLSLParserNoConfigError)
+                            GLSLParserTest)
+from framework.test import discovery
 from framework.test.shader_test import ShaderTest, MultiShaderTest
 from .py_modules.constants import TESTS_DIR, GENERATED_TESTS_DIR
 
@@ -210,36 +212,37 @@ profile = TestProfile()  # pylint: disable=invalid-name
 
 shader_tests = collections.defaultdict(list)
 
-# Find and add all shader tests.
-for basedir in [TESTS_DIR, GENERATED_TESTS_DIR]:
-    for dirpath, _, filenames in os.walk(basedir):
-        for filename in filenames:
-            testname, ext = os.path.splitext(filename)
-            groupname = grouptools.from_path(os.path.relpath(dirpath, basedir))
-            if ext == '.shader_test':
-                if PROCESS_ISOLATION:
-                    test = ShaderTest(os.path.join(dirpath, filename))
-                else:
-                    shader_tests[groupname].append(os.path.join(dirpath, filename))
-                    continue
-            elif ext in ['.vert', '.tesc', '.tese', '.geom', '.frag', '.comp']:
-                try:
-                    test = GLSLParserTest(os.path.join(dirpath, filename))
-                except GLSLParserNoConfigError:
-                    # In the event that there is no config assume that it is a
-                    # legacy test, and continue
-                    continue
-
-                # For glslparser tests you can have multiple tests with the
-                # same name, but a different stage, so keep the extension.
-                testname = filename
-            else:
-                continue
+# Find and add all shader tests. The parsed requirements of each file are kept
+# in an index, so only files that have changed since the last time the profile
+# was loaded are opened.
+for basedir, dirpath, filename, parser in discovery.discover(
+        [TESTS_DIR, GENERATED_TESTS_DIR]):
+    testname, ext = os.path.splitext(filename)
+    groupname = grouptools.from_path(os.path.relpath(dirpath, basedir))
+    if ext == '.shader_test':
+        if PROCESS_ISOLATION:
+            test = functools.partial(
+                ShaderTest, os.path.join(dirpath, filename), parser=parser)
+        else:
+            shader_tests[groupname].append(
+                (os.path.join(dirpath, filename), parser))
+            continue
+    else:
+        # In the event that there is no config assume that it is a legacy
+        # test, and continue
+        if parser is None:
+            continue
+        test = functools.partial(
+            GLSLParserTest, os.path.join(dirpath, filename), parser=parser)
+
+        # For glslparser tests you can have multiple tests with the same name,
+        # but a different stage, so keep the extension.
+        testname = filename
 
-            group = grouptools.join(groupname, testname)
-            assert group not in profile.test_list, group
+    group = grouptools.join(groupname, testname)
+    assert group not in profile.test_list, group
 
-            profile.test_list[group] = test
+    profile.test_list.add_factory(group, test)
 
 # Because we need to handle duplicate group names in TESTS and GENERATED_TESTS
 # this dictionary is constructed, then added to the actual test dictionary.
@@ -248,11 +251,16 @@ for group, files in six.iteritems(shader_tests):
     # If there is only one file in the directory use a normal shader_test.
     # Otherwise use a MultiShaderTest
     if len(files) == 1:
+        filename, parser = files[0]
         group = grouptools.join(
-            group, os.path.basename(os.path.splitext(files[0])[0]))
-        profile.test_list[group] = ShaderTest(files[0])
+            group, os.path.basename(os.path.splitext(filename)[0]))
+        profile.test_list.add_factory(
+            group, functools.partial(ShaderTest, filename, parser=parser))
     else:
-        profile.test_list[group] = MultiShaderTest(files)
+        filenames, parsers = zip(*files)
+        profile.test_list.add_factory(
+            group, functools.partial(MultiShaderTest, list(filenames),
+                                     list(parsers)))
 
 # Collect and add all asmparsertests
 for basedir in [TESTS_DIR, GENERATED_TESTS_DIR]:
@@ -267,8 +275,9 @@ for basedir in [TESTS_DIR, GENERATED_TESTS_DIR]:
                 continue
 
             group = grouptools.join(base_group, filename)
-            profile.test_list[group] = PiglitGLTest(
-                ['asmparsertest', type_, os.path.join(dirpath, filename)])
+            profile.test_list.add_factory(group, functools.partial(
+                PiglitGLTest,
+                ['asmparsertest', type_, os.path.join(dirpath, filename)]))
 
 # Find and add all apitrace tests.
 classifier = DriverClassifier()
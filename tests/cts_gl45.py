@@ -60,9 +60,14 @@ class DEQPCTSTest(deqp.DEQPBaseTest):
         return super(DEQPCTSTest, self).extra_args + \
             [x for x in _EXTRA_ARGS if not x.startswith('--deqp-case')]
 
+
+class DEQPCTSBatchTest(deqp.DEQPBatchMixin, DEQPCTSTest):
+    """Runs the cases of a group in one process."""
+
+
 profile = deqp.make_profile(  # pylint: disable=invalid-name
     itertools.chain(
         deqp.iter_deqp_test_cases(
             deqp.gen_caselist_txt(_CTS_BIN, 'GL45-CTS-cases.txt', _EXTRA_ARGS)),
     ),
-    DEQPCTSTest)
+    DEQPCTSTest, DEQPCTSBatchTest)
@@ -67,6 +67,10 @@ class DEQPCTSTest(deqp.DEQPBaseTest):
             [x for x in _EXTRA_ARGS if not x.startswith('--deqp-case')]
 
 
+class DEQPCTSBatchTest(deqp.DEQPBatchMixin, DEQPCTSTest):
+    """Runs the cases of a group in one process."""
+
+
 # Add all of the suites by default, users can use filters to remove them.
 profile = deqp.make_profile(  # pylint: disable=invalid-name
     itertools.chain(
@@ -80,4 +84,4 @@ profile = deqp.make_profile(  # pylint: disable=invalid-name
             deqp.gen_caselist_txt(_CTS_BIN, 'ESEXT-CTS-cases.txt',
                                   _EXTRA_ARGS)),
     ),
-    DEQPCTSTest)
+    DEQPCTSTest, DEQPCTSBatchTest)
@@ -47,8 +47,12 @@ class DEQPEGLTest(deqp.DEQPBaseTest):
             [x for x in _EXTRA_ARGS if not x.startswith('--deqp-case')]
 
 
+class DEQPEGLBatchTest(deqp.DEQPBatchMixin, DEQPEGLTest):
+    """Runs the cases of a group in one process."""
+
+
 profile = deqp.make_profile(  # pylint: disable=invalid-name
     deqp.iter_deqp_test_cases(
         deqp.gen_caselist_txt(_EGL_BIN, 'dEQP-EGL-cases.txt',
                               _EXTRA_ARGS)),
-    DEQPEGLTest)
+    DEQPEGLTest, DEQPEGLBatchTest)
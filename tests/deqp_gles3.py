@@ -92,7 +92,11 @@ class DEQPGLES3Test(deqp.DEQPBaseTest):
         super(DEQPGLES3Test, self).__init__(*args, **kwargs)
 
 
+class DEQPGLES3BatchTest(deqp.DEQPBatchMixin, DEQPGLES3Test):
+    """Runs the cases of a group in one process."""
+
+
 profile = deqp.make_profile(  # pylint: disable=invalid-name
     deqp.select_source(_DEQP_GLES3_BIN, 'dEQP-GLES3-cases.txt', _DEQP_MUSTPASS,
                        _EXTRA_ARGS),
-    DEQPGLES3Test)
+    DEQPGLES3Test, DEQPGLES3BatchTest)
@@ -40,12 +40,17 @@ import os
 import re
 import subprocess
 
-from framework import grouptools, exceptions, core, options
+from framework import grouptools, exceptions, core, options, status
 from framework import dmesg
 from framework.profile import TestProfile, Test
+from framework.test.base import ReducedProcessMixin, is_crash_returncode
 
 __all__ = ['profile']
 
+# Set once check_environment has passed, so that the profiles piglit run
+# copies from this one don't all read debugfs again.
+_ENVIRONMENT_CHECKED = False
+
 
 def check_environment():
     """Check that the environment that piglit is running in is appropriate.
@@ -53,6 +58,10 @@ def check_environment():
     IGT requires root, debugfs to be mounted, and to be the only drm client.
 
     """
+    global _ENVIRONMENT_CHECKED  # pylint: disable=global-statement
+    if _ENVIRONMENT_CHECKED:
+        return
+
     debugfs_path = "/sys/kernel/debug/dri"
     if os.getuid() != 0:
         raise exceptions.PiglitInternalError(
@@ -63,12 +72,14 @@ def check_environment():
     for subdir in os.listdir(debugfs_path):
         if not os.path.isdir(os.path.join(debugfs_path, subdir)):
             continue
-        clients = open(os.path.join(debugfs_path, subdir, "clients"), 'r')
-        lines = clients.readlines()
+        with open(os.path.join(debugfs_path, subdir, "clients"), 'r') as f:
+            lines = f.readlines()
         if len(lines) > 2:
             raise exceptions.PiglitInternalError(
                 "Test Environment check: other drm clients running!")
 
+    _ENVIRONMENT_CHECKED = True
+
 
 if 'IGT_TEST_ROOT' in os.environ:
     IGT_TEST_ROOT = os.environ['IGT_TEST_ROOT']
@@ -91,7 +102,16 @@ else:
 
 
 class IGTTestProfile(TestProfile):
-    """Test profile for intel-gpu-tools tests."""
+    """Test profile for intel-gpu-tools tests.
+
+    The kernel log is always read for igt tests, but it is only opened when
+    the profile is run, so that loading the profile doesn't start reading it.
+    """
+    reads_dmesg = True
+
+    def __init__(self):
+        super(IGTTestProfile, self).__init__()
+        self.__dmesg = None
 
     def setup(self):
         if options.OPTIONS.execute:
@@ -100,6 +120,18 @@ class IGTTestProfile(TestProfile):
             except exceptions.PiglitInternalError as e:
                 raise exceptions.PiglitFatalError(str(e))
 
+        # With --dmesg the run shares its own dmesg with every profile
+        if isinstance(self.options['dmesg'], dmesg.DummyDmesg):
+            self.__dmesg = dmesg.get_dmesg(True)
+            self.__dmesg.regex = re.compile(r"(\[drm:|drm_|intel_|i915_)")
+            self.options['dmesg'] = self.__dmesg
+
+    def teardown(self):
+        if self.__dmesg is not None:
+            self.__dmesg.close()
+            self.options['dmesg'] = dmesg.get_dmesg(False)
+            self.__dmesg = None
+
 
 profile = IGTTestProfile()  # pylint: disable=invalid-name
 
@@ -131,6 +163,75 @@ class IGTTest(Test):
             self.result.result = 'fail'
 
 
+class IGTBatchTest(ReducedProcessMixin, IGTTest):
+    """Run all of the subtests of an IGT binary in one process.
+
+    Each subtest is a subtest of the result, its status taken from the
+    "Subtest <name>: <RESULT>" line IGT prints when it finishes. If the binary
+    crashes the subtest it was running is marked crash, and the subtests that
+    didn't run are resumed in a new process with --run-subtest.
+
+    Arguments:
+    binary -- the name of the IGT binary.
+    subtests -- the subtests of the binary, in the order it runs them.
+    """
+    __RESULT = re.compile(r'^Subtest (\S+): ([A-Z]+)( \([0-9.]+s\))?$')
+
+    _RESULT_MAP = {
+        'SUCCESS': status.PASS,
+        'FAIL': status.FAIL,
+        'SKIP': status.SKIP,
+        'CRASH': status.CRASH,
+        'TIMEOUT': status.TIMEOUT,
+    }
+
+    def __init__(self, binary, subtests):
+        super(IGTBatchTest, self).__init__(binary, subtests=list(subtests))
+        # Allow as long for the whole binary as running its subtests one at
+        # a time would have.
+        self.timeout = 600 * len(self._expected)
+
+    def _is_subtest(self, line):
+        # IGT prints "Starting subtest: <name>" when a subtest starts, and
+        # "Subtest <name>: <RESULT> (<time>)" when it ends. Subtests skipped
+        # without being started (after a fixture fails) only get the result
+        # line, which has no time.
+        if line.startswith('Starting subtest: '):
+            return True
+        match = self.__RESULT.match(line)
+        return match is not None and match.group(3) is None
+
+    def _resume(self, current):
+        return self.command + [
+            '--run-subtest', ','.join(self._expected[current:])]
+
+    def _is_cherry(self):
+        # IGT returns non-zero if any subtest fails or skips, only a crash or
+        # a timeout stops it before all of the subtests have run.
+        return not (is_crash_returncode(self.result.returncode) or
+                    self.result.returncode in (78, 139))
+
+    def _stop_status(self):
+        if self.result.returncode == 78:
+            return status.TIMEOUT
+        return status.CRASH
+
+    def interpret_result(self):
+        super(IGTBatchTest, self).interpret_result()
+
+        for line in self.result.out.split('\n'):
+            match = self.__RESULT.match(line)
+            if match and match.group(1) in self.result.subtests:
+                self.result.subtests[match.group(1)] = \
+                    self._RESULT_MAP.get(match.group(2), status.FAIL)
+
+        # Subtests that neither reported a result nor were marked by a crash
+        # couldn't be parsed, fall back to 'fail' like IGTTest.
+        for name in list(self.result.subtests):
+            if self.result.subtests[name].name == 'notrun':
+                self.result.subtests[name] = status.FAIL
+
+
 def list_tests(listname):
     """Parse igt test list and return them as a list."""
     with open(os.path.join(IGT_TEST_ROOT, listname), 'r') as f:
@@ -167,7 +268,17 @@ def add_subtest_cases(test):
         # If we reach here there are no subtests.
         return
 
-    for subtest in (s for s in out.splitlines() if s):
+    subtests = [s for s in out.splitlines() if s]
+
+    # Without process isolation all of the subtests of a binary are run by one
+    # process, each result being a subtest of igt/<binary>.
+    if not options.OPTIONS.process_isolation:
+        if subtests:
+            profile.test_list[grouptools.join('igt', test)] = \
+                IGTBatchTest(test, subtests)
+        return
+
+    for subtest in subtests:
         profile.test_list[grouptools.join('igt', test, subtest)] = \
             IGTTest(test, ['--run-subtest', subtest])
 
@@ -182,5 +293,3 @@ def populate_profile():
 
 
 populate_profile()
-profile.options['dmesg'] = dmesg.get_dmesg(True)
-profile.options['dmesg'].regex = re.compile(r"(\[drm:|drm_|intel_|i915_)")
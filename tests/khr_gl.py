@@ -66,6 +66,11 @@ class DEQPKHRTest(deqp.DEQPBaseTest):
         return super(DEQPKHRTest, self).extra_args + \
             [x for x in _EXTRA_ARGS if not x.startswith('--deqp-case')]
 
+
+class DEQPKHRBatchTest(deqp.DEQPBatchMixin, DEQPKHRTest):
+    """Runs the cases of a group in one process."""
+
+
 # Add all of the suites by default, users can use filters to remove them.
 profile = deqp.make_profile(  # pylint: disable=invalid-name
     itertools.chain(
@@ -90,4 +95,4 @@ profile = deqp.make_profile(  # pylint: disable=invalid-name
         deqp.iter_deqp_test_cases(
             deqp.gen_caselist_txt(_KHR_BIN, 'KHR-GL45-cases.txt', _EXTRA_ARGS)),
     ),
-    DEQPKHRTest)
+    DEQPKHRTest, DEQPKHRBatchTest)
@@ -26,16 +26,27 @@ __all__ = ['profile']
 
 
 class FilterVsIn(object):
-    """Filter out 80% of the Vertex Attrib 64 vs_in tests."""
+    """Filter out 80% of the Vertex Attrib 64 vs_in tests.
 
-    def __init__(self):
-        self.random = random.Random()
-        self.random.seed(42)
+    The tests to keep are picked from every test in the profile, in order, the
+    first time the filter is called. That keeps the choice the same no matter
+    what other filters (like -t and -x) remove tests before this one sees
+    them.
+    """
+
+    def __init__(self, test_list):
+        self.test_list = test_list
+        self.__keep = None
 
     def __call__(self, name, _):
         if 'vs_in' in name:
-            # 20%
-            return self.random.random() <= .2
+            if self.__keep is None:
+                rand = random.Random()
+                rand.seed(42)
+                # 20%
+                self.__keep = {n for n in self.test_list
+                               if 'vs_in' in n and rand.random() <= .2}
+            return name in self.__keep
         return True
 
 
@@ -65,4 +76,4 @@ with profile.test_list.group_manager(
 
 # These take too long
 profile.filters.append(lambda n, _: '-explosion' not in n)
-profile.filters.append(FilterVsIn())
+profile.filters.append(FilterVsIn(profile.test_list))
@@ -24,6 +24,10 @@
 #include <stdbool.h>
 #include <string.h>
 #include <ctype.h>
+#ifndef _WIN32
+#include <errno.h>
+#include <unistd.h>
+#endif
 
 #include "piglit-util.h"
 #include "piglit-util-gl.h"
@@ -51,7 +55,7 @@ PIGLIT_GL_TEST_CONFIG_BEGIN
 	config.window_visual = PIGLIT_GL_VISUAL_RGBA | PIGLIT_GL_VISUAL_DOUBLE;
 	config.khr_no_error_support = PIGLIT_NO_ERRORS;
 
-	if (argc > 1)
+	if (argc > 1 && argv[1][0] != '-')
 		get_required_config(argv[1], &config);
 	else
 		config.supports_gl_compat_version = 10;
@@ -146,6 +150,7 @@ static GLint render_width, render_height;
 static GLint read_width, read_height;
 
 static bool report_subtests = false;
+static bool read_stdin = false;
 
 static struct texture_binding {
 	GLuint obj;
@@ -3877,8 +3882,8 @@ init_test(const char *file)
 static void
 recreate_gl_context(char *exec_arg, int param_argc, char **param_argv)
 {
-	int argc = param_argc + 4;
-	char **argv = malloc(sizeof(char*) * argc);
+	int argc = param_argc + (read_stdin ? 5 : 4);
+	char **argv = malloc(sizeof(char*) * (argc + 1));
 
 	if (!argv) {
 		fprintf(stderr, "%s: malloc failed.\n", __func__);
@@ -3887,14 +3892,31 @@ recreate_gl_context(char *exec_arg, int param_argc, char **param_argv)
 
 	argv[0] = exec_arg;
 	memcpy(&argv[1], param_argv, param_argc * sizeof(char*));
-	argv[argc-3] = "-auto";
-	argv[argc-2] = "-fbo";
-	argv[argc-1] = "-report-subtests";
+	argv[param_argc+1] = "-auto";
+	argv[param_argc+2] = "-fbo";
+	argv[param_argc+3] = "-report-subtests";
+	if (read_stdin)
+		argv[param_argc+4] = "-stdin";
+	argv[argc] = NULL;
 
 	if (gl_fw->destroy)
 		gl_fw->destroy(gl_fw);
 	gl_fw = NULL;
 
+#ifndef _WIN32
+	/* A process reading stdin lives for the whole run, so replace it
+	 * instead of calling main() again, which would grow the stack and leak
+	 * argv with every context change.
+	 */
+	if (read_stdin) {
+		fflush(NULL);
+		execvp(argv[0], argv);
+		fprintf(stderr, "%s: execvp failed: %s\n", __func__,
+			strerror(errno));
+		piglit_report_result(PIGLIT_FAIL);
+	}
+#endif
+
 	exit(main(argc, argv));
 }
 
@@ -3931,6 +3953,36 @@ validate_current_gl_context(const char *filename)
 	return true;
 }
 
+/**
+ * Return the next shader_test file to run, or NULL when there are none left.
+ *
+ * The files given on the command line are run first. With -stdin, the paths
+ * of more files are then read from stdin, one per line, until it is closed.
+ * This allows piglit to keep a shader_runner process (and its GL context)
+ * alive and hand it one test at a time.
+ */
+static const char *
+next_test_file(int argc, char **argv, int *i)
+{
+	static char line[4096];
+	size_t len;
+
+	if (*i < argc)
+		return argv[(*i)++];
+
+	if (!read_stdin)
+		return NULL;
+
+	do {
+		if (!fgets(line, sizeof(line), stdin))
+			return NULL;
+		len = strcspn(line, "\r\n");
+		line[len] = 0;
+	} while (len == 0);
+
+	return line;
+}
+
 void
 piglit_init(int argc, char **argv)
 {
@@ -3942,7 +3994,15 @@ piglit_init(int argc, char **argv)
 	float default_piglit_tolerance[4];
 
 	report_subtests = piglit_strip_arg(&argc, argv, "-report-subtests");
-	if (argc < 2) {
+	read_stdin = piglit_strip_arg(&argc, argv, "-stdin");
+	if (read_stdin) {
+		report_subtests = true;
+		/* Don't read ahead of the current line, the rest of stdin
+		 * would be lost when the process is replaced.
+		 */
+		setvbuf(stdin, NULL, _IONBF, 0);
+	}
+	if (argc < 2 && !read_stdin) {
 		printf("usage: shader_runner <test.shader_test>\n");
 		exit(1);
 	}
@@ -4004,17 +4064,28 @@ piglit_init(int argc, char **argv)
 	/* Automatic mode can run multiple tests per session. */
 	if (report_subtests) {
 		char testname[4096], *ext;
-		int i, j;
+		const char *filename;
+		int i = 1, j;
 
-		for (i = 1; i < argc; i++) {
-			const char *hit, *filename = argv[i];
+		while ((filename = next_test_file(argc, argv, &i))) {
+			const char *hit;
 
 			memcpy(piglit_tolerance, default_piglit_tolerance,
 			       sizeof(piglit_tolerance));
 
-			/* Re-initialize the GL context if a different GL config is required. */
-			if (!validate_current_gl_context(filename))
-				recreate_gl_context(argv[0], argc - i, argv + i);
+			/* Re-initialize the GL context if a different GL
+			 * config is required. The remaining files are passed
+			 * on to the new process, which goes on reading stdin
+			 * when it is done with them.
+			 */
+			if (!validate_current_gl_context(filename)) {
+				if (i <= argc && filename == argv[i - 1])
+					recreate_gl_context(argv[0], argc - i + 1,
+							    argv + i - 1);
+				else
+					recreate_gl_context(argv[0], 1,
+							    (char **) &filename);
+			}
 
 			/* Clear global variables to defaults. */
 			test_start = NULL;
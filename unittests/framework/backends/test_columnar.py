@@ -0,0 +1,155 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the columnar backend."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+
+import pytest
+import six
+
+from framework import backends
+from framework import grouptools
+from framework import results
+from framework import status
+
+from . import shared
+
+# pylint: disable=no-self-use,protected-access
+
+
+def _result(result, subtests=None):
+    res = results.TestResult(result)
+    res.out = 'this is stdout'
+    res.err = 'this is stderr'
+    res.returncode = 0
+    res.pid = [1934]
+    res.time = results.TimeAttribute(1.0, 4.5)
+    if subtests:
+        res.subtests.update(subtests)
+    return res
+
+
+@pytest.fixture
+def testrun():
+    testrun = results.TestrunResult()
+    testrun.name = 'name'
+    testrun.options = {'profile': ['quick']}
+    testrun.time_elapsed = results.TimeAttribute(0.0, 10.0)
+    testrun.tests[grouptools.join('b', 'test')] = _result('pass')
+    testrun.tests[grouptools.join('a', 'test')] = _result('skip')
+    testrun.tests[grouptools.join('a', 'subtests')] = _result(
+        'fail', {'a': 'pass', 'b': 'fail'})
+    testrun.calculate_group_totals()
+    return testrun
+
+
+@pytest.fixture
+def loaded(testrun, tmpdir):
+    p = six.text_type(tmpdir.join('results.columnar'))
+    backends.columnar.convert(testrun, p)
+    return backends.load(p)
+
+
+class TestConvert(object):
+    """Tests for converting results to the columnar format."""
+
+    def test_results(self, testrun, loaded):
+        """Every field of every test is preserved."""
+        for name, result in six.iteritems(testrun.tests):
+            assert loaded.tests[name].to_json() == result.to_json()
+
+    def test_status(self, loaded):
+        """Statuses that compare equal are stored separately."""
+        assert loaded.tests[grouptools.join('a', 'test')].result is status.SKIP
+        assert loaded.tests[grouptools.join('b', 'test')].result is status.PASS
+
+    def test_subtests(self, loaded):
+        """Subtests are preserved in order."""
+        result = loaded.tests[grouptools.join('a', 'subtests')]
+        assert list(result.subtests.items()) == \
+            [('a', status.PASS), ('b', status.FAIL)]
+
+    def test_totals(self, testrun, loaded):
+        """Group totals are stored with the results."""
+        assert loaded.totals == testrun.totals
+
+    def test_metadata(self, loaded):
+        assert loaded.name == 'name'
+        assert loaded.options == {'profile': ['quick']}
+        assert loaded.time_elapsed.total == 10.0
+
+    def test_get_result(self, loaded):
+        """Subtests can be looked up with get_result."""
+        assert loaded.get_result(grouptools.join('a', 'subtests', 'b')) is \
+            status.FAIL
+
+
+class TestColumnarTests(object):
+    """Tests for the ColumnarTests mapping."""
+
+    def test_sorted(self, loaded):
+        """Tests are iterated in name order."""
+        assert list(loaded.tests) == sorted(loaded.tests)
+
+    def test_items(self, loaded):
+        """Items are the same as looking up each name."""
+        for name, result in six.iteritems(loaded.tests):
+            assert result.to_json() == loaded.tests[name].to_json()
+
+    def test_len(self, loaded):
+        assert len(loaded.tests) == 3
+
+    def test_contains(self, loaded):
+        assert grouptools.join('a', 'test') in loaded.tests
+        assert grouptools.join('c', 'test') not in loaded.tests
+
+    def test_missing(self, loaded):
+        with pytest.raises(KeyError):
+            loaded.tests[grouptools.join('c', 'test')]  # pylint: disable=pointless-statement
+
+
+class TestColumnarBackend(object):
+    """Tests for the ColumnarBackend class."""
+
+    @pytest.fixture
+    def result_dir(self, tmpdir):
+        backend = backends.columnar.ColumnarBackend(six.text_type(tmpdir))
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test(grouptools.join('a', 'test')) as t:
+            t(_result('pass'))
+        with backend.write_test(grouptools.join('a', 'other')) as t:
+            t(_result('crash'))
+        backend.finalize(
+            {'time_elapsed':
+                results.TimeAttribute(start=0.0, end=1.0).to_json()})
+        return tmpdir
+
+    def test_tests_directory_removed(self, result_dir):
+        assert not result_dir.join('tests').check()
+
+    def test_load(self, result_dir):
+        """The finalized results can be loaded."""
+        testrun = backends.load(six.text_type(result_dir))
+        assert testrun.get_result(grouptools.join('a', 'other')) is \
+            status.CRASH
+        assert testrun.totals['root']['pass'] == 1
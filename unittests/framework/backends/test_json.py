@@ -73,7 +73,7 @@ class TestJSONBackend(object):
         """Tests for the write_test method."""
 
         def test_write(self, tmpdir):
-            """The write method should create a file."""
+            """The write method should create a journal."""
             p = six.text_type(tmpdir)
             test = backends.json.JSONBackend(p)
             test.initialize(shared.INITIAL_METADATA)
@@ -81,7 +81,7 @@ class TestJSONBackend(object):
             with test.write_test('bar') as t:
                 t(results.TestResult())
 
-            assert tmpdir.join('tests/0.json').check()
+            assert tmpdir.join('tests', backends.json.JOURNAL).check()
 
         def test_load(self, tmpdir):
             """Test that the written JSON can be loaded.
@@ -97,8 +97,30 @@ class TestJSONBackend(object):
             with test.write_test('bar') as t:
                 t(results.TestResult())
 
-            with tmpdir.join('tests/0.json').open('r') as f:
-                json.load(f)
+            for _, value in backends.json._iter_tests(
+                    six.text_type(tmpdir.join('tests'))):
+                json.loads(value)
+
+        def test_incomplete(self, tmpdir):
+            """A test is incomplete until the final result is written."""
+            p = six.text_type(tmpdir)
+            test = backends.json.JSONBackend(p)
+            test.initialize(shared.INITIAL_METADATA)
+
+            with test.write_test('bar'):
+                assert backends.json._resume(p).tests['bar'].result == \
+                    'incomplete'
+
+        def test_last_wins(self, tmpdir):
+            """The last result written for a test replaces earlier ones."""
+            p = six.text_type(tmpdir)
+            test = backends.json.JSONBackend(p)
+            test.initialize(shared.INITIAL_METADATA)
+
+            with test.write_test('bar') as t:
+                t(results.TestResult('pass'))
+
+            assert backends.json._resume(p).tests['bar'].result == 'pass'
 
     class TestFinalize(object):
         """Tests for the finalize method."""
@@ -146,6 +168,44 @@ class TestJSONBackend(object):
 
             jsonschema.validate(json_, schema)
 
+        def test_results_are_loaded(self, result_dir):
+            """The final file contains the result of the test."""
+            result = backends.json.load_results(six.text_type(result_dir),
+                                                'none')
+            assert result.tests[self.name].result == 'pass'
+            assert result.time_elapsed.end == 1.0
+
+        def test_totals(self, result_dir):
+            """The group totals are written into the final file."""
+            with result_dir.join('results.json').open('r') as f:
+                json_ = json.load(f)
+
+            assert json_['totals']['root']['pass'] == 1
+            assert json_['totals'][grouptools.join('a', 'test')]['pass'] == 1
+            assert json_['totals'][grouptools.join('a', 'test')]['incomplete'] \
+                == 0
+
+        def test_totals_resumed(self, tmpdir):
+            """Tests written before a resume are counted once."""
+            p = six.text_type(tmpdir)
+            test = backends.json.JSONBackend(p)
+            test.initialize(shared.INITIAL_METADATA)
+            with test.write_test(grouptools.join('a', 'test1')) as t:
+                t(results.TestResult('fail'))
+            with test.write_test(grouptools.join('a', 'test2')):
+                pass
+
+            test = backends.json.JSONBackend(p)
+            with test.write_test(grouptools.join('a', 'test2')) as t:
+                t(results.TestResult('pass'))
+            test.finalize()
+
+            result = backends.json.load_results(p, 'none')
+            expected = results.TestrunResult()
+            expected.tests = result.tests
+            expected.calculate_group_totals()
+            assert result.totals == expected.totals
+
         def test_ignores_invalid(self, tmpdir):
             test = backends.json.JSONBackend(six.text_type(tmpdir))
             test.initialize(shared.INITIAL_METADATA)
@@ -249,6 +309,163 @@ class TestResume(object):
             {'group1/test1', 'group1/test2', 'group2/test3', 'group2/test4'}
 
 
+    def test_partial_record(self, tmpdir):
+        """backends.json._resume: ignores a partially written record."""
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('fail'))
+        journal = tmpdir.join('tests', backends.json.JOURNAL)
+        journal.write_binary(journal.read_binary()[:-5])
+
+        test = backends.json._resume(f)
+        assert test.tests['group1/test1'].result == 'incomplete'
+
+    def test_append_after_partial_record(self, tmpdir):
+        """backends.json._resume: tests written after resuming a journal
+        with a partially written record are loaded.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('fail'))
+        journal = tmpdir.join('tests', backends.json.JOURNAL)
+        journal.write_binary(journal.read_binary()[:-5])
+
+        backend = backends.json.JSONBackend(f)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('pass'))
+        with backend.write_test("group1/test2") as t:
+            t(results.TestResult('pass'))
+
+        test = backends.json._resume(f)
+        assert test.tests['group1/test1'].result == 'pass'
+        assert test.tests['group1/test2'].result == 'pass'
+
+    def test_foreign_journal(self, tmpdir):
+        """backends.json._resume: raises PiglitFatalError if the journal
+        isn't one piglit wrote.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        tmpdir.join('tests', backends.json.JOURNAL).write_binary(
+            b'{"group1/test1": {"result": "pass"}}')
+
+        with pytest.raises(exceptions.PiglitFatalError):
+            backends.json._resume(f)
+
+    def test_backends_load(self, tmpdir):
+        """backends.load: finds the json loader for a partial run, whatever
+        order the files in tests are listed in.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('pass'))
+
+        test = backends.load(f)
+        assert test.tests['group1/test1'].result == 'pass'
+
+    def test_load_snippets(self, tmpdir):
+        """backends.json._resume: loads the individual test files written by
+        older versions of piglit.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        tmpdir.join('tests', '0.json').write(
+            json.dumps({'group1/test1': results.TestResult('fail')},
+                       default=backends.json.piglit_encoder))
+        with backend.write_test("group1/test2") as t:
+            t(results.TestResult('pass'))
+
+        test = backends.json._resume(f)
+        assert list(test.tests.keys()) == ['group1/test1', 'group1/test2']
+
+
+class TestLoadCompleted(object):
+    """Tests for the load_completed function."""
+
+    def test_basic(self, tmpdir):
+        """backends.json.load_completed: returns the status of each test."""
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('fail'))
+        with backend.write_test("group1/test2"):
+            pass
+
+        meta, completed = backends.json.load_completed(f)
+        assert meta['name'] == shared.INITIAL_METADATA['name']
+        assert dict(completed) == {'group1/test1': 'fail',
+                                   'group1/test2': 'incomplete'}
+
+    def test_journal_not_read(self, tmpdir):
+        """backends.json.load_completed: only reads the index."""
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('pass'))
+        tmpdir.join('tests', backends.json.JOURNAL).remove()
+
+        _, completed = backends.json.load_completed(f)
+        assert dict(completed) == {'group1/test1': 'pass'}
+
+    def test_partial_line(self, tmpdir):
+        """backends.json.load_completed: ignores a partially written line,
+        and it's removed before more lines are appended.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('fail'))
+        index = tmpdir.join('tests', backends.json.INDEX)
+        index.write_binary(index.read_binary()[:-5])
+
+        _, completed = backends.json.load_completed(f)
+        assert dict(completed) == {'group1/test1': 'incomplete'}
+
+        backend = backends.json.JSONBackend(f)
+        with backend.write_test("group1/test2") as t:
+            t(results.TestResult('pass'))
+
+        _, completed = backends.json.load_completed(f)
+        assert dict(completed) == {'group1/test1': 'incomplete',
+                                   'group1/test2': 'pass'}
+
+    def test_no_index(self, tmpdir):
+        """backends.json.load_completed: reads runs without an index from the
+        journal, and writes the index.
+        """
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('crash'))
+        tmpdir.join('tests', backends.json.INDEX).remove()
+
+        _, completed = backends.json.load_completed(f)
+        assert dict(completed) == {'group1/test1': 'crash'}
+        assert tmpdir.join('tests', backends.json.INDEX).check()
+
+    def test_index_not_snippet(self, tmpdir):
+        """backends.json._resume: the index isn't read as a test file."""
+        f = six.text_type(tmpdir)
+        backend = backends.json.JSONBackend(f)
+        backend.initialize(shared.INITIAL_METADATA)
+        with backend.write_test("group1/test1") as t:
+            t(results.TestResult('pass'))
+
+        assert list(backends.json._resume(f).tests) == ['group1/test1']
+
+
 class TestLoadResults(object):
     """Tests for the load_results function."""
 
@@ -0,0 +1,98 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the run and resume commands."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+
+import pytest
+import six
+
+from framework import backends
+from framework import profile
+from framework import results
+from framework.options import OPTIONS
+from framework.programs import run
+from .. import utils
+
+# pylint: disable=no-self-use,redefined-outer-name
+
+
+@pytest.yield_fixture(autouse=True)
+def restore_options():
+    yield
+    OPTIONS.clear()
+
+
+class TestResume(object):
+    """Tests for the resume function."""
+
+    @pytest.fixture
+    def inst(self, mocker):
+        inst = profile.TestProfile()
+        for name in 'ab':
+            inst.test_list[name] = utils.Test([name])
+        mocker.patch('framework.programs.run.profile.load_test_profile',
+                     return_value=inst)
+        return inst
+
+    @staticmethod
+    def start(tmpdir, backend):
+        """Start a run with backend that was stopped after the first test."""
+        opts = dict(OPTIONS)
+        opts.update({
+            'execute': False,
+            'profile': ['foo'],
+            'log_level': 'dummy',
+            'backend': backend,
+            'concurrent': 'none',
+            'executor': 'thread',
+            'include_filter': [],
+            'exclude_filter': [],
+            'dmesg': False,
+            'monitoring': False,
+            'platform': 'mixed_glx_egl',
+            'forced_test_list': [],
+            'ignore_missing': False,
+        })
+        inst = backends.get_backend(backend)(six.text_type(tmpdir))
+        inst.initialize({'name': 'name', 'options': opts})
+        with inst.write_test('a') as t:
+            t(results.TestResult('pass'))
+
+    def test_columnar(self, tmpdir, inst):
+        """A run started with the columnar backend is finished with it."""
+        self.start(tmpdir, 'columnar')
+        run.resume([six.text_type(tmpdir)])
+
+        assert tmpdir.join('results.columnar').check()
+        assert not tmpdir.listdir('results.json*')
+        loaded = backends.load(six.text_type(tmpdir))
+        assert sorted(loaded.tests) == ['a', 'b']
+
+    def test_json(self, tmpdir, inst):
+        """A run started with the json backend is finished with it."""
+        self.start(tmpdir, 'json')
+        run.resume([six.text_type(tmpdir)])
+
+        assert tmpdir.listdir('results.json*')
+        assert not tmpdir.join('results.columnar').check()
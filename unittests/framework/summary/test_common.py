@@ -25,6 +25,8 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 
+import random
+
 import pytest
 from six.moves import range
 
@@ -429,6 +431,69 @@ class TestNames(object):
                 getattr(self.test.names, attr)[0]
 
 
+class TestStatusMatrix(object):
+    """Tests for the StatusMatrix class.
+
+    These compare the matrix to find_diffs and find_single, which call
+    get_result for every test, so they must agree.
+    """
+
+    @pytest.fixture(scope='class')
+    def runs(self):
+        rand = random.Random(42)
+        runs = []
+        for _ in range(4):
+            res = results.TestrunResult()
+            for i in range(200):
+                # Leave some tests out of some runs
+                if rand.random() < 0.1:
+                    continue
+                name = grouptools.join('group', str(i % 7), str(i))
+                res.tests[name] = results.TestResult(rand.choice(status.ALL))
+                if i % 5 == 0:
+                    for sub in range(rand.randint(0, 3)):
+                        res.tests[name].subtests[str(sub)] = \
+                            rand.choice(status.ALL)
+            runs.append(res)
+        return runs
+
+    @pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+    def names(self, request, runs, mocker):
+        if request.param and not summary._NUMPY:
+            pytest.skip('Test requires numpy')
+        mocker.patch.object(summary, '_NUMPY', request.param)
+        return summary.Names(summary.Results(runs))
+
+    @pytest.mark.parametrize('comparator', [
+        lambda x, y: x < y and min(x, y) >= status.PASS,
+        lambda x, y: x > y and min(x, y) >= status.PASS,
+        lambda x, y: x != y,
+    ], ids=['regressions', 'fixes', 'ne'])
+    def test_diffs(self, runs, names, comparator):
+        assert names._matrix.diffs(comparator) == \
+            summary.find_diffs(runs, names.all, comparator)
+
+    @pytest.mark.parametrize('func', [
+        lambda x: x > status.PASS,
+        lambda x: x is status.SKIP,
+        lambda x: x is status.INCOMPLETE,
+    ], ids=['problems', 'skips', 'incomplete'])
+    def test_single(self, runs, names, func):
+        assert names._matrix.single(func) == \
+            summary.find_single(runs, names.all, func)
+
+    def test_enabled(self, runs, names):
+        def handler(names_, name, prev, cur):
+            if summary._result_in(name, cur) and \
+                    not summary._result_in(name, prev):
+                names_.add(name)
+
+        assert names.enabled[1:] == summary.find_diffs(
+            runs, names.all,
+            lambda x, y: x is status.NOTRUN and y is not status.NOTRUN,
+            handler=handler)
+
+
 class TestEscapeFilename(object):
     """Tests for the escape_filename function."""
 
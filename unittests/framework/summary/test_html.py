@@ -27,9 +27,12 @@ from __future__ import (
 )
 import os
 
+import pytest
 import six
 
+from framework import results, status
 from framework.summary import html_
+from framework.summary.common import Results
 
 
 def test_copy_static(tmpdir):
@@ -38,3 +41,79 @@ def test_copy_static(tmpdir):
     html_._copy_static_files(six.text_type(tmpdir))
     assert os.path.exists('index.css'), 'index.css not created correctly'
     assert os.path.exists('result.css'), 'result.css not created correctly'
+
+
+class TestMakeTestrunInfo(object):
+    """Tests for the _make_testrun_info function."""
+
+    @staticmethod
+    def _results(**tests):
+        run = results.TestrunResult()
+        run.name = 'foo'
+        for name, result in six.iteritems(tests):
+            run.tests[name] = results.TestResult(result)
+        run.calculate_group_totals()
+        return Results([run])
+
+    def test_pages(self, tmpdir):
+        """Renders a page for each test."""
+        stats = html_._make_testrun_info(
+            self._results(**{'a@b': 'pass', 'a@c': 'fail'}),
+            six.text_type(tmpdir), jobs=1)
+        assert stats[:2] == (2, 0)
+        assert tmpdir.join('foo', 'a@b.html').check()
+        assert tmpdir.join('foo', 'a@c.html').check()
+
+    def test_parallel(self, tmpdir):
+        """Renders pages in a pool of processes."""
+        tests = {'a@{}'.format(i): 'pass' for i in range(10)}
+        stats = html_._make_testrun_info(
+            self._results(**tests), six.text_type(tmpdir), jobs=2)
+        assert stats[:2] == (10, 0)
+        assert len(tmpdir.join('foo').listdir('*.html')) == 11
+
+    def test_unchanged(self, tmpdir):
+        """Pages of tests that haven't changed are not rendered again."""
+        html_._make_testrun_info(
+            self._results(**{'a@b': 'pass', 'a@c': 'fail'}),
+            six.text_type(tmpdir), jobs=1)
+        stats = html_._make_testrun_info(
+            self._results(**{'a@b': 'pass', 'a@c': 'crash'}),
+            six.text_type(tmpdir), jobs=1)
+        assert stats[:2] == (1, 1)
+        assert 'crash' in tmpdir.join('foo', 'a@c.html').read()
+
+    def test_template_changed(self, tmpdir, mocker):
+        """Every page is rendered again if the template changes."""
+        html_._make_testrun_info(
+            self._results(**{'a@b': 'pass'}), six.text_type(tmpdir), jobs=1)
+        getmtime = os.path.getmtime
+        mocker.patch('framework.summary.html_.os.path.getmtime',
+                     lambda p: getmtime(p) + 1)
+        stats = html_._make_testrun_info(
+            self._results(**{'a@b': 'pass'}), six.text_type(tmpdir), jobs=1)
+        assert stats[:2] == (1, 0)
+
+    def test_removed(self, tmpdir):
+        """Pages of tests no longer in the results are removed."""
+        html_._make_testrun_info(
+            self._results(**{'a@b': 'pass', 'a@c': 'fail'}),
+            six.text_type(tmpdir), jobs=1)
+        html_._make_testrun_info(
+            self._results(**{'a@b': 'pass'}), six.text_type(tmpdir), jobs=1)
+        assert not tmpdir.join('foo', 'a@c.html').check()
+
+    def test_exclude(self, tmpdir):
+        """Excluded statuses don't get pages."""
+        stats = html_._make_testrun_info(
+            self._results(**{'a@b': 'pass', 'a@c': 'fail'}),
+            six.text_type(tmpdir), exclude={status.PASS}, jobs=1)
+        assert stats[:2] == (1, 0)
+        assert not tmpdir.join('foo', 'a@b.html').check()
+
+    def test_duplicate_names(self, tmpdir):
+        """Runs with the same name are an error."""
+        res = self._results(**{'a@b': 'pass'})
+        res.results.append(res.results[0])
+        with pytest.raises(html_.exceptions.PiglitFatalError):
+            html_._make_testrun_info(res, six.text_type(tmpdir), jobs=1)
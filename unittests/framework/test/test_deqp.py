@@ -28,6 +28,7 @@ tests
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import re
 import textwrap
 try:
     from unittest import mock
@@ -51,6 +52,10 @@ class _DEQPTestTest(deqp.DEQPBaseTest):
     extra_args = ['extra']
 
 
+class _DEQPBatchTestTest(deqp.DEQPBatchMixin, _DEQPTestTest):
+    pass
+
+
 class TestGetOptions(object):
     """Tests for the get_option function."""
 
@@ -120,6 +125,234 @@ class TestMakeProfile(object):
         assert expected in self.profile.test_list
 
 
+def test_make_profile_lazy(mocker):
+    """deqp.make_profile: tests aren't constructed until they're looked up.
+    """
+    init = mocker.patch.object(_DEQPTestTest, '__init__', return_value=None)
+    inst = deqp.make_profile(['deqp.a.one', 'deqp.a.two'], _DEQPTestTest)
+
+    assert len(inst.test_list) == 2
+    assert not init.called
+    inst.test_list[grouptools.join('deqp', 'a', 'one')]
+    init.assert_called_once_with('deqp.a.one')
+
+
+class TestMakeProfileBatched(object):
+    """Test deqp.make_profile with a batch class."""
+
+    @pytest.fixture
+    def inst(self, mocker):
+        mocker.patch('framework.test.deqp.options.OPTIONS.process_isolation',
+                     False)
+        return deqp.make_profile(
+            ['deqp.a.one', 'deqp.b.one', 'deqp.a.two', 'deqp.a.sub.one'],
+            _DEQPTestTest, _DEQPBatchTestTest)
+
+    def test_groups(self, inst):
+        """deqp.make_profile: adds a test for each group."""
+        assert set(inst.test_list.keys()) == {
+            grouptools.join('deqp', 'a'),
+            grouptools.join('deqp', 'b'),
+            grouptools.join('deqp', 'a', 'sub'),
+        }
+
+    def test_subtests(self, inst):
+        """deqp.make_profile: the cases of a group are its subtests."""
+        test = inst.test_list[grouptools.join('deqp', 'a')]
+        assert set(test.result.subtests.keys()) == {'one', 'two'}
+
+    def test_isolation(self):
+        """deqp.make_profile: the batch class isn't used with process
+        isolation.
+        """
+        inst = deqp.make_profile(['deqp.a.one'], _DEQPTestTest,
+                                 _DEQPBatchTestTest)
+        assert grouptools.join('deqp', 'a', 'one') in inst.test_list
+
+
+def test_caselist_trie():
+    """deqp.caselist_trie: returns a trie of the cases."""
+    actual = deqp.caselist_trie(['dEQP-GLES2.info.version',
+                                 'dEQP-GLES2.info.vendor',
+                                 'dEQP-GLES2.functional.a'])
+    assert actual == \
+        '{dEQP-GLES2{info{version,vendor},functional{a}}}'
+
+
+class TestDEQPBatchMixin(object):
+    """Tests for the DEQPBatchMixin class."""
+
+    @staticmethod
+    def _fake_deqp(crash=(), reverse=False):
+        """Return a _run_command that prints the output of dEQP for the cases
+        passed in the caselist, crashing on those in crash. With reverse the
+        cases are run in the reverse order of the caselist.
+        """
+        def _run_command(self, **kwargs):
+            command = kwargs.get('_command', self.command)
+            caselist = [c for c in command
+                        if c.startswith('--deqp-caselist=')][0]
+            leaves = re.search(r'\{([^{}]*)\}+$', caselist).group(1)
+            out = []
+            self.result.returncode = 0
+            leaves = leaves.split(',')
+            if reverse:
+                leaves.reverse()
+            for leaf in leaves:
+                out.append("Test case 'deqp.group.{}'..".format(leaf))
+                if leaf in crash:
+                    self.result.returncode = -11
+                    break
+                out.append('  Pass (Pass)')
+            self.result.out = '\n'.join(out) + '\n'
+            self.result.err = ''
+            _run_command.commands.append(command)
+
+        _run_command.commands = []
+        return _run_command
+
+    @pytest.fixture
+    def inst(self):
+        return _DEQPBatchTestTest(
+            ['deqp.group.a', 'deqp.group.b', 'deqp.group.c'])
+
+    def test_command(self, inst):
+        """test.deqp.DEQPBatchMixin.command: passes the cases in a caselist.
+        """
+        assert inst.command == [
+            'deqp.bin', '--deqp-caselist={deqp{group{a,b,c}}}', 'extra']
+
+    def test_interpret_result(self, inst):
+        """test.deqp.DEQPBatchMixin.interpret_result: sets a subtest for each
+        case.
+        """
+        inst.result.out = textwrap.dedent("""\
+            Test case 'deqp.group.a'..
+              Pass (Pass)
+            Test case 'deqp.group.b'..
+            Test case duration in microseconds = 10 us
+              NotSupported (Not supported)
+            Test case 'deqp.group.c'..
+              Fail (Fail)
+            """)
+        inst.interpret_result()
+        assert dict(inst.result.subtests) == {
+            'a': status.PASS, 'b': status.SKIP, 'c': status.FAIL}
+
+    def test_resume(self, inst, mocker):
+        """test.deqp.DEQPBatchMixin: a crashed case is marked crash, and the
+        rest of the cases are run.
+        """
+        fake = self._fake_deqp(crash=['b'])
+        mocker.patch.object(_DEQPTestTest, '_run_command', fake)
+        inst._run_command()
+        inst.interpret_result()
+
+        assert fake.commands[1][1] == '--deqp-caselist={deqp{group{c}}}'
+        assert inst.result.subtests['a'] is status.PASS
+        assert inst.result.subtests['b'] is status.CRASH
+        assert inst.result.subtests['c'] is status.PASS
+
+    def test_resume_by_name(self, inst, mocker):
+        """test.deqp.DEQPBatchMixin: the crashed case and the resumed cases
+        are found by name when dEQP doesn't run the cases in order.
+        """
+        fake = self._fake_deqp(crash=['c'], reverse=True)
+        mocker.patch.object(_DEQPTestTest, '_run_command', fake)
+        inst._run_command()
+        inst.interpret_result()
+
+        assert fake.commands[1][1] == '--deqp-caselist={deqp{group{a,b}}}'
+        assert inst.result.subtests['a'] is status.PASS
+        assert inst.result.subtests['b'] is status.PASS
+        assert inst.result.subtests['c'] is status.CRASH
+
+    def test_chunks(self, mocker):
+        """test.deqp.DEQPBatchMixin: cases are run chunk_size at a time."""
+        inst = _DEQPBatchTestTest(
+            ['deqp.group.a', 'deqp.group.b', 'deqp.group.c'], chunk_size=2)
+        fake = self._fake_deqp()
+        mocker.patch.object(_DEQPTestTest, '_run_command', fake)
+        inst._run_command()
+        inst.interpret_result()
+
+        assert [c[1] for c in fake.commands] == [
+            '--deqp-caselist={deqp{group{a,b}}}',
+            '--deqp-caselist={deqp{group{c}}}',
+        ]
+        assert set(inst.result.subtests.values()) == {status.PASS}
+
+
+class TestGenCaselistTxt(object):
+    """Tests for the gen_caselist_txt function."""
+
+    @pytest.fixture
+    def bin_(self, tmpdir):
+        """A deqp binary that writes a caselist and counts its runs."""
+        p = tmpdir.mkdir('bin').join('deqp')
+        p.write(textwrap.dedent("""\
+            #!/bin/sh
+            echo run >> runs
+            echo "TEST: deqp.a.$2" > cases.txt
+            """))
+        p.chmod(0o755)
+        return p
+
+    @pytest.fixture
+    def cache(self, tmpdir, mocker):
+        p = tmpdir.join('cache')
+        mocker.patch.dict('framework.test.deqp.os.environ',
+                          {'PIGLIT_DEQP_CASELIST_CACHE': six.text_type(p)})
+        return p
+
+    def test_cached(self, bin_, cache):
+        """deqp.gen_caselist_txt: deqp is only run the first time."""
+        first = deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+        second = deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+
+        assert bin_.dirpath().join('runs').read() == 'run\n'
+        assert second.startswith(six.text_type(cache))
+        with open(first) as f1, open(second) as f2:
+            assert f1.read() == f2.read()
+
+    def test_binary_changed(self, bin_, cache):
+        """deqp.gen_caselist_txt: deqp is run again if the binary changes."""
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+        bin_.write('\n# changed\n', mode='a')
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+
+        assert bin_.dirpath().join('runs').read() == 'run\nrun\n'
+
+    def test_binary_touched(self, bin_, cache):
+        """deqp.gen_caselist_txt: deqp is run again if the binary is
+        modified without changing its size.
+        """
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+        bin_.setmtime(bin_.mtime() - 10)
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+
+        assert bin_.dirpath().join('runs').read() == 'run\nrun\n'
+
+    def test_extra_args_changed(self, bin_, cache):
+        """deqp.gen_caselist_txt: deqp is run again if the extra arguments
+        change.
+        """
+        one = deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+        two = deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', ['x'])
+
+        with open(one) as f1, open(two) as f2:
+            assert f1.read() != f2.read()
+
+    def test_disabled(self, bin_, mocker):
+        """deqp.gen_caselist_txt: the cache can be disabled."""
+        mocker.patch.dict('framework.test.deqp.os.environ',
+                          {'PIGLIT_DEQP_CASELIST_CACHE': 'none'})
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+        deqp.gen_caselist_txt(six.text_type(bin_), 'cases.txt', [])
+
+        assert bin_.dirpath().join('runs').read() == 'run\nrun\n'
+
+
 class TestIterDeqpTestCases(object):
     """Tests for iter_deqp_test_cases."""
 
@@ -0,0 +1,175 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the framework.test.discovery module."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import textwrap
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pytest
+import six
+
+from framework.test import discovery, glsl_parser_test, shader_test
+
+# pylint: disable=no-self-use,protected-access
+
+_SHADER = textwrap.dedent("""\
+    [require]
+    GL ES >= 3.0
+    GLSL ES >= 3.00
+    GL_OES_foo
+
+    [vertex shader]
+""")
+
+_GLSL = textwrap.dedent("""\
+    // [config]
+    // expect_result: pass
+    // glsl_version: 1.50
+    // require_extensions: GL_ARB_foo
+    // [end config]
+""")
+
+
+@pytest.fixture
+def tests(tmpdir):
+    """Create a tests directory with a shader_test, a glsl_parser_test, a
+    legacy glsl_parser_test without a config block, and an unrelated file.
+    """
+    d = tmpdir.mkdir('tests')
+    d.mkdir('spec').join('foo.shader_test').write(_SHADER)
+    d.join('spec', 'bar.vert').write(_GLSL)
+    d.join('spec', 'legacy.frag').write('void main() {}\n')
+    d.join('spec', 'README').write('')
+    return d
+
+
+@pytest.yield_fixture(autouse=True)
+def cache(tmpdir):
+    """Keep the index in tmpdir."""
+    d = tmpdir.mkdir('cache')
+    with mock.patch('framework.test.discovery.core.PIGLIT_CONFIG.safe_get',
+                    mock.Mock(return_value=six.text_type(d))):
+        yield d
+
+
+def _discover(tests, **kwargs):
+    return {f: p for _, _, f, p in discovery.discover([six.text_type(tests)],
+                                                      **kwargs)}
+
+
+class TestDiscover(object):
+    """Tests for the discover function."""
+
+    def test_files(self, tests):
+        """Finds only the shader_test and glsl_parser_test files."""
+        assert set(_discover(tests)) == {'foo.shader_test', 'bar.vert',
+                                         'legacy.frag'}
+
+    def test_legacy(self, tests):
+        """glsl_parser_test files without a config have no parser."""
+        assert _discover(tests)['legacy.frag'] is None
+
+    @pytest.mark.parametrize('warm', [False, True])
+    def test_shader_test(self, tests, warm):
+        """shader_test parsers match a fresh parse, from the index or not."""
+        if warm:
+            _discover(tests)
+        parser = _discover(tests)['foo.shader_test']
+        expected = shader_test.Parser(
+            six.text_type(tests.join('spec', 'foo.shader_test')))
+        expected.parse()
+
+        assert isinstance(parser, shader_test.Parser)
+        assert parser.prog == expected.prog
+        assert parser.gl_required == expected.gl_required
+        assert parser.gles_version == expected.gles_version
+        assert parser.glsl_es_version == expected.glsl_es_version
+
+    @pytest.mark.parametrize('warm', [False, True])
+    def test_glsl_parser_test(self, tests, warm):
+        """glsl_parser_test parsers match a fresh parse, from the index or
+        not.
+        """
+        if warm:
+            _discover(tests)
+        parser = _discover(tests)['bar.vert']
+        expected = glsl_parser_test.Parser(
+            six.text_type(tests.join('spec', 'bar.vert')))
+
+        assert parser.command == expected.command
+        assert parser.gl_required == expected.gl_required
+        assert parser.glsl_version == expected.glsl_version
+
+    def test_unchanged(self, tests, mocker):
+        """Unchanged files are not parsed again."""
+        _discover(tests)
+        parse = mocker.patch('framework.test.discovery._parse')
+        _discover(tests)
+        assert not parse.called
+
+    def test_changed(self, tests, mocker):
+        """Changed files are parsed again."""
+        _discover(tests)
+        tests.join('spec', 'foo.shader_test').write(
+            _SHADER.replace('GL_OES_foo', 'GL_OES_bar'))
+        parser = _discover(tests)['foo.shader_test']
+        assert parser.gl_required == {'GL_OES_bar'}
+
+    def test_removed(self, tests, cache):
+        """Removed files are dropped from the index."""
+        _discover(tests)
+        tests.join('spec', 'bar.vert').remove()
+        assert set(_discover(tests)) == {'foo.shader_test', 'legacy.frag'}
+        assert len(discovery._load(cache.listdir()[0].strpath)) == 2
+
+    def test_build_changed(self, tests, mocker):
+        """The index is ignored if the glslparsertest binaries changed."""
+        _discover(tests)
+        mocker.patch('framework.test.discovery.glsl_parser_test._HAS_GL_BIN',
+                     not glsl_parser_test._HAS_GL_BIN)
+        parse = mocker.spy(discovery, '_parse')
+        _discover(tests)
+        assert parse.call_count == 3
+
+    def test_parallel(self, tests, mocker):
+        """Files are parsed by a pool of processes."""
+        mocker.patch('framework.test.discovery._PARALLEL_THRESHOLD', 1)
+        parsers = _discover(tests, jobs=2)
+        assert parsers['bar.vert'].glsl_version == 1.5
+
+    def test_disabled(self, tests, cache):
+        """Nothing is written when the index is disabled."""
+        with mock.patch('framework.test.discovery.core.PIGLIT_CONFIG.safe_get',
+                        mock.Mock(return_value='none')):
+            _discover(tests)
+        assert not cache.listdir()
+
+    def test_corrupt(self, tests, cache):
+        """A corrupt index is ignored."""
+        _discover(tests)
+        cache.listdir()[0].write('{"foo')
+        assert _discover(tests)['legacy.frag'] is None
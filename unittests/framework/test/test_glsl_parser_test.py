@@ -109,6 +109,21 @@ def test_no_config_end(tmpdir):
         glsl.GLSLParserTest(six.text_type(p))
 
 
+def test_stops_after_config_end(tmpdir):
+    """test.glsl_parser_test.GLSLParserTest: the file is not read past [end
+    config]."""
+    p = tmpdir.join('test.frag')
+    p.write_binary(textwrap.dedent("""\
+        // [config]
+        // expect_result: pass
+        // glsl_version: 1.10
+        // [end config]
+        """).encode('utf-8') + b'\n' * 65536 + b'\xff\xfe\n')
+
+    test = glsl.GLSLParserTest(six.text_type(p))
+    assert test.command[-2:] == ['pass', '1.10']
+
+
 def test_no_expect_result(tmpdir):
     """test.glsl_parser_test.GLSLParserTest: exception is raised if
     "expect_result" key is missing."""
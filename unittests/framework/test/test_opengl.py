@@ -31,6 +31,7 @@ except ImportError:
     import mock
 
 import pytest
+import six
 
 from framework.test import opengl
 from framework.test.base import TestIsSkip as _TestIsSkip
@@ -40,6 +41,14 @@ from .. import utils
 # pylint: disable=no-self-use,attribute-defined-outside-init,protected-access
 
 
+@pytest.yield_fixture(autouse=True)
+def _no_cache():
+    """Don't let the tests read or write the user's wflinfo cache."""
+    with mock.patch('framework.test.opengl._cache_path',
+                    mock.Mock(return_value=None)):
+        yield
+
+
 def _has_wflinfo():
     """Return True if wflinfo is available in PATH."""
     try:
@@ -392,6 +401,109 @@ class TestWflInfo(object):
             inst.glsl_es_version
 
 
+class TestWflInfoCache(object):
+    """Tests for the on disk cache of WflInfo values."""
+
+    _OUTPUT = textwrap.dedent("""\
+        Waffle platform: glx
+        Waffle api: gl
+        OpenGL vendor string: Intel Open Source Technology Center
+        OpenGL renderer string: Mesa DRI Intel(R) Haswell Mobile
+        OpenGL version string: 4.5 (Core Profile) Mesa 13.0.0
+        OpenGL context flags: 0x0
+        OpenGL shading language version string: 4.50
+        OpenGL extensions: GL_foo GL_bar
+    """).encode('utf-8')
+
+    @pytest.yield_fixture(autouse=True)
+    def patch(self, tmpdir):
+        """Use a cache in tmpdir, and count the calls to wflinfo."""
+        self.path = six.text_type(tmpdir.join('wflinfo.json'))
+        self.wflinfo = mock.Mock(return_value=self._OUTPUT)
+        with mock.patch.dict('framework.test.opengl.OPTIONS.env',
+                             {'PIGLIT_PLATFORM': 'foo'}), \
+                mock.patch('framework.test.opengl._cache_path',
+                           mock.Mock(return_value=self.path)), \
+                mock.patch('framework.test.opengl.subprocess.check_output',
+                           self.wflinfo):
+            yield
+
+    @staticmethod
+    def _new():
+        """Create a WflInfo, as a new process would."""
+        with mock.patch(
+                'framework.test.opengl.WflInfo._WflInfo__shared_state', {}):
+            return opengl.WflInfo()
+
+    def test_cached(self):
+        """test.opengl.WflInfo: the second run doesn't call wflinfo."""
+        assert self._new().gl_version == 4.5
+        self.wflinfo.reset_mock()
+        assert self._new().gl_version == 4.5
+        assert not self.wflinfo.called
+
+    def test_extensions(self):
+        """test.opengl.WflInfo: extensions are returned from the cache as a
+        set.
+        """
+        self._new().gl_extensions
+        assert self._new().gl_extensions == {'GL_foo', 'GL_bar'}
+
+    def test_failed_not_cached(self):
+        """test.opengl.WflInfo: the answer of a failed wflinfo isn't cached.
+        """
+        self.wflinfo.side_effect = subprocess.CalledProcessError(1, 'wflinfo')
+        assert self._new().gl_version is None
+        assert self._new().gl_extensions == set()
+
+        self.wflinfo.side_effect = None
+        assert self._new().gl_version == 4.5
+        assert self._new().gl_extensions == {'GL_foo', 'GL_bar'}
+
+    def test_none(self):
+        """test.opengl.WflInfo: None isn't cached."""
+        self._new().gles_version
+        self.wflinfo.reset_mock()
+        assert self._new().gles_version is None
+        assert self.wflinfo.called
+
+    def test_driver_changed(self):
+        """test.opengl.WflInfo: a different driver isn't answered from the
+        cache.
+        """
+        self._new().gl_version
+        self.wflinfo.reset_mock()
+        with mock.patch.dict('os.environ', {'MESA_GL_VERSION_OVERRIDE': '3.3'}):
+            self._new().gl_version
+        assert self.wflinfo.called
+
+    def test_platform_changed(self):
+        """test.opengl.WflInfo: a different platform isn't answered from the
+        cache.
+        """
+        self._new().gl_version
+        self.wflinfo.reset_mock()
+        with mock.patch.dict('framework.test.opengl.OPTIONS.env',
+                             {'PIGLIT_PLATFORM': 'bar'}):
+            self._new().gl_version
+        assert self.wflinfo.called
+
+    def test_refresh(self):
+        """test.opengl.WflInfo.refresh: calls wflinfo again."""
+        self._new().gl_version
+        self.wflinfo.reset_mock()
+        inst = self._new()
+        inst.refresh()
+        assert inst.gl_version == 4.5
+        assert self.wflinfo.called
+
+    def test_corrupt(self):
+        """test.opengl.WflInfo: a corrupt cache is ignored."""
+        with open(self.path, 'w') as f:
+            f.write('{"foo')
+        assert self._new().gl_version == 4.5
+
+
 class TestFastSkipMixin(object):  # pylint: disable=too-many-public-methods
     """Tests for the FastSkipMixin class."""
 
@@ -422,6 +534,65 @@ class TestFastSkipMixin(object):  # pylint: disable=too-many-public-methods
                    glsl_es_version=2)
 
 
+class TestFindSkips(object):
+    """Tests for the find_skips function."""
+
+    @pytest.yield_fixture(autouse=True)
+    def patch(self):
+        """Patch the wflinfo values."""
+        _mock_wflinfo = mock.Mock(spec=opengl.WflInfo)
+        _mock_wflinfo.gl_version = 3.3
+        _mock_wflinfo.gles_version = 3.0
+        _mock_wflinfo.glsl_version = 3.3
+        _mock_wflinfo.glsl_es_version = 2.0
+        _mock_wflinfo.gl_extensions = set(['bar', 'baz'])
+
+        with mock.patch('framework.test.opengl.FastSkip.info', _mock_wflinfo):
+            yield
+
+    class _Test(opengl.FastSkipMixin, utils.Test):
+        pass
+
+    def test_skips(self):
+        """Finds the tests with unmet requirements, with the reason."""
+        skips = opengl.find_skips([
+            ('a', self._Test(['a'], gl_required={'bar'})),
+            ('b', self._Test(['b'], gl_required={'bar', 'foo'})),
+            ('c', self._Test(['c'], gl_version=4.0)),
+            ('d', self._Test(['d'], glsl_version=3.3)),
+        ])
+        assert list(skips) == ['b', 'c']
+        assert 'foo' in skips['b']
+        assert '4.0' in skips['c']
+
+    def test_not_fast_skip(self):
+        """Tests without FastSkip are ignored."""
+        assert not opengl.find_skips([('a', utils.Test(['a']))])
+
+    def test_grouped(self, mocker):
+        """Each distinct set of requirements is only tested once."""
+        spy = mocker.spy(opengl.FastSkip, 'test')
+        skips = opengl.find_skips([
+            (six.text_type(i), self._Test([six.text_type(i)],
+                                          gl_required={'foo', 'bar'}))
+            for i in range(10)])
+        assert len(skips) == 10
+        assert spy.call_count == 1
+
+    def test_no_extensions(self):
+        """Without a list of extensions from wflinfo none are required."""
+        with mock.patch('framework.test.opengl.FastSkip.info.gl_extensions',
+                        set()):
+            assert not opengl.find_skips(
+                [('a', self._Test(['a'], gl_required={'foo'}))])
+
+    def test_disabled(self):
+        """Nothing is skipped if fast skipping is disabled."""
+        with mock.patch('framework.test.opengl._DISABLED', True):
+            assert not opengl.find_skips(
+                [('a', self._Test(['a'], gl_required={'foo'}))])
+
+
 class TestFastSkip(object):
     """Tests for the FastSkip class."""
 
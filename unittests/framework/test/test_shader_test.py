@@ -24,6 +24,7 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import os
+import sys
 import textwrap
 try:
     import mock
@@ -33,7 +34,7 @@ except ImportError:
 import pytest
 import six
 
-from framework.test import shader_test
+from framework.test import shader_test, worker
 
 # pylint: disable=invalid-name,no-self-use,protected-access
 
@@ -191,6 +192,23 @@ class TestConfigParsing(object):
         assert test.glsl_version == 1.50
         assert test.gl_required == {'GL_ARB_foobar'}
 
+    def test_stops_after_require(self, tmpdir):
+        """test.shader_test.ShaderTest: the file is not read past the
+        [require] section.
+        """
+        p = tmpdir.join('test.shader_test')
+        p.write_binary(textwrap.dedent("""\
+            [require]
+            GL >= 3.3
+            GL_ARB_foobar
+
+            [vertex shader]
+            """).encode('utf-8') + b'\n' * 65536 + b'\xff\xfe\n')
+        test = shader_test.ShaderTest(six.text_type(p))
+
+        assert test.gl_version == 3.3
+        assert test.gl_required == {'GL_ARB_foobar'}
+
 
 class TestCommand(object):
     """Tests for the command property."""
@@ -274,8 +292,108 @@ class TestMultiShaderTest(object):
         return shader_test.MultiShaderTest(
             [six.text_type(one), six.text_type(two)])
 
+    def test_from_parts(self, inst, tmpdir):
+        """from_parts runs the chosen subtests of several tests."""
+        other = tmpdir.mkdir('other').join('baz.shader_test')
+        other.write(textwrap.dedent("""\
+            [require]
+            GLSL >= 3.0
+
+            [vertex shader]"""))
+        other = shader_test.MultiShaderTest([six.text_type(other)])
+
+        test = shader_test.MultiShaderTest.from_parts(
+            [(inst, ['bar']), (other, ['baz'])])
+        assert [os.path.basename(c) for c in test.command[1:3]] == \
+            ['bar.shader_test', 'baz.shader_test']
+        assert test.expected == ['bar', 'baz']
+        assert dict(test.result.subtests) == {'bar': 'notrun', 'baz': 'notrun'}
+        assert inst.expected == ['foo', 'bar']
+
     def test_resume(self, inst):
         actual = inst._resume(1)  # pylint: disable=protected-access
         assert os.path.basename(actual[0]) == 'shader_runner'
         assert os.path.basename(actual[1]) == 'bar.shader_test'
         assert os.path.basename(actual[2]) == '-auto'
+
+    @pytest.mark.skipif(not worker.AVAILABLE,
+                        reason='workers are not available')
+    class TestWorkers(object):
+        """Tests for running a MultiShaderTest with persistent workers."""
+
+        _RUNNER = textwrap.dedent("""\
+            #!{}
+            import os
+            import sys
+
+            assert '-stdin' in sys.argv
+            for i, line in enumerate(iter(sys.stdin.readline, '')):
+                name = os.path.splitext(os.path.basename(line.strip()))[0]
+                print('PIGLIT TEST: {{}} - {{}}'.format(i, name))
+                sys.stdout.flush()
+                if name == 'crash':
+                    os.abort()
+                print('PIGLIT: {{"subtest": {{"' + name + '" : "pass"}}}}')
+                sys.stdout.flush()
+            """)
+
+        @pytest.fixture(autouse=True)
+        def pool(self):
+            pool = worker.WorkerPool()
+            with mock.patch('framework.test.shader_test.worker.POOL', pool), \
+                    mock.patch('framework.test.shader_test.worker.enabled',
+                               mock.Mock(return_value=True)):
+                yield pool
+            pool.close()
+
+        def make(self, tmpdir, names):
+            files = []
+            for name in names:
+                f = tmpdir.join('{}.shader_test'.format(name))
+                f.write(textwrap.dedent("""\
+                    [require]
+                    GLSL >= 1.10
+
+                    [vertex shader]"""))
+                files.append(six.text_type(f))
+            runner = tmpdir.join('shader_runner')
+            runner.write(self._RUNNER.format(sys.executable))
+            runner.chmod(0o755)
+
+            test = shader_test.MultiShaderTest(files)
+            test._command[0] = six.text_type(runner)
+            return test
+
+        def test_pass(self, tmpdir):
+            test = self.make(tmpdir, ['foo', 'bar'])
+            test.run()
+            assert dict(test.result.subtests) == {'foo': 'pass', 'bar': 'pass'}
+            assert len(test.result.pid) == 1
+
+        def test_command(self, tmpdir, pool):
+            """The worker is run with the arguments of the command, and
+            -stdin.
+            """
+            test = self.make(tmpdir, ['foo', 'bar'])
+            with mock.patch.object(pool, 'get', wraps=pool.get) as get:
+                test.run()
+            assert get.call_args[0][0] == \
+                [test._command[0], '-auto', '-report-subtests', '-stdin']
+
+        def test_crash(self, tmpdir):
+            """A crash is recorded, and the rest of the tests are run by a new
+            worker.
+            """
+            test = self.make(tmpdir, ['foo', 'crash', 'bar'])
+            test.run()
+            assert dict(test.result.subtests) == \
+                {'foo': 'pass', 'crash': 'crash', 'bar': 'pass'}
+            assert len(test.result.pid) == 2
+
+        def test_reused(self, tmpdir, pool):
+            """The worker is given back to the pool for the next test."""
+            test = self.make(tmpdir, ['foo', 'bar'])
+            test.run()
+            other = self.make(tmpdir, ['foo', 'bar'])
+            other.run()
+            assert test.result.pid == other.result.pid
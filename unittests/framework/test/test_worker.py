@@ -0,0 +1,173 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the worker module."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import os
+import sys
+import textwrap
+
+import pytest
+import six
+
+from framework.test import worker
+
+# pylint: disable=no-self-use,redefined-outer-name,protected-access
+
+pytestmark = pytest.mark.skipif(not worker.AVAILABLE,
+                                reason='workers are not available')
+
+_SCRIPT = textwrap.dedent("""\
+    import os
+    import sys
+    import time
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        name = line.strip()
+        if name == 'exit':
+            sys.exit(3)
+        if name == 'hang':
+            time.sleep(60)
+        sys.stderr.write('err ' + name + '\\n')
+        sys.stderr.flush()
+        sys.stdout.write('start ' + name + '\\n')
+        sys.stdout.write('done ' + name + '\\n')
+        sys.stdout.flush()
+    """)
+
+
+def _is_done(line):
+    return line.startswith('done')
+
+
+@pytest.fixture
+def command(tmpdir):
+    script = tmpdir.join('worker.py')
+    script.write(_SCRIPT)
+    return [sys.executable, six.text_type(script)]
+
+
+class TestWorker(object):
+    """Tests for the Worker class."""
+
+    @pytest.fixture
+    def inst(self, command):
+        inst = worker.Worker(command)
+        yield inst
+        inst.kill()
+
+    def test_run(self, inst):
+        assert inst.run('foo', _is_done, 10) == \
+            ('start foo\ndone foo\n', 'err foo\n', None)
+
+    def test_reused(self, inst):
+        """The same process runs one test after another."""
+        inst.run('foo', _is_done, 10)
+        assert inst.run('bar', _is_done, 10) == \
+            ('start bar\ndone bar\n', 'err bar\n', None)
+        assert inst.alive
+
+    def test_err_emptied(self, inst):
+        """The stderr file is emptied after each test."""
+        inst.run('foo', _is_done, 10)
+        assert inst.run('bar', _is_done, 10)[1] == 'err bar\n'
+        assert os.fstat(inst._err.fileno()).st_size == 0
+
+    def test_exit(self, inst):
+        """The returncode is returned when the worker exits."""
+        assert inst.run('exit', _is_done, 10)[2] == 3
+        assert not inst.alive
+
+    def test_timeout(self, inst):
+        with pytest.raises(worker.WorkerTimeout):
+            inst.run('hang', _is_done, 0.5)
+        assert not inst.alive
+
+    def test_close(self, inst):
+        inst.close()
+        assert not inst.alive
+
+    def test_env(self, command):
+        """The environment is passed to the worker."""
+        inst = worker.Worker(
+            command[:1] + ['-c', 'import os; print(os.environ["FOO"])'],
+            env=dict(os.environ, FOO='bar'))
+        assert inst.run('', _is_done, 10) == ('bar\n', '', 0)
+
+
+class TestWorkerPool(object):
+    """Tests for the WorkerPool class."""
+
+    @pytest.fixture
+    def pool(self):
+        pool = worker.WorkerPool()
+        yield pool
+        pool.close()
+
+    def test_reuse(self, pool, command):
+        """An idle worker is handed out again."""
+        first = pool.get(command)
+        pool.put(first)
+        assert pool.get(command) is first
+
+    def test_busy(self, pool, command):
+        """A worker that is in use isn't handed out."""
+        first = pool.get(command)
+        assert pool.get(command) is not first
+
+    def test_dead(self, pool, command):
+        """A worker that died isn't handed out again."""
+        first = pool.get(command)
+        first.run('exit', _is_done, 10)
+        pool.put(first)
+        assert pool.get(command) is not first
+
+    def test_max_tests(self, command):
+        """A worker that ran max_tests tests is replaced."""
+        pool = worker.WorkerPool(max_tests=2)
+        try:
+            first = pool.get(command)
+            first.run('foo', _is_done, 10)
+            pool.put(first)
+            assert pool.get(command) is first
+            first.run('bar', _is_done, 10)
+            pool.put(first)
+            assert not first.alive
+            assert pool.get(command) is not first
+        finally:
+            pool.close()
+
+    def test_env(self, pool, command):
+        """Workers with a different environment aren't interchangeable."""
+        first = pool.get(command, env=dict(os.environ, FOO='bar'))
+        pool.put(first)
+        assert pool.get(command, env=dict(os.environ, FOO='baz')) is not first
+
+    def test_close(self, pool, command):
+        first = pool.get(command)
+        pool.put(first)
+        pool.close()
+        assert not first.alive
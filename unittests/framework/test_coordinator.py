@@ -0,0 +1,188 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the coordinator module."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import socket
+import threading
+import time
+
+import pytest
+
+from framework import coordinator
+from framework import exceptions
+from framework import profile
+from framework import results
+from framework import status
+from framework.options import OPTIONS
+from . import utils
+
+# pylint: disable=no-self-use,redefined-outer-name
+
+
+@pytest.yield_fixture(autouse=True)
+def dry_run():
+    OPTIONS.execute = False
+    yield
+    OPTIONS.clear()
+
+
+@pytest.fixture
+def inst(mocker):
+    inst = profile.TestProfile()
+    for name in 'abcdef':
+        inst.test_list[name] = utils.Test([name], run_concurrent=name != 'b')
+    mocker.patch('framework.coordinator.profile.load_test_profile',
+                 return_value=inst)
+    return inst
+
+
+def _start(inst, heartbeat=coordinator.HEARTBEAT):
+    """Run a coordinator for inst in a thread."""
+    coord = coordinator.Coordinator(('127.0.0.1', 0), {'profiles': ['foo']},
+                                    heartbeat=heartbeat)
+    backend = utils.Backend()
+    thread = threading.Thread(target=coord.run,
+                              args=([inst], 'dummy', backend))
+    thread.daemon = True
+    thread.start()
+    return coord, backend, thread
+
+
+def _worker(address):
+    thread = threading.Thread(target=coordinator.work, args=(address, ))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _take(address, count):
+    """Connect like a worker and take count tests, without running them."""
+    conn = coordinator._Connection(  # pylint: disable=protected-access
+        socket.create_connection(address))
+    conn.send('hello')
+    conn.receive()
+    conn.send('request', count=count)
+    return conn, conn.receive()['tests']
+
+
+def _dies_on(address, name):
+    """Act like workers that run one test at a time, and die on name.
+
+    Each time a worker dies another connects in its place, until there are
+    no tests left.
+    """
+    while True:
+        conn = coordinator._Connection(  # pylint: disable=protected-access
+            socket.create_connection(address))
+        conn.send('hello')
+        conn.receive()
+        while True:
+            conn.send('request', count=1)
+            message = conn.receive()
+            if message['type'] == 'wait':
+                time.sleep(0.1)
+                continue
+            if not message['tests']:
+                conn.close()
+                return
+            index, each = message['tests'][0]
+            if each == name:
+                conn.close()
+                break
+            conn.send('result', index=index, name=each,
+                      result=results.TestResult(status.PASS), status='pass')
+
+
+class TestParseAddress(object):
+    """Tests for the parse_address function."""
+
+    def test_address(self):
+        assert coordinator.parse_address('foo:1234') == ('foo', 1234)
+
+    def test_no_host(self):
+        """A missing host is localhost."""
+        assert coordinator.parse_address(':1234') == ('localhost', 1234)
+
+    def test_invalid(self):
+        with pytest.raises(exceptions.PiglitFatalError):
+            coordinator.parse_address('foo')
+
+
+class TestCoordinator(object):
+    """Tests for the Coordinator class and the work function."""
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_all_written(self, inst, workers):
+        """Every test is written once, whichever worker ran it."""
+        coord, backend, thread = _start(inst)
+        for worker in [_worker(coord.address) for _ in range(workers)]:
+            worker.join(10)
+        thread.join(10)
+        assert not thread.is_alive()
+        assert sorted(backend.results) == list('abcdef')
+
+    def test_disconnected(self, inst):
+        """The tests of a worker that disconnects are handed out again."""
+        coord, backend, thread = _start(inst)
+        conn, tests = _take(coord.address, 4)
+        assert len(tests) == 4
+        conn.close()
+
+        _worker(coord.address).join(10)
+        thread.join(10)
+        assert sorted(backend.results) == list('abcdef')
+
+    def test_heartbeat(self, inst):
+        """The tests of a worker that stops sending heartbeats are handed out
+        again, although it's still connected.
+        """
+        coord, backend, thread = _start(inst, heartbeat=0.1)
+        conn, tests = _take(coord.address, 6)
+        assert len(tests) == 6
+
+        _worker(coord.address).join(10)
+        thread.join(10)
+        conn.close()
+        assert sorted(backend.results) == list('abcdef')
+
+    def test_dies_every_time(self, inst):
+        """A test that kills every worker it is handed to is written as a
+        crash, and the run finishes.
+        """
+        coord, backend, thread = _start(inst)
+        _dies_on(coord.address, 'c')
+        thread.join(10)
+        assert not thread.is_alive()
+        assert sorted(backend.results) == list('abcdef')
+        assert backend.results['c'].result == status.CRASH
+        assert backend.results['d'].result == status.PASS
+
+    def test_no_tests(self):
+        """Stops listening when there are no tests to hand out."""
+        coord = coordinator.Coordinator(('127.0.0.1', 0), {'profiles': []})
+        address = coord.address
+        with pytest.raises(exceptions.PiglitUserError):
+            coord.run([profile.TestProfile()], 'dummy', utils.Backend())
+        with pytest.raises(socket.error):
+            socket.create_connection(address)
@@ -201,6 +201,33 @@ class TestPiglitConfig(object):
         assert self.conf.safe_get('invalid', 'invalid', fallback='foo') == 'foo'
 
 
+class TestGetCachePath(object):
+    """Tests for core.get_cache_path."""
+
+    @skip.posix
+    def test_xdg_cache_home(self, mocker, tmpdir):
+        """core.get_cache_path: defaults to $XDG_CACHE_HOME/piglit."""
+        mocker.patch('framework.core.os.environ',
+                     new={'XDG_CACHE_HOME': six.text_type(tmpdir)})
+        assert core.get_cache_path(None, 'foo') == \
+            os.path.join(six.text_type(tmpdir), 'piglit', 'foo')
+
+    @skip.posix
+    def test_no_home(self, mocker):
+        """core.get_cache_path: doesn't use a literal $HOME if HOME is unset.
+        """
+        mocker.patch('framework.core.os.environ', new={})
+        assert '$HOME' not in core.get_cache_path(None)
+
+    def test_value(self):
+        """core.get_cache_path: the value is used if set."""
+        assert core.get_cache_path('foo', 'bar') == 'foo'
+
+    def test_none(self):
+        """core.get_cache_path: returns None if the cache is disabled."""
+        assert core.get_cache_path('None') is None
+
+
 class TestCheckDir(object):
     """Tests for core.check_dir."""
 
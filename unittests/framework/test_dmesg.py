@@ -29,7 +29,9 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import collections
+import pickle
 import re
+import threading
 try:
     import mock
 except ImportError:
@@ -341,8 +343,8 @@ def _name_get_dmesg(value):
         return 'real' if not value else 'dummy'
     elif isinstance(value, six.text_type):
         return value
-    elif isinstance(value, dmesg.BaseDmesg):
-        return repr(value)
+    elif isinstance(value, type) and issubclass(value, dmesg.BaseDmesg):
+        return value.__name__
     else:
         raise Exception('unreachable')
 
@@ -350,25 +352,166 @@ def _name_get_dmesg(value):
 class TestGetDmesg(object):
     """Tests for get_dmesg factory."""
 
+    # The skip marks can't be applied to single parameters with the versions
+    # of pytest supported, so the linux cases are a test of their own.
+    @staticmethod
+    def _do_test(platform, dummy, expected, mocker):
+        mocker.patch('framework.dmesg.sys.platform', platform)
+        # Use LinuxDmesg, as happens when /dev/kmsg can't be read.
+        mocker.patch('framework.dmesg.KmsgDmesg',
+                     mock.Mock(side_effect=OSError))
+
+        with mock.patch('framework.dmesg.subprocess.check_output',
+                        mock.Mock(return_value=b'[1.0]foo')):
+            actual = dmesg.get_dmesg(not_dummy=dummy)
+
+        # We don't want a subclass, we want the *exact* class. This is a
+        # unittest after all
+        assert type(actual) == expected  # pylint: disable=unidiomatic-typecheck
+
     @pytest.mark.parametrize(
         'platform,dummy,expected',
         [
             ('win32', False, dmesg.DummyDmesg),
             ('win32', True, dmesg.DummyDmesg),
-            skip.linux(('linux', False, dmesg.DummyDmesg)),
-            skip.linux(('linux', True, dmesg.LinuxDmesg)),
         ],
         ids=_name_get_dmesg)
     def test_get_dmesg(self, platform, dummy, expected, mocker):
         """Test that get_dmesg returns the expected dmesg type on variuos
         platforms with various configurations.
         """
-        mocker.patch('framework.dmesg.sys.platform', platform)
+        self._do_test(platform, dummy, expected, mocker)
 
-        with mock.patch('framework.dmesg.subprocess.check_output',
-                        mock.Mock(return_value=b'[1.0]foo')):
-            actual = dmesg.get_dmesg(not_dummy=dummy)
+    @skip.linux
+    @pytest.mark.parametrize(
+        'platform,dummy,expected',
+        [
+            ('linux', False, dmesg.DummyDmesg),
+            ('linux', True, dmesg.LinuxDmesg),
+        ],
+        ids=_name_get_dmesg)
+    def test_get_dmesg_linux(self, platform, dummy, expected, mocker):
+        """Test that get_dmesg returns the expected dmesg type on linux with
+        various configurations.
+        """
+        self._do_test(platform, dummy, expected, mocker)
 
-        # We don't want a subclass, we want the *exact* class. This is a
-        # unittest after all
-        assert type(actual) == expected  # pylint: disable=unidiomatic-typecheck
+    @skip.linux
+    def test_get_dmesg_kmsg(self, mocker):
+        """get_dmesg returns a KmsgDmesg if /dev/kmsg can be read."""
+        kmsg = mocker.patch('framework.dmesg.KmsgDmesg',
+                            mock.Mock(return_value=mock.sentinel.kmsg))
+        assert dmesg.get_dmesg() is mock.sentinel.kmsg
+        kmsg.assert_called_once_with()
+
+
+class TestKmsgDmesg(object):
+    """Tests for the KmsgDmesg class, reading from a fake /dev/kmsg."""
+
+    @pytest.fixture
+    def kmsg(self, tmpdir):
+        p = tmpdir.join('kmsg')
+        p.write(b'3,0,1000,-;before\n', mode='wb')
+        return p
+
+    @pytest.fixture
+    def inst(self, kmsg):
+        inst = dmesg.KmsgDmesg(six.text_type(kmsg))
+        yield inst
+        inst.close()
+
+    @staticmethod
+    def _log(kmsg, seq, message, level=3):
+        kmsg.write('{},{},{},-;{}\n'.format(level, seq, seq * 1000000,
+                                            message).encode('utf-8'),
+                   mode='ab')
+
+    def test_messages(self, kmsg, inst):
+        """Messages logged during the test are added to the result."""
+        inst.update_dmesg()
+        self._log(kmsg, 1, 'during')
+        result = inst.update_result(results.TestResult('pass'))
+
+        assert result.result is status.DMESG_WARN
+        assert result.dmesg == '[    1.000000] during'
+
+    def test_before(self, kmsg, inst):
+        """Messages logged before the test aren't added to the result."""
+        self._log(kmsg, 1, 'before')
+        inst.update_dmesg()
+        result = inst.update_result(results.TestResult('pass'))
+
+        assert result.result is status.PASS
+
+    def test_level(self, kmsg, inst):
+        """Info and debug messages are ignored, like LinuxDmesg does."""
+        inst.update_dmesg()
+        self._log(kmsg, 1, 'info', level=6)
+        self._log(kmsg, 2, 'debug', level=7)
+        result = inst.update_result(results.TestResult('pass'))
+
+        assert result.result is status.PASS
+
+    def test_continuation(self, kmsg, inst):
+        """The key/value lines that continue a record are ignored."""
+        inst.update_dmesg()
+        self._log(kmsg, 1, 'during')
+        kmsg.write(b' DEVICE=+drm:card0\n', mode='ab')
+        result = inst.update_result(results.TestResult('pass'))
+
+        assert result.dmesg == '[    1.000000] during'
+
+    def test_regex(self, kmsg, inst):
+        """The regex is applied to the messages."""
+        inst.regex = re.compile('ERROR')
+        inst.update_dmesg()
+        self._log(kmsg, 1, 'nothing to see')
+        result = inst.update_result(results.TestResult('pass'))
+
+        assert result.result is status.PASS
+
+    def test_pruned(self, kmsg, inst):
+        """Messages are dropped once no test needs them."""
+        inst.update_dmesg()
+        self._log(kmsg, 1, 'during')
+        inst.update_result(results.TestResult('pass'))
+
+        assert not inst._records  # pylint: disable=protected-access
+
+    def test_threads(self, kmsg, inst):
+        """Each thread gets the messages logged since its test started."""
+        started = threading.Event()
+        logged = threading.Event()
+        result = results.TestResult('pass')
+
+        def other():
+            inst.update_dmesg()
+            started.set()
+            logged.wait()
+            inst.update_result(result)
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        started.wait()
+        self._log(kmsg, 1, 'first')
+        inst.update_dmesg()
+        self._log(kmsg, 2, 'second')
+        logged.set()
+        thread.join()
+        mine = inst.update_result(results.TestResult('pass'))
+
+        assert result.dmesg == '[    1.000000] first\n[    2.000000] second'
+        assert mine.dmesg == '[    2.000000] second'
+
+    def test_pickle(self, kmsg, inst):
+        """A copy can be sent to a worker process, and doesn't read the
+        kernel log there.
+        """
+        inst.regex = re.compile('ERROR')
+        copy = pickle.loads(pickle.dumps(inst))
+        copy.update_dmesg()
+        self._log(kmsg, 1, 'ERROR')
+        result = copy.update_result(results.TestResult('pass'))
+
+        assert copy.regex.pattern == 'ERROR'
+        assert result.result is status.PASS
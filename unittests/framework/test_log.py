@@ -24,11 +24,13 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import collections
+import json
 import sys
 import threading
 
 import pytest
 import six
+from six.moves.urllib.request import Request, urlopen
 
 import framework.log as log
 
@@ -197,3 +199,108 @@ class TestDummyLog(object):
 
             actual = sys.stdout.read()
             assert actual == b''
+
+
+class TestHTTPLog(object):
+    """Tests for the HTTPLog and HTTPLogServer classes."""
+
+    @staticmethod
+    def make_manager(mocker, linger):
+        mocker.patch('framework.log.PIGLIT_CONFIG.safe_get',
+                     lambda section, key, fallback=None:
+                     linger if key == 'linger' else 0)
+        return log.LogManager('http', 2)
+
+    @pytest.yield_fixture
+    def manager(self, mocker):
+        manager = self.make_manager(mocker, 30)
+        yield manager
+        # Make sure the server stops even if a test failed
+        manager.get().summary()
+        manager.log_server._httpd.delivered.set()
+        manager.log_server.join(10)
+
+    @staticmethod
+    def url(manager, path):
+        return 'http://127.0.0.1:{}{}'.format(manager.log_server.address[1],
+                                              path)
+
+    @staticmethod
+    def run_test(manager, name, status='pass'):
+        inst = manager.get()
+        inst.start(name)
+        inst.log(status)
+
+    def test_summary(self, manager):
+        """/summary returns the counters."""
+        self.run_test(manager, 'a')
+        summary = json.loads(
+            urlopen(self.url(manager, '/summary')).read().decode('utf-8'))
+        assert summary['complete'] == 1
+        assert summary['total'] == 2
+        assert summary['results'] == {'pass': 1}
+        assert summary['done'] is False
+        assert summary['eta'] > 0
+
+    def test_summary_lock_free(self, manager):
+        """/summary doesn't wait for the state lock."""
+        with manager._state_lock:
+            summary = json.loads(urlopen(
+                self.url(manager, '/summary'), timeout=5).read().decode(
+                    'utf-8'))
+        assert summary['complete'] == 0
+
+    def test_stream(self, manager):
+        """/stream sends each completed test as it completes, and then the
+        summary.
+        """
+        stream = urlopen(self.url(manager, '/stream'), timeout=5)
+        self.run_test(manager, 'a')
+        assert json.loads(stream.readline().decode('utf-8'))['name'] == 'a'
+        self.run_test(manager, 'b', 'fail')
+        event = json.loads(stream.readline().decode('utf-8'))
+        assert (event['name'], event['result']) == ('b', 'fail')
+
+        end = json.loads(stream.readline().decode('utf-8'))
+        assert end['done'] is True
+        assert end['results'] == {'pass': 1, 'fail': 1}
+
+    def test_events(self, manager):
+        """/events sends server-sent events after Last-Event-ID."""
+        self.run_test(manager, 'a')
+        self.run_test(manager, 'b')
+        request = Request(self.url(manager, '/events'),
+                          headers={'Last-Event-ID': '0'})
+        data = urlopen(request, timeout=5).read().decode('utf-8')
+        events = [e for e in data.split('\n\n') if e]
+        assert len(events) == 2
+        assert events[0].startswith('id: 1\ndata: ')
+        assert json.loads(events[0].split('data: ')[1])['name'] == 'b'
+        assert events[1].startswith('event: end\n')
+
+    def test_serves_after_run(self, manager):
+        """The server keeps running after the run is done, until the results
+        have been sent.
+        """
+        self.run_test(manager, 'a')
+        self.run_test(manager, 'b')
+        manager.get().summary()
+        manager.log_server.join(0.5)
+        assert manager.log_server.is_alive()
+
+        summary = json.loads(
+            urlopen(self.url(manager, '/summary')).read().decode('utf-8'))
+        assert summary['done'] is True
+        manager.log_server.join(10)
+        assert not manager.log_server.is_alive()
+
+    def test_no_client(self, mocker):
+        """The server stops after linger seconds if no client fetches the
+        final summary.
+        """
+        manager = self.make_manager(mocker, 0.5)
+        self.run_test(manager, 'a')
+        self.run_test(manager, 'b')
+        manager.get().summary()
+        manager.log_server.join(10)
+        assert not manager.log_server.is_alive()
@@ -26,6 +26,7 @@ This provides tests for the framework.monitoring modules.
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import time
 
 import pytest
 import six
@@ -52,6 +53,9 @@ class TestMonitoring(object):
         self.error_contents = r'BUG:bar\n'
         self.monitoring = monitoring.Monitoring(False)
 
+    def teardown(self):
+        self.monitoring.close()
+
     @skip.linux
     def test_delete_rule(self, tmpdir):
         """monitoring.Monitoring: add and delete rule."""
@@ -146,6 +150,8 @@ class TestMonitoring(object):
     @skip.linux
     def test_dmesg_error(self, mocker):
         """monitoring.Monitoring: error found on the dmesg."""
+        # Run dmesg, as happens when /dev/kmsg can't be read.
+        mocker.patch('framework.monitoring._KMSG', '/nonexistent/kmsg')
         mocker.patch('framework.dmesg.subprocess.check_output',
                      mocker.Mock(return_value=b'[1.0]This\n[2.0]is\n[3.0]dmesg'))
         self.monitoring.add_rule('no_error_file',
@@ -163,6 +169,8 @@ class TestMonitoring(object):
     @skip.linux
     def test_dmesg_no_error(self, mocker):
         """monitoring.Monitoring: no error found on the dmesg."""
+        # Run dmesg, as happens when /dev/kmsg can't be read.
+        mocker.patch('framework.monitoring._KMSG', '/nonexistent/kmsg')
         mocker.patch('framework.dmesg.subprocess.check_output',
                      mocker.Mock(return_value=b'[1.0]This\n[2.0]is\n[3.0]dmesg'))
         self.monitoring.add_rule('no_error_file',
@@ -176,3 +184,125 @@ class TestMonitoring(object):
         self.monitoring.check_monitoring()
 
         assert self.monitoring.abort_needed is False
+
+    @skip.linux
+    def test_kmsg_error(self, tmpdir, mocker):
+        """monitoring.Monitoring: error found in /dev/kmsg."""
+        p = tmpdir.join('kmsg')
+        p.write(b'3,0,1000,-;*ERROR* before\n', mode='wb')
+        mocker.patch('framework.monitoring._KMSG', six.text_type(p))
+        self.monitoring.add_rule('error_kmsg',
+                                 'dmesg',
+                                 '--level emerg,alert,crit,err',
+                                 self.regex)
+        self.monitoring.check_monitoring()
+        assert self.monitoring.abort_needed is False
+
+        p.write(b'3,1,2000,-;*ERROR* after\n', mode='ab')
+        self.monitoring.check_monitoring()
+
+        assert self.monitoring.abort_needed is True
+        assert self.monitoring.error_message == \
+            'From the rule error_kmsg:\n[    0.002000] *ERROR* after'
+
+    @skip.linux
+    def test_kmsg_level(self, tmpdir, mocker):
+        """monitoring.Monitoring: messages of other levels in /dev/kmsg are
+        ignored.
+        """
+        p = tmpdir.join('kmsg')
+        p.write(b'', mode='wb')
+        mocker.patch('framework.monitoring._KMSG', six.text_type(p))
+        self.monitoring.add_rule('error_kmsg',
+                                 'dmesg',
+                                 '--level emerg,alert,crit,err',
+                                 self.regex)
+
+        p.write(b'4,1,2000,-;*ERROR* a warning\n', mode='ab')
+        self.monitoring.check_monitoring()
+
+        assert self.monitoring.abort_needed is False
+
+    @skip.linux
+    def test_file_appended(self, tmpdir):
+        """monitoring.Monitoring: lines appended to a file are read."""
+        p = tmpdir.join('foo')
+        p.write('BUG: old\n')
+        self.monitoring.add_rule('error_file',
+                                 'file',
+                                 six.text_type(p),
+                                 self.regex)
+        p.write('foo\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.abort_needed is False
+
+        p.write('BUG: new\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.error_message == \
+            'From the rule error_file:\nBUG: new'
+
+    @skip.linux
+    def test_shared_source(self, tmpdir):
+        """monitoring.Monitoring: rules on the same file share a source, and
+        report which rule matched.
+        """
+        p = tmpdir.join('foo')
+        p.write('foo bar\n')
+        self.monitoring.add_rule('one', 'file', six.text_type(p), 'foo')
+        self.monitoring.add_rule('two', 'file', six.text_type(p), 'BUG:')
+
+        assert len(self.monitoring._sources) == 1  # pylint: disable=protected-access
+
+        p.write('BUG: bar\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.error_message == \
+            'From the rule two:\nBUG: bar'
+
+    @skip.linux
+    def test_delete_shared_rule(self, tmpdir):
+        """monitoring.Monitoring: deleting one of the rules on a source keeps
+        the others.
+        """
+        p = tmpdir.join('foo')
+        p.write('foo bar\n')
+        self.monitoring.add_rule('one', 'file', six.text_type(p), 'foo')
+        self.monitoring.add_rule('two', 'file', six.text_type(p), 'BUG:')
+        self.monitoring.delete_rule('one')
+
+        p.write('foo\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.abort_needed is False
+
+        p.write('BUG: bar\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.abort_needed is True
+
+    @skip.linux
+    def test_uncombinable(self, tmpdir):
+        """monitoring.Monitoring: rules with global flags are still matched.
+        """
+        p = tmpdir.join('foo')
+        p.write('foo bar\n')
+        self.monitoring.add_rule('one', 'file', six.text_type(p), 'foo')
+        self.monitoring.add_rule('two', 'file', six.text_type(p), '(?i)bug:')
+
+        p.write('BUG: bar\n', mode='a')
+        self.monitoring.check_monitoring()
+        assert self.monitoring.error_message == \
+            'From the rule two:\nBUG: bar'
+
+    @skip.linux
+    @pytest.mark.timeout(5)
+    def test_background(self, tmpdir):
+        """monitoring.Monitoring: errors are found without a test finishing.
+        """
+        p = tmpdir.join('foo')
+        p.write('foo bar\n')
+        self.monitoring.add_rule('error_file',
+                                 'file',
+                                 six.text_type(p),
+                                 self.regex)
+        p.write('BUG: bar\n', mode='a')
+
+        while not self.monitoring.abort_needed:
+            time.sleep(0.01)
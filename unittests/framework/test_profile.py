@@ -23,6 +23,12 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import collections
+import textwrap
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 import pytest
 import six
@@ -30,7 +36,11 @@ import six
 from framework import exceptions
 from framework import grouptools
 from framework import profile
+from framework import scheduling
+from framework import status
+from framework.options import OPTIONS
 from framework.test.gleantest import GleanTest
+from framework.test.shader_test import MultiShaderTest
 from . import utils
 
 # pylint: disable=invalid-name,no-self-use,protected-access
@@ -118,6 +128,60 @@ class TestTestProfile(object):
             assert fixture.test_list is not new.test_list
 
 
+    class TestItertests(object):
+        """Tests for the itertests method."""
+
+        @pytest.fixture
+        def inst(self):
+            inst = profile.TestProfile()
+            self.made = []
+            for name in ['foo', 'bar', 'baz']:
+                inst.test_list.add_factory(name, self._factory(name))
+            return inst
+
+        def _factory(self, name):
+            def factory():
+                self.made.append(name)
+                return utils.Test([name])
+            return factory
+
+        def test_regex_filtered_not_constructed(self, inst):
+            """Tests removed by a RegexFilter are never constructed."""
+            inst.filters.append(profile.RegexFilter(['ba']))
+            inst.filters.append(profile.RegexFilter(['z'], inverse=True))
+            assert [n for n, _ in inst.itertests()] == ['bar']
+            assert self.made == ['bar']
+
+        def test_exclude_filtered_not_constructed(self, inst):
+            """Tests removed by an ExcludeFilter are never constructed."""
+            inst.filters.append(profile.ExcludeFilter({'foo', 'baz'}))
+            assert [n for n, _ in inst.itertests()] == ['bar']
+            assert self.made == ['bar']
+
+        def test_filter_order(self, inst):
+            """Filters other than RegexFilters see only the tests that pass the
+            RegexFilters, in order, even if they were added before them.
+            """
+            seen = []
+            inst.filters.append(lambda n, t: seen.append(n) or True)
+            inst.filters.append(profile.RegexFilter(['ba']))
+            assert [n for n, _ in inst.itertests()] == ['bar', 'baz']
+            assert seen == ['bar', 'baz']
+
+        def test_forced(self, inst):
+            """Only the tests in the forced list are constructed."""
+            inst.forced_test_list = ['baz', 'foo']
+            assert [n for n, _ in inst.itertests()] == ['baz', 'foo']
+            assert self.made == ['baz', 'foo']
+
+        def test_forced_missing(self, inst):
+            """Missing forced tests are notrun with ignore_missing."""
+            inst.forced_test_list = ['foo', 'oink']
+            inst.options['ignore_missing'] = True
+            tests = dict(inst.itertests())
+            assert tests['oink'].result.result is status.NOTRUN
+
+
 class TestTestDict(object):
     """Tests for the TestDict object."""
 
@@ -146,6 +210,59 @@ class TestTestDict(object):
         with pytest.raises(exceptions.PiglitFatalError):
             self.test['foo'] = utils.Test(['foo', 'bar'])
 
+    class TestAddFactory(object):
+        """Tests for TestDict.add_factory."""
+
+        @pytest.fixture
+        def test(self):
+            return profile.TestDict()
+
+        def test_lazy(self, test):
+            """The factory isn't called until the test is looked up."""
+            factory = mock.Mock(return_value=utils.Test(['foo']))
+            test.add_factory('foo', factory)
+            assert 'foo' in test
+            assert list(test) == ['foo']
+            assert not factory.called
+
+            assert test['foo'].command == ['foo']
+            assert factory.call_count == 1
+
+        def test_constructed_once(self, test):
+            """The constructed test is kept, so changes to it stick."""
+            test.add_factory('foo', lambda: utils.Test(['foo']))
+            test['foo'].env['bar'] = 'baz'
+            assert test['foo'].env['bar'] == 'baz'
+
+        def test_case_insensitive(self, test):
+            """Keys are lowered."""
+            test.add_factory('Foo', lambda: utils.Test(['foo']))
+            assert test['fOO'].command == ['foo']
+
+        def test_not_a_test(self, test):
+            """A factory not returning a Test is an error."""
+            test.add_factory('foo', lambda: 'foo')
+            with pytest.raises(exceptions.PiglitFatalError):
+                test['foo']  # pylint: disable=pointless-statement
+
+        def test_key_not_string(self, test):
+            """Keys must be strings."""
+            with pytest.raises(exceptions.PiglitFatalError):
+                test.add_factory(b'foo', lambda: utils.Test(['foo']))
+
+        def test_reassignment(self, test):
+            """Reassigning a factory raises an exception."""
+            test.add_factory('foo', lambda: utils.Test(['foo']))
+            with pytest.raises(exceptions.PiglitFatalError):
+                test.add_factory('foo', lambda: utils.Test(['bar']))
+
+        def test_allow_reassignment(self, test):
+            """Factories can replace tests with allow_reassignment."""
+            test['foo'] = utils.Test(['foo'])
+            with test.allow_reassignment:
+                test.add_factory('foo', lambda: utils.Test(['bar']))
+            assert test['foo'].command == ['bar']
+
     class TestAllowReassignment(object):
         """Tests for TestDict.allow_reassignment."""
 
@@ -305,3 +422,174 @@ class TestRegexFilter(object):
             """Returns False when the test matches any regex."""
             test = profile.RegexFilter([r'fob', r'bar'], inverse=True)
             assert test('foobob', None)
+
+
+def test_close_readers(mocker):
+    """profile.close_readers: closes each shared dmesg and monitor once."""
+    dmesg = mocker.Mock()
+    monitor = mocker.Mock()
+    profiles = []
+    for _ in range(2):
+        p = profile.TestProfile()
+        p.options['dmesg'] = dmesg
+        p.options['monitor'] = monitor
+        profiles.append(p)
+
+    profile.close_readers(profiles)
+
+    dmesg.close.assert_called_once_with()
+    monitor.close.assert_called_once_with()
+
+
+class TestRun(object):
+    """Tests for the run function."""
+
+    @pytest.yield_fixture(autouse=True)
+    def dry_run(self):
+        OPTIONS.execute = False
+        yield
+        OPTIONS.clear()
+
+    @pytest.fixture
+    def inst(self):
+        inst = profile.TestProfile()
+        inst.test_list['a'] = utils.Test(['a'], run_concurrent=True)
+        inst.test_list['b'] = utils.Test(['b'], run_concurrent=False)
+        inst.test_list['c'] = utils.Test(['c'], run_concurrent=True)
+        return inst
+
+    @pytest.mark.parametrize('executor', profile.EXECUTORS)
+    @pytest.mark.parametrize('concurrency', ['all', 'none', 'some'])
+    def test_all_written(self, inst, executor, concurrency):
+        """Every test is written to the backend once."""
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, concurrency, executor)
+        assert sorted(backend.results) == ['a', 'b', 'c']
+
+    def test_process_result(self, inst):
+        """Results from worker processes are set on the tests."""
+        OPTIONS.execute = True
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'all', 'process')
+        # utils.Test commands don't exist, so they're skipped
+        assert backend.results['a'].result is status.SKIP
+        assert inst.test_list['a'].result is backend.results['a']
+
+    def test_process_unpicklable(self, inst, capsys):
+        """A test that can't be sent to a worker process is written as a
+        fail rather than dropped.
+        """
+        OPTIONS.execute = True
+        inst.test_list['b'].unpicklable = lambda: None
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'all', 'process')
+        assert sorted(backend.results) == ['a', 'b', 'c']
+        assert backend.results['b'].result is status.FAIL
+        assert backend.results['b'].exception
+        assert backend.results['a'].result is status.SKIP
+
+    def test_no_tests(self):
+        """Raises PiglitUserError if no tests match."""
+        with pytest.raises(exceptions.PiglitUserError):
+            profile.run([profile.TestProfile()], 'dummy', utils.Backend(), 'all')
+
+    @pytest.mark.parametrize('concurrency', ['all', 'none', 'some'])
+    def test_timings(self, inst, concurrency, capsys):
+        """Prints the predicted and actual makespan with timings."""
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, concurrency,
+                    timings={'a': 1.0, 'b': 2.0})
+        assert sorted(backend.results) == ['a', 'b', 'c']
+        assert 'Predicted makespan' in capsys.readouterr()[0]
+
+    def test_exclusive_first(self, inst):
+        """With some concurrency the exclusive tests run first."""
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'some')
+        assert list(backend.results)[0] == 'b'
+
+    def test_exclusive_order_kept(self, inst):
+        """With some concurrency and timings, the exclusive tests keep their
+        profile order.
+        """
+        inst.test_list['d'] = utils.Test(['d'], run_concurrent=False)
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'some',
+                    timings={'b': 1.0, 'd': 2.0})
+        assert list(backend.results)[:2] == ['b', 'd']
+
+    def test_skip_unsupported(self, inst, mocker, capsys):
+        """Tests with unmet requirements are skipped without being run."""
+        OPTIONS.execute = True
+        mocker.patch('framework.profile.find_skips',
+                     return_value=collections.OrderedDict([('b', 'no foo')]))
+        run = mocker.spy(utils.Test, 'run')
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'some')
+
+        assert backend.results['b'].result is status.SKIP
+        assert backend.results['b'].out == 'no foo'
+        assert run.call_count == 2
+        assert 'Skipped 1 tests' in capsys.readouterr()[0]
+
+    @pytest.mark.parametrize('executor', profile.EXECUTORS)
+    def test_batches(self, executor, tmpdir, mocker, capsys):
+        """MultiShaderTests are run in batches planned from the history, and
+        their results are put back together.
+        """
+        OPTIONS.execute = True
+        mocker.patch.dict(OPTIONS.env, {'PIGLIT_PLATFORM': 'foo'})
+
+        def make(name, files):
+            paths = []
+            for f in files:
+                p = tmpdir.ensure(name, '{}.shader_test'.format(f))
+                p.write(textwrap.dedent("""\
+                    [require]
+                    GLSL >= 1.10
+
+                    [vertex shader]"""))
+                paths.append(six.text_type(p))
+            return MultiShaderTest(paths)
+
+        def run(self):
+            for subtest in self.expected:
+                self.result.subtests[subtest] = 'pass'
+
+        run = mocker.patch.object(MultiShaderTest, 'run', autospec=True,
+                                  side_effect=run)
+
+        inst = profile.TestProfile()
+        inst.test_list['x'] = make('x', ['a', 'b', 'c', 'd'])
+        inst.test_list['y'] = make('y', ['e'])
+        history = scheduling.History(
+            {},
+            {grouptools.join('x', 'a'): 20.0,
+             grouptools.join('x', 'b'): 20.0,
+             grouptools.join('x', 'c'): 1.0,
+             grouptools.join('x', 'd'): 5.0,
+             grouptools.join('y', 'e'): 5.0},
+            {grouptools.join('x', 'c')})
+        backend = utils.Backend()
+        profile.run([inst], 'dummy', backend, 'all', executor,
+                    history=history)
+
+        assert sorted(backend.results) == ['x', 'y']
+        assert dict(backend.results['x'].subtests) == \
+            {'a': 'pass', 'b': 'pass', 'c': 'pass', 'd': 'pass'}
+        assert dict(backend.results['y'].subtests) == {'e': 'pass'}
+        assert 'Running 2 shader tests in 3 batches' in \
+            capsys.readouterr()[0]
+        if executor == 'thread':
+            assert run.call_count == 3
+
+    @pytest.mark.parametrize('concurrency, expected', [
+        ('all', ['Concurrent']),
+        ('none', ['Exclusive']),
+        ('some', ['Exclusive', 'Concurrent']),
+    ])
+    def test_phases(self, inst, concurrency, expected, capsys):
+        """Prints the idle time of each phase."""
+        profile.run([inst], 'dummy', utils.Backend(), concurrency)
+        lines = capsys.readouterr()[0].splitlines()
+        assert [l.split()[0] for l in lines if ' phase: ' in l] == expected
@@ -24,6 +24,7 @@
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import collections
 
 import pytest
 import six
@@ -285,6 +286,57 @@ class TestTestResult(object):
             """results.TestResult.to_json: Adds the traceback attribute"""
             assert self.test.traceback == self.json['traceback']
 
+    class TestLazy(object):
+        """Tests for loading the fields of a TestResult lazily."""
+
+        dict_ = {
+            'result': 'fail',
+            'returncode': 1,
+            'out': 'this is some text',
+            'err': 'this is an err',
+            'command': 'foo -auto',
+            'pid': [1934],
+        }
+
+        def test_source_not_read(self, mocker):
+            """The source isn't read unless a lazy field is accessed."""
+            source = mocker.Mock(return_value=self.dict_)
+            test = results.TestResult('pass', source=source)
+            assert test.result == 'pass'
+            assert not source.called
+
+        def test_source_read_once(self, mocker):
+            """The source is only read the first time."""
+            source = mocker.Mock(return_value=self.dict_)
+            test = results.TestResult('pass', source=source)
+            assert test.out == self.dict_['out']
+            assert test.returncode == 1
+            source.assert_called_once_with()
+
+        def test_set_not_replaced(self):
+            """Fields set before the source is read are not replaced."""
+            test = results.TestResult('pass', source=self.dict_)
+            test.out = 'new'
+            assert test.out == 'new'
+            assert test.err == self.dict_['err']
+
+        def test_default(self):
+            """Fields missing from the source have their default value."""
+            test = results.TestResult('pass', source=self.dict_)
+            assert test.dmesg == ''
+            assert test.traceback is None
+
+        def test_default_stored(self):
+            """Mutable defaults are stored."""
+            test = results.TestResult()
+            test.pid.append(1)
+            assert test.pid == [1]
+
+        def test_from_dict(self):
+            """Lazily loaded results are the same as eagerly loaded ones."""
+            assert results.TestResult.from_dict(self.dict_, lazy=True).to_json() \
+                == results.TestResult.from_dict(self.dict_).to_json()
+
     class TestUpdate(object):
         """Tests for TestResult.update."""
 
@@ -457,6 +509,77 @@ class TestTotals(object):
         assert bool(test)
 
 
+class TestMergeTotals(object):
+    """Tests for the merge_totals function."""
+
+    def test_merge(self):
+        """The counts of each group are added together."""
+        one = {'root': results.Totals()}
+        one['root']['pass'] = 1
+        two = {'root': results.Totals(), 'a': results.Totals()}
+        two['root']['pass'] = 2
+        two['a']['fail'] = 1
+
+        merged = results.merge_totals(one, two)
+        assert merged['root']['pass'] == 3
+        assert merged['a']['fail'] == 1
+
+    def test_update(self):
+        """Removing a result with update_totals undoes adding it."""
+        totals = collections.defaultdict(results.Totals)
+        results.update_totals(totals, grouptools.join('a', 'b'),
+                              results.TestResult('pass'))
+        results.update_totals(totals, grouptools.join('a', 'b'),
+                              results.TestResult('pass'), -1)
+        assert not any(totals.values())
+
+
+class TestMergeRuns(object):
+    """Tests for the merge_runs function."""
+
+    @staticmethod
+    def make(name, tests, start, end):
+        run = results.TestrunResult()
+        run.name = name
+        run.options = {'shard': [1, 2]}
+        run.time_elapsed = results.TimeAttribute(start, end)
+        for test, result in tests:
+            run.tests[test] = results.TestResult(result)
+        run.calculate_group_totals()
+        return run
+
+    @pytest.fixture
+    def merged(self):
+        return results.merge_runs(
+            self.make('one', [('a@x', 'pass')], 10.0, 20.0),
+            self.make('two', [('a@y', 'fail'), ('b', 'pass')], 5.0, 15.0))
+
+    def test_tests(self, merged):
+        """The tests of all of the runs are kept."""
+        assert list(merged.tests) == ['a@x', 'a@y', 'b']
+
+    def test_totals(self, merged):
+        """The totals are added together."""
+        assert merged.totals['root']['pass'] == 2
+        assert merged.totals['a']['fail'] == 1
+
+    def test_time_elapsed(self, merged):
+        """time_elapsed spans all of the runs."""
+        assert merged.time_elapsed.start == 5.0
+        assert merged.time_elapsed.end == 20.0
+
+    def test_metadata(self, merged):
+        """The metadata is the first run's, without the shard."""
+        assert merged.name == 'one'
+        assert merged.options['shard'] is None
+
+    def test_duplicate(self):
+        """A test in more than one run is an error."""
+        with pytest.raises(exceptions.PiglitFatalError):
+            results.merge_runs(self.make('one', [('a', 'pass')], 0.0, 1.0),
+                               self.make('two', [('a', 'pass')], 0.0, 1.0))
+
+
 class TestTestrunResult(object):
     """Tests for the TestrunResult class."""
 
@@ -0,0 +1,223 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the framework.scheduling module."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import copy
+import json
+
+import pytest
+
+from framework import grouptools, scheduling
+from .backends import shared
+
+# pylint: disable=no-self-use
+
+
+def test_load_timings(tmpdir):
+    """scheduling.load_timings: returns the duration of each test."""
+    p = tmpdir.join('results.json')
+    p.write(json.dumps(shared.JSON))
+
+    timings = scheduling.load_timings(str(p))
+    assert list(timings) == ['spec@!opengl 1.0@gl-1.0-readpixsanity']
+    assert timings['spec@!opengl 1.0@gl-1.0-readpixsanity'] == \
+        pytest.approx(0.0055957, abs=1e-6)
+
+
+class TestLoadHistory(object):
+    """Tests for the load_history function."""
+
+    @pytest.fixture
+    def history(self, tmpdir):
+        data = copy.deepcopy(shared.JSON)
+        test = copy.deepcopy(
+            data['tests']['spec@!opengl 1.0@gl-1.0-readpixsanity'])
+        test['time'] = {'start': 0.0, 'end': 6.0,
+                        '__type__': 'TimeAttribute'}
+        test['subtests'] = {'a': 'pass', 'b': 'crash', 'c': 'skip',
+                            'd': 'pass', '__type__': 'Subtests'}
+        data['tests']['group'] = test
+        p = tmpdir.join('results.json')
+        p.write(json.dumps(data))
+        return scheduling.load_history(str(p))
+
+    def test_timings(self, history):
+        assert history.timings['group'] == 6.0
+
+    def test_subtests(self, history):
+        """The time is shared between the subtests that ran."""
+        assert history.subtests == {
+            grouptools.join('group', 'a'): 2.0,
+            grouptools.join('group', 'b'): 2.0,
+            grouptools.join('group', 'd'): 2.0,
+        }
+
+    def test_crashed(self, history):
+        assert grouptools.join('group', 'b') in history.crashed
+        assert grouptools.join('group', 'a') not in history.crashed
+
+
+class TestDurations(object):
+    """Tests for the Durations class."""
+
+    def test_known(self):
+        """Returns the timing of known tests."""
+        assert scheduling.Durations({'a': 1.0, 'b': 3.0})['a'] == 1.0
+
+    def test_unknown(self):
+        """Unknown tests are estimated with the mean."""
+        assert scheduling.Durations({'a': 1.0, 'b': 3.0})['c'] == 2.0
+
+    def test_empty(self):
+        """With no timings every test is estimated at 0."""
+        assert scheduling.Durations({})['a'] == 0.0
+
+    def test_set_copies(self):
+        """Setting a duration doesn't change the timings passed in."""
+        timings = {'a': 1.0}
+        durations = scheduling.Durations(timings)
+        durations['b'] = 2.0
+        assert durations['b'] == 2.0
+        assert timings == {'a': 1.0}
+
+
+class TestLongestFirst(object):
+    """Tests for the longest_first function."""
+
+    def test_order(self):
+        """Tests are sorted by decreasing duration."""
+        durations = scheduling.Durations({'a': 1.0, 'b': 5.0, 'c': 3.0})
+        test_list = [('a', None), ('b', None), ('c', None)]
+        assert [n for n, _ in scheduling.longest_first(test_list, durations)] \
+            == ['b', 'c', 'a']
+
+    def test_stable(self):
+        """Tests with the same duration keep their order."""
+        durations = scheduling.Durations({'a': 1.0, 'b': 1.0, 'c': 1.0})
+        test_list = [('c', None), ('a', None), ('b', None)]
+        assert scheduling.longest_first(test_list, durations) == test_list
+
+
+class TestPlanBatches(object):
+    """Tests for the plan_batches function."""
+
+    @staticmethod
+    def plan(tests, timings, target, isolate=frozenset()):
+        durations = scheduling.Durations(
+            {grouptools.join(*k.split('/')): v
+             for k, v in timings.items()})
+        isolate = {grouptools.join(*k.split('/')) for k in isolate}
+        return scheduling.plan_batches(tests, durations, target, isolate)
+
+    def test_split(self):
+        """A test that takes longer than target is split."""
+        assert self.plan([('x', ['a', 'b', 'c'])],
+                         {'x/a': 2, 'x/b': 2, 'x/c': 2}, 4) == \
+            [[('x', ['a', 'b'])], [('x', ['c'])]]
+
+    def test_merge(self):
+        """Short tests share a batch."""
+        assert self.plan([('x', ['a']), ('y', ['b'])],
+                         {'x/a': 1, 'y/b': 1}, 4) == \
+            [[('x', ['a']), ('y', ['b'])]]
+
+    def test_long(self):
+        """A subtest longer than target gets a batch of its own."""
+        assert self.plan([('x', ['a', 'b'])], {'x/a': 10, 'x/b': 1}, 4) == \
+            [[('x', ['a'])], [('x', ['b'])]]
+
+    def test_isolate(self):
+        """Isolated subtests are run on their own."""
+        assert self.plan([('x', ['a', 'b', 'c'])],
+                         {'x/a': 1, 'x/b': 1, 'x/c': 1}, 4, {'x/b'}) == \
+            [[('x', ['b'])], [('x', ['a', 'c'])]]
+
+    def test_same_name(self):
+        """Subtests with the same name are never in the same batch."""
+        assert self.plan([('x', ['a']), ('y', ['a'])],
+                         {'x/a': 1, 'y/a': 1}, 4) == \
+            [[('x', ['a'])], [('y', ['a'])]]
+
+
+class TestShard(object):
+    """Tests for the shard function."""
+
+    def test_partition(self):
+        """Every test is run by exactly one shard."""
+        names = ['t{}'.format(i) for i in range(10)]
+        durations = scheduling.Durations({n: i for i, n in enumerate(names)})
+        shards = [scheduling.shard(names, durations, i, 3) for i in range(3)]
+        assert sum(len(s) for s in shards) == len(names)
+        assert set.union(*shards) == set(names)
+
+    def test_duration(self):
+        """Shards are balanced by duration, not by the number of tests."""
+        durations = scheduling.Durations({'a': 6, 'b': 2, 'c': 2, 'd': 2})
+        assert scheduling.shard('abcd', durations, 0, 2) == {'a'}
+        assert scheduling.shard('abcd', durations, 1, 2) == {'b', 'c', 'd'}
+
+    def test_no_timings(self):
+        """Without timings shards are balanced by the number of tests."""
+        durations = scheduling.Durations({})
+        assert len(scheduling.shard('abcdef', durations, 0, 3)) == 2
+        assert len(scheduling.shard('abcdef', durations, 2, 3)) == 2
+
+    def test_order(self):
+        """The partition doesn't depend on the order of the tests."""
+        durations = scheduling.Durations({'a': 1, 'b': 1, 'c': 2})
+        assert scheduling.shard('abc', durations, 1, 2) == \
+            scheduling.shard('cba', durations, 1, 2)
+
+
+class TestMakespan(object):
+    """Tests for the makespan function."""
+
+    def test_serial(self):
+        """With one slot the makespan is the sum of the durations."""
+        assert scheduling.makespan([1, 2, 3], 1) == 6
+
+    def test_long_last(self):
+        """Starting a long test last leaves the other slots idle."""
+        assert scheduling.makespan([1, 1, 1, 1, 4], 2) == 6
+
+    def test_long_first(self):
+        """Starting a long test first fills in around it."""
+        assert scheduling.makespan([4, 1, 1, 1, 1], 2) == 4
+
+
+class TestPhase(object):
+    """Tests for the Phase class."""
+
+    def test_idle(self):
+        """Idle time is the slot-seconds not spent running tests."""
+        assert scheduling.Phase('concurrent', 4, 8, 2.0, 6.0).idle == 2.0
+
+    def test_utilization(self):
+        """Utilization is the fraction of slot-seconds running tests."""
+        phase = scheduling.Phase('concurrent', 4, 8, 2.0, 6.0)
+        assert phase.utilization == 0.75
+
+    def test_no_time(self):
+        """A phase that took no time doesn't divide by zero."""
+        assert scheduling.Phase('exclusive', 1, 1, 0.0, 0.0).utilization == 0
@@ -31,6 +31,7 @@ from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
 import itertools
+import pickle
 
 import pytest
 import six
@@ -103,6 +104,12 @@ def test_lookup(stat):
     status.status_lookup(stat)
 
 
+@pytest.mark.parametrize('stat', status.ALL, ids=six.text_type)
+def test_pickle(stat):
+    """status.Status: unpickling returns the shared instance."""
+    assert pickle.loads(pickle.dumps(stat)) is stat
+
+
 @pytest.mark.parametrize('new,old', REGRESSIONS)
 def test_regression(new, old):
     assert status.status_lookup(new) < status.status_lookup(old)
@@ -27,6 +27,8 @@ This is only piglit specific data and functions.
 from __future__ import (
     absolute_import, division, print_function, unicode_literals
 )
+import collections
+import contextlib
 
 from framework.test.base import Test as _Test
 
@@ -43,3 +45,19 @@ class Test(_Test):
     def __repr__(self):
         return "Test({}, run_concurrent={})".format(
             self.command, self.run_concurrent)
+
+
+class Backend(object):
+    """A minimal backend that stores results in a dict, in the order they
+    were written.
+    """
+
+    def __init__(self):
+        self.results = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def write_test(self, name):
+        def finish(value):
+            self.results[name] = value
+
+        yield finish
@@ -0,0 +1,260 @@
+# Copyright (c) 2017 Intel Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Tests for the igt integration."""
+
+from __future__ import (
+    absolute_import, division, print_function, unicode_literals
+)
+import importlib
+import json
+import os
+import sys
+import textwrap
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import pytest
+
+from framework import dmesg
+from framework import options
+from framework import status
+
+# pylint: disable=protected-access,no-self-use,redefined-outer-name
+
+# A stand-in for an IGT binary. It lists the subtests in plan.json, and runs
+# them (or those passed with --run-subtest) printing what IGT would for the
+# outcome plan.json gives each one. Every invocation is added to calls.
+_STUB = textwrap.dedent("""\
+    #!{python}
+    import json, os, signal, sys
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(root, 'plan.json')) as f:
+        plan = json.load(f)
+    with open(os.path.join(root, 'calls'), 'a') as f:
+        f.write(json.dumps(sys.argv[1:]) + '\\n')
+
+    if sys.argv[1:] == ['--list-subtests']:
+        print('\\n'.join(sorted(plan)))
+        sys.exit(0)
+
+    subtests = sorted(plan)
+    if '--run-subtest' in sys.argv:
+        subtests = sys.argv[sys.argv.index('--run-subtest') + 1].split(',')
+
+    code = 0
+    for name in subtests:
+        outcome = plan[name]
+        if outcome == 'unstarted':
+            print('Subtest {{}}: SKIP'.format(name))
+            continue
+        print('Starting subtest: {{}}'.format(name))
+        sys.stdout.flush()
+        if outcome == 'crash':
+            os.kill(os.getpid(), signal.SIGSEGV)
+        elif outcome == 'hang':
+            sys.exit(78)
+        elif outcome != 'silent':
+            print('Subtest {{}}: {{}} (0.001s)'.format(name, outcome))
+        if outcome != 'SUCCESS':
+            code = 98
+    sys.exit(code)
+    """).format(python=sys.executable)
+
+
+@pytest.fixture(scope='module')
+def root(tmpdir_factory):
+    root = tmpdir_factory.mktemp('igt')
+    root.join('test-list.txt').write('TESTLIST\nstub\nEND TESTLIST\n')
+    root.join('plan.json').write(json.dumps({'a': 'SUCCESS'}))
+    stub = root.join('stub')
+    stub.write(_STUB)
+    stub.chmod(0o755)
+    return root
+
+
+@pytest.yield_fixture(scope='module')
+def igt(root):
+    sys.modules.pop('tests.igt', None)
+    with mock.patch.dict(os.environ, {'IGT_TEST_ROOT': str(root)}):
+        yield importlib.import_module('tests.igt')
+    sys.modules.pop('tests.igt', None)
+
+
+@pytest.fixture
+def plan(root):
+    """Write the outcome of each subtest for the stub, and return a function
+    that returns the arguments of each invocation since.
+    """
+    def write(outcomes):
+        root.join('plan.json').write(json.dumps(outcomes))
+        if root.join('calls').check():
+            root.join('calls').remove()
+
+        def calls():
+            with root.join('calls').open() as f:
+                return [json.loads(l) for l in f]
+        return calls
+    return write
+
+
+class TestProfile(object):
+    """Tests for the test list of the igt profile."""
+
+    def test_subtests(self, igt):
+        """There is a test for each subtest of the binaries listed."""
+        assert list(igt.profile.test_list.keys()) == ['igt@stub@a']
+
+    def test_dmesg_not_read_on_load(self, igt):
+        """Loading the profile doesn't start reading the kernel log."""
+        assert isinstance(igt.profile.options['dmesg'], dmesg.DummyDmesg)
+
+    def test_dmesg_setup(self, igt, mocker):
+        """The kernel log is read from setup until teardown."""
+        mocker.patch.object(options.OPTIONS, 'execute', False)
+        get_dmesg = mocker.patch('framework.dmesg.get_dmesg')
+        inst = igt.IGTTestProfile()
+
+        inst.setup()
+        assert inst.options['dmesg'] is get_dmesg.return_value
+        inst.teardown()
+        get_dmesg.return_value.close.assert_called_once_with()
+
+    def test_batch(self, igt, plan, mocker):
+        """Without process isolation all of the subtests of a binary are run
+        by one test.
+        """
+        plan({'a': 'SUCCESS', 'b': 'SUCCESS'})
+        mocker.patch.object(options.OPTIONS, 'process_isolation', False)
+        mocker.patch.object(igt, 'profile', igt.IGTTestProfile())
+        igt.add_subtest_cases('stub')
+
+        test = igt.profile.test_list['igt@stub']
+        assert isinstance(test, igt.IGTBatchTest)
+        assert sorted(test.result.subtests) == ['a', 'b']
+
+
+class TestIGTBatchTest(object):
+    """Tests for the IGTBatchTest class, run against the stub."""
+
+    @staticmethod
+    def _run(igt, outcomes):
+        test = igt.IGTBatchTest('stub', sorted(outcomes))
+        test.run()
+        return test
+
+    @pytest.mark.parametrize('result, expected', [
+        ('SUCCESS', status.PASS),
+        ('FAIL', status.FAIL),
+        ('SKIP', status.SKIP),
+        ('CRASH', status.CRASH),
+        ('TIMEOUT', status.TIMEOUT),
+        ('UNKNOWN', status.FAIL),
+    ])
+    def test_result(self, igt, plan, result, expected):
+        """Each result IGT prints is mapped to a status."""
+        plan({'a': 'SUCCESS', 'b': result})
+        test = self._run(igt, {'a': 'SUCCESS', 'b': result})
+
+        assert test.result.subtests['a'] is status.PASS
+        assert test.result.subtests['b'] is expected
+
+    def test_one_process(self, igt, plan):
+        """All of the subtests are run by one process."""
+        calls = plan({'a': 'SUCCESS', 'b': 'FAIL', 'c': 'SKIP'})
+        self._run(igt, {'a': 'SUCCESS', 'b': 'FAIL', 'c': 'SKIP'})
+
+        assert calls() == [[]]
+
+    @pytest.mark.parametrize('line, expected', [
+        ('Starting subtest: a', True),
+        ('Subtest a: SKIP', True),
+        ('Subtest a: SUCCESS (0.001s)', False),
+        ('some output', False),
+    ])
+    def test_is_subtest(self, igt, line, expected):
+        """The start of a subtest, or the result of one that was skipped
+        without being started, is counted once.
+        """
+        test = igt.IGTBatchTest('stub', ['a'])
+        assert test._is_subtest(line) is expected
+
+    def test_crash(self, igt, plan):
+        """The subtest running when the binary crashes is marked crash, and
+        the rest are resumed in a new process.
+        """
+        outcomes = {'a': 'SUCCESS', 'b': 'crash', 'c': 'SUCCESS'}
+        calls = plan(outcomes)
+        test = self._run(igt, outcomes)
+
+        assert calls() == [[], ['--run-subtest', 'c']]
+        assert dict(test.result.subtests) == {
+            'a': status.PASS, 'b': status.CRASH, 'c': status.PASS}
+        assert test.result.result is status.CRASH
+
+    def test_crash_after_unstarted(self, igt, plan):
+        """A subtest skipped without being started counts as run when
+        resuming after a crash.
+        """
+        outcomes = {'a': 'unstarted', 'b': 'crash', 'c': 'SUCCESS'}
+        calls = plan(outcomes)
+        test = self._run(igt, outcomes)
+
+        assert calls() == [[], ['--run-subtest', 'c']]
+        assert dict(test.result.subtests) == {
+            'a': status.SKIP, 'b': status.CRASH, 'c': status.PASS}
+
+    def test_timeout(self, igt, plan):
+        """A return code of 78 marks the running subtest timeout rather than
+        crash.
+        """
+        outcomes = {'a': 'hang', 'b': 'SUCCESS'}
+        calls = plan(outcomes)
+        test = self._run(igt, outcomes)
+
+        assert calls() == [[], ['--run-subtest', 'b']]
+        assert dict(test.result.subtests) == {
+            'a': status.TIMEOUT, 'b': status.PASS}
+        assert test.result.result is status.TIMEOUT
+
+    def test_no_result(self, igt, plan):
+        """A subtest that doesn't print a result is a fail."""
+        outcomes = {'a': 'silent', 'b': 'SUCCESS'}
+        plan(outcomes)
+        test = self._run(igt, outcomes)
+
+        assert dict(test.result.subtests) == {
+            'a': status.FAIL, 'b': status.PASS}
+
+
+def test_check_environment_once(igt, mocker):
+    """check_environment only reads debugfs the first time it's called."""
+    mocker.patch.object(igt, '_ENVIRONMENT_CHECKED', False)
+    mocker.patch('tests.igt.os.getuid', return_value=0)
+    mocker.patch('tests.igt.os.path.isdir', return_value=True)
+    listdir = mocker.patch('tests.igt.os.listdir', return_value=[])
+
+    igt.check_environment()
+    igt.check_environment()
+
+    assert listdir.call_count == 1